@@ -3,12 +3,19 @@ Configuration Firebase et Backend pour la gestion des missions
 """
 
 import firebase_admin
-from firebase_admin import credentials, firestore, auth, storage
-from datetime import datetime, timedelta
+from firebase_admin import credentials, firestore, firestore_async, auth, storage
+from datetime import datetime, timedelta, date, timezone
 import streamlit as st
 import json
 from typing import Dict, List, Optional
 import os
+import threading
+import time
+import asyncio
+import hashlib
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 try:
     FIREBASE_CONFIG = st.secrets.get("firebase", {})
@@ -25,6 +32,10 @@ except Exception:
 
 # Initialisation Firebase (à faire une seule fois)
 def initialize_firebase():
+    if os.getenv('FIRESTORE_BACKEND', '').lower() == 'memory':
+        # Backend en mémoire (hors ligne, tests de charge, benchmarks)
+        from firestore_memory import get_memory_client
+        return get_memory_client()
     if not firebase_admin._apps:
         cred_dict = {
             "type": st.secrets["firebase_admin"]["type"],
@@ -47,6 +58,1060 @@ def initialize_firebase():
         firebase_admin.initialize_app(cred, options or None)
     return firestore.client()
 
+# ==========================================
+# CACHE PARTAGÉ ET AGRÉGATIONS
+# ==========================================
+
+class TTLCache:
+    """Cache mémoire partagé par toutes les sessions du processus, avec expiration"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+        return value
+
+    def invalidate(self, key=None):
+        """Supprime une entrée (ou tout le cache si key est None)"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+
+DASHBOARD_STATS_TTL_SECONDS = 20
+_dashboard_stats_cache = TTLCache(DASHBOARD_STATS_TTL_SECONDS)
+
+
+def invalidate_dashboard_stats():
+    """À appeler après une écriture qui modifie les KPI du tableau de bord"""
+    _dashboard_stats_cache.invalidate()
+
+
+def count_documents(query) -> int:
+    """Compte les documents d'une requête via une agrégation count() côté serveur"""
+    try:
+        result = query.count(alias='total').get()
+        return int(result[0][0].value)
+    except AttributeError:
+        # Client Firestore sans agrégations : on ne rapatrie que les IDs
+        return sum(1 for _ in query.select([]).stream())
+
+
+def aggregate_documents(query, sum_fields: Optional[List[str]] = None) -> Dict:
+    """
+    Nombre de documents et sommes de champs numériques d'une requête, en
+    une seule agrégation côté serveur : {'count': n, '<champ>': somme, ...}
+    """
+    sum_fields = sum_fields or []
+    try:
+        aggregation = query.count(alias='count')
+        for field in sum_fields:
+            aggregation = aggregation.sum(field, alias=f"sum_{field}")
+        results = {r.alias: r.value for r in aggregation.get()[0]}
+        out = {'count': int(results.get('count') or 0)}
+        for field in sum_fields:
+            out[field] = results.get(f"sum_{field}") or 0
+        return out
+    except AttributeError:
+        # Client Firestore sans agrégations : on ne rapatrie que les champs sommés
+        out = {'count': 0, **{field: 0 for field in sum_fields}}
+        for doc in query.select(sum_fields).stream():
+            data = doc.to_dict() or {}
+            out['count'] += 1
+            for field in sum_fields:
+                value = data.get(field)
+                if isinstance(value, (int, float)):
+                    out[field] += value
+        return out
+
+
+class ChunkedBatch:
+    """
+    Batch d'écriture qui se commite automatiquement avant d'atteindre la
+    limite Firestore de 500 opérations. Même interface que WriteBatch.
+    """
+
+    def __init__(self, db, chunk_size: int = 450):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.committed = 0
+        self._batch = db.batch()
+        self._pending = 0
+
+    def _after_write(self):
+        self._pending += 1
+        if self._pending >= self.chunk_size:
+            self.commit()
+
+    def reserve(self, count: int):
+        """Commite d'abord si les `count` prochaines écritures ne tiennent pas dans le lot courant"""
+        if self._pending and self._pending + count > self.chunk_size:
+            self.commit()
+
+    def set(self, ref, data, merge: bool = False):
+        self._batch.set(ref, data, merge=merge)
+        self._after_write()
+
+    def update(self, ref, data):
+        self._batch.update(ref, data)
+        self._after_write()
+
+    def delete(self, ref):
+        self._batch.delete(ref)
+        self._after_write()
+
+    def commit(self):
+        if self._pending:
+            self._batch.commit()
+            self.committed += self._pending
+            self._batch = self.db.batch()
+            self._pending = 0
+        return self.committed
+
+
+TRANSACTION_MAX_ATTEMPTS = 5
+
+
+def run_transaction(db, fn, max_attempts: int = TRANSACTION_MAX_ATTEMPTS):
+    """
+    Exécute fn(transaction) dans une transaction Firestore (lectures puis
+    écritures, nouvel essai automatique en cas de conflit concurrent).
+    """
+    if hasattr(db, 'run_transaction'):
+        # Backend en mémoire : transactions sérialisées
+        return db.run_transaction(fn, max_attempts=max_attempts)
+    transaction = db.transaction(max_attempts=max_attempts)
+
+    @firestore.transactional
+    def _run(tx):
+        return fn(tx)
+
+    return _run(transaction)
+
+
+# Vues de projection (Firestore select()) : champs rapatriés par usage
+PROJECTION_VIEWS = {
+    'mission_requests': {
+        'list': ['request_id', 'motif_mission', 'nom_demandeur', 'email_demandeur', 'service_demandeur',
+                 'structure', 'date_depart', 'date_retour', 'destination', 'nb_passagers', 'type_vehicule',
+                 'avec_chauffeur', 'status', 'created_at', 'assigned_driver', 'assigned_vehicle', 'attachments'],
+        'picker': ['request_id', 'motif_mission', 'nom_demandeur', 'date_depart', 'status'],
+        'report': ['request_id', 'motif_mission', 'nom_demandeur', 'email_demandeur', 'service_demandeur',
+                   'structure', 'date_depart', 'date_retour', 'destination', 'nb_passagers', 'type_vehicule',
+                   'status', 'created_at']
+    },
+    'active_missions': {
+        'list': ['mission_id', 'request_id', 'motif_mission', 'destination', 'start_date', 'end_date',
+                 'driver_id', 'vehicle_id', 'status', 'distance_km', 'structure',
+                 'driver_name', 'vehicle_plate', 'service'],
+        'picker': ['mission_id', 'motif_mission', 'start_date', 'end_date'],
+        'report': ['request_id', 'start_date', 'end_date', 'driver_id', 'vehicle_id', 'status',
+                   'distance_km', 'structure', 'budget_perdiem_fcfa', 'hotel_driver_fcfa',
+                   'driver_name', 'vehicle_plate', 'service']
+    },
+    'drivers': {
+        'list': ['name', 'email', 'phone', 'license_number', 'status', 'assigned_vehicle'],
+        'picker': ['name', 'status', 'assigned_vehicle'],
+        'report': ['name', 'status', 'total_missions']
+    },
+    'vehicles': {
+        'list': ['immatriculation', 'marque', 'modele', 'type', 'capacite', 'annee', 'status', 'assigned_driver'],
+        'picker': ['immatriculation', 'type', 'capacite', 'status', 'assigned_driver'],
+        'report': ['immatriculation', 'type', 'status']
+    }
+}
+
+
+def project(query, collection_name: str, view: Optional[str] = None):
+    """Applique la vue de projection nommée à une requête (aucune si view est None)"""
+    if not view:
+        return query
+    fields = PROJECTION_VIEWS.get(collection_name, {}).get(view)
+    if fields is None:
+        raise ValueError(f"Vue de projection inconnue '{view}' pour '{collection_name}'")
+    return query.select(fields)
+
+
+def as_datetime(value) -> Optional[datetime]:
+    """Normalise une date (Firestore, ISO, date) en datetime naïf UTC"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    if isinstance(value, str):
+        try:
+            return as_datetime(datetime.fromisoformat(value.replace('Z', '+00:00')))
+        except ValueError:
+            return None
+    return None
+
+
+def day_keys(start_date, end_date) -> List[str]:
+    """Liste des jours (YYYY-MM-DD) couverts par une période, bornes incluses"""
+    start = as_datetime(start_date)
+    end = as_datetime(end_date)
+    if not start or not end or end < start:
+        return []
+    day = start.date()
+    keys = []
+    while day <= end.date():
+        keys.append(day.isoformat())
+        day += timedelta(days=1)
+    return keys
+
+# ==========================================
+# INDEX D'OCCUPATION JOUR PAR JOUR
+# ==========================================
+
+OCCUPANCY_COLLECTION = 'occupancy_days'
+_occupancy_meta_cache = TTLCache(300)
+
+
+class OccupancyIndex:
+    """
+    Index des réservations par jour : un document par date contenant
+    {'vehicles': {vehicle_id: [mission_ids]}, 'drivers': {driver_id: [mission_ids]}}.
+
+    Maintenu à la création, réaffectation et clôture des missions ; une
+    disponibilité se calcule en lisant uniquement les jours de la période.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.days_collection = db.collection(OCCUPANCY_COLLECTION)
+        self.missions_collection = db.collection('active_missions')
+
+    def _stage(self, writer, mission_id: str, start_date, end_date, vehicle_id, driver_id, transform):
+        for key in day_keys(start_date, end_date):
+            payload = {'date': key}
+            if vehicle_id:
+                payload['vehicles'] = {vehicle_id: transform([mission_id])}
+            if driver_id:
+                payload['drivers'] = {driver_id: transform([mission_id])}
+            writer.set(self.days_collection.document(key), payload, merge=True)
+
+    def reserve(self, writer, mission_id: str, start_date, end_date, vehicle_id: Optional[str], driver_id: Optional[str]):
+        """Ajoute la mission aux jours couverts (écritures ajoutées au batch/transaction)"""
+        self._stage(writer, mission_id, start_date, end_date, vehicle_id, driver_id, firestore.ArrayUnion)
+
+    def release(self, writer, mission_id: str, start_date, end_date, vehicle_id: Optional[str], driver_id: Optional[str]):
+        """Retire la mission des jours couverts (écritures ajoutées au batch/transaction)"""
+        self._stage(writer, mission_id, start_date, end_date, vehicle_id, driver_id, firestore.ArrayRemove)
+
+    def is_built(self) -> bool:
+        built = _occupancy_meta_cache.get('built')
+        if built is None:
+            meta = self.days_collection.document('_meta').get()
+            built = bool(meta.exists and (meta.to_dict() or {}).get('built_at'))
+            _occupancy_meta_cache.set('built', built)
+        return built
+
+    def occupied_by_day(self, start_date: datetime, end_date: datetime) -> Dict[str, Dict[str, set]]:
+        """Véhicules et chauffeurs réservés, jour par jour, sur la période"""
+        keys = day_keys(start_date, end_date)
+        days = {key: {'vehicles': set(), 'drivers': set()} for key in keys}
+        if not self.is_built():
+            # Index pas encore construit : repli sur la requête par intervalle
+            missions = self.missions_collection.where(
+                'start_date', '<=', end_date
+            ).where(
+                'end_date', '>=', start_date
+            ).select(['start_date', 'end_date', 'vehicle_id', 'driver_id']).stream()
+            for m in missions:
+                data = m.to_dict() or {}
+                for key in day_keys(data.get('start_date'), data.get('end_date')):
+                    if key in days:
+                        days[key]['vehicles'].add(data.get('vehicle_id'))
+                        days[key]['drivers'].add(data.get('driver_id'))
+            return days
+        refs = [self.days_collection.document(key) for key in keys]
+        for snap in self.db.get_all(refs):
+            if not snap.exists:
+                continue
+            data = snap.to_dict() or {}
+            days[snap.id] = {
+                'vehicles': {k for k, ids in (data.get('vehicles') or {}).items() if ids},
+                'drivers': {k for k, ids in (data.get('drivers') or {}).items() if ids}
+            }
+        return days
+
+    def occupied(self, start_date: datetime, end_date: datetime) -> Dict[str, set]:
+        """Identifiants des véhicules et chauffeurs réservés sur la période"""
+        vehicles, drivers = set(), set()
+        for day in self.occupied_by_day(start_date, end_date).values():
+            vehicles |= day['vehicles']
+            drivers |= day['drivers']
+        return {'vehicles': vehicles, 'drivers': drivers}
+
+    def rebuild(self) -> int:
+        """Reconstruit l'index à partir des missions actives (backfill). Retourne le nombre de jours écrits"""
+        days = {}
+        for m in self.missions_collection.stream():
+            data = m.to_dict() or {}
+            if data.get('status', 'active') != 'active':
+                continue
+            for key in day_keys(data.get('start_date'), data.get('end_date')):
+                entry = days.setdefault(key, {'date': key, 'vehicles': {}, 'drivers': {}})
+                if data.get('vehicle_id'):
+                    entry['vehicles'].setdefault(data['vehicle_id'], []).append(m.id)
+                if data.get('driver_id'):
+                    entry['drivers'].setdefault(data['driver_id'], []).append(m.id)
+        batch = ChunkedBatch(self.db)
+        for snap in self.days_collection.select([]).stream():
+            if snap.id not in days:
+                batch.delete(snap.reference)
+        for key, entry in days.items():
+            batch.set(self.days_collection.document(key), entry)
+        batch.set(self.days_collection.document('_meta'), {'built_at': datetime.now()})
+        batch.commit()
+        _occupancy_meta_cache.invalidate()
+        return len(days)
+
+# ==========================================
+# INDEX D'INTERVALLES DES MISSIONS
+# ==========================================
+
+MISSION_INDEX_TTL_SECONDS = 60
+# Fenêtre maximale de l'index en cache : au-delà, la nouvelle période remplace l'ancienne
+MISSION_INDEX_MAX_SPAN_DAYS = 186
+_mission_index_cache = TTLCache(MISSION_INDEX_TTL_SECONDS)
+
+
+def invalidate_mission_index():
+    """À appeler après une écriture qui modifie les dates ou ressources d'une mission"""
+    _mission_index_cache.invalidate()
+
+
+class MissionIntervalIndex:
+    """
+    Arbre d'intervalles statique sur les missions : tableau trié par date de
+    début, chaque nœud (milieu d'une tranche) portant la fin maximale de son
+    sous-arbre. Les recherches de chevauchement coûtent O(log n + k).
+
+    Les créneaux occupés de chaque véhicule/chauffeur sont aussi conservés
+    triés et fusionnés pour répondre aux questions de disponibilité.
+    """
+
+    def __init__(self, missions: List[Dict]):
+        entries = []
+        for m in missions:
+            start = as_datetime(m.get('start_date'))
+            end = as_datetime(m.get('end_date')) or start
+            if not start:
+                continue
+            entries.append((start, max(start, end), m))
+        entries.sort(key=lambda e: e[0])
+        self._starts = [e[0] for e in entries]
+        self._ends = [e[1] for e in entries]
+        self._missions = [e[2] for e in entries]
+        self._max_end = list(self._ends)
+        self._build(0, len(entries))
+
+        busy = {}
+        for start, end, m in entries:
+            vehicle_id = m.get('vehicle_id') or m.get('assigned_vehicle')
+            driver_id = m.get('driver_id') or m.get('assigned_driver')
+            if vehicle_id:
+                busy.setdefault(('vehicle', vehicle_id), []).append((start, end))
+            if driver_id:
+                busy.setdefault(('driver', driver_id), []).append((start, end))
+        self._busy = {}
+        for key, intervals in busy.items():
+            merged = []
+            for start, end in sorted(intervals):
+                if merged and start <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                else:
+                    merged.append((start, end))
+            self._busy[key] = ([s for s, _ in merged], [e for _, e in merged])
+
+    def __len__(self):
+        return len(self._missions)
+
+    def _build(self, lo: int, hi: int):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        best = self._ends[mid]
+        for child in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if child is not None and child > best:
+                best = child
+        self._max_end[mid] = best
+        return best
+
+    def _collect(self, lo: int, hi: int, start: datetime, end: datetime, out: List[Dict]):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self._max_end[mid] < start:
+            return
+        self._collect(lo, mid, start, end, out)
+        if self._starts[mid] > end:
+            return
+        if self._ends[mid] >= start:
+            out.append(self._missions[mid])
+        self._collect(mid + 1, hi, start, end, out)
+
+    def overlapping(self, start_date, end_date) -> List[Dict]:
+        """Missions qui chevauchent [start_date, end_date], triées par date de début"""
+        start = as_datetime(start_date)
+        end = as_datetime(end_date)
+        out = []
+        if start and end and start <= end:
+            self._collect(0, len(self._missions), start, end, out)
+        return out
+
+    def on_day(self, day) -> List[Dict]:
+        """Missions en cours un jour donné"""
+        start = as_datetime(day).replace(hour=0, minute=0, second=0, microsecond=0)
+        return self.overlapping(start, start + timedelta(days=1) - timedelta(microseconds=1))
+
+    def _busy_between(self, resource_id: str, kind: str, start: datetime, end: datetime):
+        starts, ends = self._busy.get((kind, resource_id), ([], []))
+        i = bisect_left(ends, start)
+        j = bisect_right(starts, end)
+        return [(starts[k], ends[k]) for k in range(i, j)]
+
+    def free_slots(self, resource_id: str, start_date, end_date, kind: str = 'vehicle') -> List[tuple]:
+        """Créneaux libres (début, fin) d'un véhicule ou chauffeur sur la période"""
+        start = as_datetime(start_date)
+        end = as_datetime(end_date)
+        if not start or not end or start > end:
+            return []
+        slots = []
+        cursor = start
+        for busy_start, busy_end in self._busy_between(resource_id, kind, start, end):
+            if busy_start > cursor:
+                slots.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if cursor < end:
+            slots.append((cursor, end))
+        return slots
+
+    def busy_hours(self, resource_id: str, start_date, end_date, kind: str = 'vehicle') -> float:
+        """Heures occupées (sans double compte) d'un véhicule ou chauffeur sur la période"""
+        start = as_datetime(start_date)
+        end = as_datetime(end_date)
+        if not start or not end or start > end:
+            return 0.0
+        total = 0.0
+        for busy_start, busy_end in self._busy_between(resource_id, kind, start, end):
+            total += (min(busy_end, end) - max(busy_start, start)).total_seconds()
+        return total / 3600
+
+    def resources(self, kind: str = 'vehicle') -> List[str]:
+        """Identifiants des véhicules (ou chauffeurs) présents dans l'index"""
+        return [rid for k, rid in self._busy if k == kind]
+
+# ==========================================
+# GÉNÉRATION D'IDENTIFIANTS
+# ==========================================
+
+class IdAllocator:
+    """
+    Identifiants lisibles, triables et sans collision :
+    PREFIXE-AAAAMMJJ-HHMMSSmmm-SSSS-NNN
+    (horodatage à la milliseconde, séquence dans la milliseconde, suffixe de
+    processus). Aucune lecture Firestore : utilisable dans un batch à plein débit.
+    """
+
+    SEQUENCE_MAX = 10000
+
+    def __init__(self, node: Optional[str] = None):
+        self.node = node or os.urandom(2).hex()[:3]
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._seq = 0
+
+    def _next_tick(self):
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            if now_ms <= self._last_ms:
+                # Même milliseconde (ou horloge reculée) : on incrémente la séquence
+                now_ms = self._last_ms
+                self._seq += 1
+                if self._seq >= self.SEQUENCE_MAX:
+                    now_ms += 1
+                    self._seq = 0
+            else:
+                self._seq = 0
+            self._last_ms = now_ms
+            return now_ms, self._seq
+
+    def new_id(self, prefix: str) -> str:
+        now_ms, seq = self._next_tick()
+        stamp = datetime.fromtimestamp(now_ms / 1000)
+        return f"{prefix}-{stamp.strftime('%Y%m%d-%H%M%S')}{now_ms % 1000:03d}-{seq:04d}-{self.node}"
+
+    def new_ids(self, prefix: str, count: int) -> List[str]:
+        return [self.new_id(prefix) for _ in range(count)]
+
+
+_id_allocator = IdAllocator()
+
+
+def new_id(prefix: str) -> str:
+    """Nouvel identifiant unique (DM, MS, VH, DR, ...)"""
+    return _id_allocator.new_id(prefix)
+
+# ==========================================
+# CACHE RÉPLIQUÉ PAR SNAPSHOT LISTENERS
+# ==========================================
+
+class LiveCollectionCache:
+    """
+    Réplique mémoire d'une collection (ou requête) alimentée par on_snapshot.
+    Seuls les documents modifiés transitent après le chargement initial ;
+    la réplique est partagée par toutes les sessions du processus.
+    """
+
+    def __init__(self, name: str, query):
+        self.name = name
+        self.query = query
+        self.last_update = None
+        self._docs = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._watch = None
+
+    def start(self):
+        if self._watch is None:
+            self._watch = self.query.on_snapshot(self._on_snapshot)
+        return self
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        self._ready.clear()
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                if change.type.name == 'REMOVED':
+                    self._docs.pop(doc.id, None)
+                else:
+                    self._docs[doc.id] = {'id': doc.id, **(doc.to_dict() or {})}
+            self.last_update = datetime.now()
+        self._ready.set()
+
+    @property
+    def warm(self) -> bool:
+        """Vrai si le chargement initial est reçu et l'écoute toujours active"""
+        return self._ready.is_set() and self._watch is not None and getattr(self._watch, 'is_active', True)
+
+    def wait_warm(self, timeout: float = 5.0) -> bool:
+        return self._ready.wait(timeout) and self.warm
+
+    def values(self, fields: Optional[List[str]] = None) -> List[Dict]:
+        """Copie des documents répliqués, éventuellement restreinte à certains champs"""
+        with self._lock:
+            docs = list(self._docs.values())
+        if fields is not None:
+            return [{'id': d['id'], **{k: d[k] for k in fields if k in d}} for d in docs]
+        return [dict(d) for d in docs]
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        with self._lock:
+            doc = self._docs.get(doc_id)
+        return dict(doc) if doc is not None else None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._docs)
+
+
+LIVE_CACHE_QUERIES = {
+    'vehicles': lambda db: db.collection('vehicles'),
+    'drivers': lambda db: db.collection('drivers'),
+    'active_missions': lambda db: db.collection('active_missions').where('status', '==', 'active')
+}
+_live_caches = {}
+_live_caches_lock = threading.Lock()
+
+
+def start_live_caches(names: Optional[List[str]] = None) -> Dict[str, LiveCollectionCache]:
+    """Démarre (une seule fois par processus) les réplicas des collections demandées"""
+    db = initialize_firebase()
+    with _live_caches_lock:
+        for name in names or list(LIVE_CACHE_QUERIES):
+            if name not in _live_caches:
+                _live_caches[name] = LiveCollectionCache(name, LIVE_CACHE_QUERIES[name](db)).start()
+        return dict(_live_caches)
+
+
+def live_cache(name: str) -> Optional[LiveCollectionCache]:
+    """Réplica démarré et à jour pour cette collection, sinon None (lecture Firestore)"""
+    cache = _live_caches.get(name)
+    return cache if cache is not None and cache.warm else None
+
+
+def live_view_fields(collection_name: str, view: Optional[str]) -> Optional[List[str]]:
+    if not view:
+        return None
+    return PROJECTION_VIEWS.get(collection_name, {}).get(view)
+
+# ==========================================
+# AGRÉGATS MENSUELS (ROLLUPS)
+# ==========================================
+
+ROLLUP_COLLECTION = 'monthly_rollups'
+PERDIEM_PER_DAY_DEFAULT = 8000
+HOTEL_FEE_PER_NIGHT_DEFAULT = 60000
+
+
+def month_bounds(year: int, month: int):
+    """Premier jour du mois et premier jour du mois suivant"""
+    start_date = datetime(year, month, 1)
+    if month == 12:
+        end_date = datetime(year + 1, 1, 1)
+    else:
+        end_date = datetime(year, month + 1, 1)
+    return start_date, end_date
+
+
+def mission_costs(mission: Dict) -> Dict:
+    """Jours, nuitées, kilomètres et montants (per diem, hôtel) d'une mission"""
+    start = as_datetime(mission.get('start_date'))
+    end = as_datetime(mission.get('end_date'))
+    days = max(0, (end - start).days + 1) if start and end else 0
+    nights = max(0, days - 1)
+    perdiem_rate = mission.get('budget_perdiem_fcfa') or PERDIEM_PER_DAY_DEFAULT
+    hotel_rate = mission.get('hotel_driver_fcfa') or HOTEL_FEE_PER_NIGHT_DEFAULT
+    perdiem = int(perdiem_rate) * days
+    hotel = int(hotel_rate) * nights
+    return {
+        'km': mission.get('distance_km', 0) or 0,
+        'days': days,
+        'perdiem_fcfa': perdiem,
+        'hotel_fcfa': hotel,
+        'total_fcfa': perdiem + hotel
+    }
+
+
+class MonthlyRollups:
+    """
+    Agrégats mensuels par chauffeur, véhicule et structure, un document par
+    mois (YYYY-MM). Mis à jour par incréments dans le même commit que les
+    écritures de missions ; `rebuild` recalcule un mois à partir des missions.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.rollups_collection = db.collection(ROLLUP_COLLECTION)
+        self.missions_collection = db.collection('active_missions')
+
+    def _ref(self, year: int, month: int):
+        return self.rollups_collection.document(f"{year:04d}-{month:02d}")
+
+    def apply(self, writer, mission: Dict, sign: int = 1):
+        """Ajoute (sign=1) ou retire (sign=-1) la contribution d'une mission (clôture comprise)"""
+        start = as_datetime(mission.get('start_date'))
+        if not start:
+            return
+        inc = firestore.Increment
+        costs = mission_costs(mission)
+        payload = {
+            'year': start.year,
+            'month': start.month,
+            'period': f"{start.month}/{start.year}",
+            'total_missions': inc(sign),
+            'total_km': inc(sign * costs['km']),
+            'updated_at': datetime.now()
+        }
+        if mission.get('status') == 'completed':
+            payload['completed_missions'] = inc(sign)
+        driver_id = mission.get('driver_id')
+        if driver_id:
+            payload['driver_stats'] = {driver_id: {
+                'missions': inc(sign),
+                **{k: inc(sign * v) for k, v in costs.items()}
+            }}
+        vehicle_id = mission.get('vehicle_id')
+        if vehicle_id:
+            payload['vehicle_stats'] = {vehicle_id: {
+                'missions': inc(sign), 'km': inc(sign * costs['km']), 'days': inc(sign * costs['days'])
+            }}
+        structure = mission.get('structure') or 'Non spécifié'
+        payload['structure_stats'] = {structure: {
+            'missions': inc(sign), 'km': inc(sign * costs['km']),
+            'days': inc(sign * costs['days']), 'total_fcfa': inc(sign * costs['total_fcfa'])
+        }}
+        writer.set(self._ref(start.year, start.month), payload, merge=True)
+
+    def mark_completed(self, writer, mission: Dict):
+        start = as_datetime(mission.get('start_date'))
+        if start:
+            writer.set(self._ref(start.year, start.month), {'completed_missions': firestore.Increment(1)}, merge=True)
+
+    def compute(self, year: int, month: int) -> Dict:
+        """Calcule les agrégats d'un mois par lecture complète des missions"""
+        start_date, end_date = month_bounds(year, month)
+        sources = [self.missions_collection]
+        if ArchiveStore(self.db).needs_archive('active_missions', start_date):
+            sources.append(self.db.collection(archive_collection_name('active_missions', year)))
+        missions = [m for source in sources for m in source.where(
+            'start_date', '>=', start_date
+        ).where(
+            'start_date', '<', end_date
+        ).stream()]
+        rollup = {
+            'year': year, 'month': month, 'period': f"{month}/{year}",
+            'total_missions': 0, 'total_km': 0, 'completed_missions': 0,
+            'driver_stats': {}, 'vehicle_stats': {}, 'structure_stats': {}
+        }
+        for m in missions:
+            mission = m.to_dict() or {}
+            costs = mission_costs(mission)
+            rollup['total_missions'] += 1
+            rollup['total_km'] += costs['km']
+            if mission.get('status') == 'completed':
+                rollup['completed_missions'] += 1
+            driver_id = mission.get('driver_id')
+            if driver_id:
+                ds = rollup['driver_stats'].setdefault(driver_id, {'missions': 0, 'km': 0, 'days': 0, 'perdiem_fcfa': 0, 'hotel_fcfa': 0, 'total_fcfa': 0})
+                ds['missions'] += 1
+                for k, v in costs.items():
+                    ds[k] += v
+            vehicle_id = mission.get('vehicle_id')
+            if vehicle_id:
+                vs = rollup['vehicle_stats'].setdefault(vehicle_id, {'missions': 0, 'km': 0, 'days': 0})
+                vs['missions'] += 1
+                vs['km'] += costs['km']
+                vs['days'] += costs['days']
+            ss = rollup['structure_stats'].setdefault(mission.get('structure') or 'Non spécifié', {'missions': 0, 'km': 0, 'days': 0, 'total_fcfa': 0})
+            ss['missions'] += 1
+            ss['km'] += costs['km']
+            ss['days'] += costs['days']
+            ss['total_fcfa'] += costs['total_fcfa']
+        return rollup
+
+    def rebuild(self, year: int, month: int) -> Dict:
+        """Recalcule et réécrit le document d'un mois (backfill)"""
+        rollup = self.compute(year, month)
+        rollup['built_at'] = datetime.now()
+        rollup['updated_at'] = rollup['built_at']
+        self._ref(year, month).set(rollup)
+        return rollup
+
+    def get(self, year: int, month: int) -> Dict:
+        """Agrégats d'un mois (une lecture ; recalcul si le mois n'a jamais été construit)"""
+        snap = self._ref(year, month).get()
+        data = snap.to_dict() if snap.exists else None
+        if not data or not data.get('built_at'):
+            data = self.rebuild(year, month)
+        return data
+
+    def get_many(self, months: List[tuple]) -> Dict[tuple, Dict]:
+        """Agrégats de plusieurs mois [(année, mois)] en une seule lecture groupée"""
+        refs = [self._ref(y, m) for y, m in months]
+        found = {}
+        for snap in self.db.get_all(refs):
+            if snap.exists:
+                data = snap.to_dict() or {}
+                if data.get('built_at'):
+                    found[(int(data['year']), int(data['month']))] = data
+        return {(y, m): found.get((y, m)) or self.rebuild(y, m) for y, m in months}
+
+# ==========================================
+# ARCHIVAGE CHAUD / FROID
+# ==========================================
+
+ARCHIVE_META_COLLECTION = 'archive_meta'
+ARCHIVE_HORIZON_DAYS = int(os.getenv('ARCHIVE_HORIZON_DAYS', '365'))
+# Champ daté qui choisit la partition annuelle d'archive
+ARCHIVE_PARTITION_FIELDS = {'active_missions': 'start_date', 'mission_requests': 'date_depart'}
+ARCHIVED_MISSION_STATUSES = ('completed',)
+ARCHIVED_REQUEST_STATUSES = ('approved', 'rejected', 'cancelled', 'completed')
+_archive_meta_cache = TTLCache(300)
+
+
+def archive_collection_name(collection_name: str, year: int) -> str:
+    """Partition d'archive d'une collection pour une année (ex. active_missions_archive_2024)"""
+    return f"{collection_name}_archive_{year}"
+
+
+class ArchiveStore:
+    """
+    Déplace les missions terminées et les demandes clôturées plus anciennes
+    qu'un horizon vers des collections d'archive partitionnées par année.
+
+    Le document archive_meta/<collection> retient la borne 'archived_before' :
+    une requête sur une période qui commence après cette borne ne lit que la
+    collection chaude ; sinon elle est étendue aux partitions concernées.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.meta_collection = db.collection(ARCHIVE_META_COLLECTION)
+
+    def meta(self, collection_name: str) -> Dict:
+        cached = _archive_meta_cache.get(collection_name)
+        if cached is None:
+            snap = self.meta_collection.document(collection_name).get()
+            data = (snap.to_dict() or {}) if snap.exists else {}
+            cached = {
+                'archived_before': as_datetime(data.get('archived_before')),
+                'years': sorted(int(y) for y in data.get('years') or [])
+            }
+            _archive_meta_cache.set(collection_name, cached)
+        return cached
+
+    def needs_archive(self, collection_name: str, start_date) -> bool:
+        """Vrai si une période commençant à start_date peut contenir des documents archivés"""
+        boundary = self.meta(collection_name)['archived_before']
+        start = as_datetime(start_date)
+        return boundary is not None and (start is None or start < boundary)
+
+    def partitions(self, collection_name: str, start_date=None, end_date=None) -> List:
+        """Collections d'archive couvrant la période (toutes si aucune borne)"""
+        meta = self.meta(collection_name)
+        start, end = as_datetime(start_date), as_datetime(end_date)
+        if start is not None and not self.needs_archive(collection_name, start):
+            return []
+        # Une année de marge : une mission commencée l'année précédente peut chevaucher la période
+        first = start.year - 1 if start else None
+        last = end.year if end else None
+        return [self.db.collection(archive_collection_name(collection_name, y)) for y in meta['years']
+                if (first is None or y >= first) and (last is None or y <= last)]
+
+    def get(self, collection_name: str, doc_id: str) -> Optional[Dict]:
+        """Document archivé (partitions parcourues de la plus récente à la plus ancienne)"""
+        for collection in reversed(self.partitions(collection_name)):
+            snap = collection.document(doc_id).get()
+            if snap.exists:
+                return snap.to_dict()
+        return None
+
+    def existing_ids(self, collection_name: str, doc_ids: List[str]) -> set:
+        """Identifiants présents dans une partition d'archive (lectures get_all groupées)"""
+        found = set()
+        remaining = list(doc_ids)
+        for collection in reversed(self.partitions(collection_name)):
+            if not remaining:
+                break
+            for i in range(0, len(remaining), 300):
+                refs = [collection.document(d) for d in remaining[i:i + 300]]
+                found |= {snap.id for snap in self.db.get_all(refs, field_paths=[]) if snap.exists}
+            remaining = [d for d in remaining if d not in found]
+        return found
+
+    def archive(self, horizon_days: Optional[int] = None, dry_run: bool = False) -> Dict:
+        """
+        Archive les missions terminées (fin avant l'horizon) et les demandes
+        clôturées (retour avant l'horizon).
+
+        Returns:
+            {'cutoff', 'missions': n, 'requests': n, 'years': {collection: [années]}}
+        """
+        horizon_days = ARCHIVE_HORIZON_DAYS if horizon_days is None else horizon_days
+        cutoff = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=horizon_days)
+        plans = {
+            'active_missions': ('end_date', ARCHIVED_MISSION_STATUSES),
+            'mission_requests': ('date_retour', ARCHIVED_REQUEST_STATUSES)
+        }
+        report = {'cutoff': cutoff, 'missions': 0, 'requests': 0, 'years': {}}
+        batch = ChunkedBatch(self.db)
+        for collection_name, (end_field, statuses) in plans.items():
+            hot = self.db.collection(collection_name)
+            years = set()
+            moved = 0
+            for doc in hot.where(end_field, '<', cutoff).stream():
+                data = doc.to_dict() or {}
+                if data.get('status') not in statuses:
+                    continue
+                partition_date = as_datetime(data.get(ARCHIVE_PARTITION_FIELDS[collection_name]) or data.get('created_at'))
+                year = partition_date.year if partition_date else cutoff.year
+                years.add(year)
+                moved += 1
+                if not dry_run:
+                    batch.reserve(2)
+                    batch.set(self.db.collection(archive_collection_name(collection_name, year)).document(doc.id),
+                              {**data, 'archived_at': datetime.now()})
+                    batch.delete(hot.document(doc.id))
+            report['missions' if collection_name == 'active_missions' else 'requests'] = moved
+            report['years'][collection_name] = sorted(years)
+            if moved and not dry_run:
+                batch.reserve(1)
+                previous = self.meta(collection_name)['archived_before']
+                batch.set(self.meta_collection.document(collection_name), {
+                    'archived_before': max(previous, cutoff) if previous else cutoff,
+                    'years': firestore.ArrayUnion(sorted(years)),
+                    'updated_at': datetime.now()
+                }, merge=True)
+        if not dry_run:
+            batch.commit()
+            _archive_meta_cache.invalidate()
+            invalidate_mission_index()
+            invalidate_dashboard_stats()
+        return report
+
+
+# ==========================================
+# AFFECTATION OPTIMALE (COUPLAGE DE COÛT MINIMAL)
+# ==========================================
+
+ASSIGNMENT_INFEASIBLE_COST = 1e9
+
+
+def min_cost_assignment(cost: List[List[float]]) -> List[Optional[int]]:
+    """
+    Algorithme hongrois (O(n²m)) : pour chaque ligne, la colonne affectée
+    minimisant le coût total, ou None si aucune colonne réalisable.
+    Les coûts >= ASSIGNMENT_INFEASIBLE_COST sont considérés comme interdits.
+    """
+    rows = len(cost)
+    cols = len(cost[0]) if rows else 0
+    if rows == 0 or cols == 0:
+        return [None] * rows
+    transposed = rows > cols
+    matrix = [list(col) for col in zip(*cost)] if transposed else cost
+    n, m = len(matrix), len(matrix[0])
+    u, v = [0.0] * (n + 1), [0.0] * (m + 1)
+    p, way = [0] * (m + 1), [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [float('inf')] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = p[j0], float('inf'), 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = matrix[i0 - 1][j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j], way[j] = cur, j0
+                    if minv[j] < delta:
+                        delta, j1 = minv[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    pairs = [(p[j] - 1, j - 1) for j in range(1, m + 1) if p[j]]
+    result = [None] * rows
+    for r, c in pairs:
+        row, col = (c, r) if transposed else (r, c)
+        if cost[row][col] < ASSIGNMENT_INFEASIBLE_COST:
+            result[row] = col
+    return result
+
+
+def overlap_groups(items: List[Dict], start_key: str, end_key: str) -> List[List[Dict]]:
+    """Regroupe des éléments en composantes de périodes qui se chevauchent"""
+    dated = []
+    for item in items:
+        start = as_datetime(item.get(start_key))
+        end = as_datetime(item.get(end_key)) or start
+        if start:
+            dated.append((start, max(start, end), item))
+    dated.sort(key=lambda x: x[0])
+    groups, group_end = [], None
+    for start, end, item in dated:
+        if groups and start <= group_end:
+            groups[-1].append(item)
+            group_end = max(group_end, end)
+        else:
+            groups.append([item])
+            group_end = end
+    return groups
+
+# Pièces jointes : stockage adressé par contenu, envoi par morceaux de 5 Mo
+ATTACHMENT_PREFIX = 'mission_docs/sha256'
+ATTACHMENT_CHUNK_SIZE = 5 * 1024 * 1024
+# URLs signées à la demande, valables 1 h ; resservies depuis le cache tant qu'il leur reste 10 min
+ATTACHMENT_URL_LIFETIME = timedelta(hours=1)
+_attachment_url_cache = TTLCache((ATTACHMENT_URL_LIFETIME - timedelta(minutes=10)).total_seconds())
+
+
+def attachment_bucket():
+    """Bucket Firebase Storage configuré"""
+    project_id = None
+    try:
+        project_id = st.secrets.get('firebase_admin', {}).get('project_id')
+    except Exception:
+        project_id = (FIREBASE_CONFIG or {}).get('projectId')
+    bucket_name = (FIREBASE_CONFIG or {}).get('storageBucket') or (f"{project_id}.appspot.com" if project_id else None)
+    if not bucket_name:
+        raise ValueError("Firebase Storage non configuré: définissez 'firebase.storageBucket' dans secrets.")
+    return storage.bucket(bucket_name)
+
+
+def sign_attachment_urls(attachments: List[Dict], bucket=None) -> Dict[str, str]:
+    """
+    URLs signées des pièces jointes, indexées par chemin de blob. Celles
+    absentes du cache sont signées en une passe (signature locale, sans
+    appel réseau par fichier).
+    """
+    urls = {}
+    to_sign = []
+    for att in attachments:
+        path = (att or {}).get('path')
+        if not path or path in urls or path in to_sign:
+            continue
+        url = _attachment_url_cache.get(path)
+        if url:
+            urls[path] = url
+        else:
+            to_sign.append(path)
+    if to_sign:
+        bucket = bucket or attachment_bucket()
+        for path in to_sign:
+            url = bucket.blob(path).generate_signed_url(expiration=ATTACHMENT_URL_LIFETIME, version='v4')
+            urls[path] = _attachment_url_cache.set(path, url)
+    return urls
+
+
+def attachment_links(requests: List[Dict]) -> Dict[str, str]:
+    """URLs signées de toutes les pièces jointes d'une liste de demandes (repli : URLs déjà stockées)"""
+    attachments = []
+    for req in requests or []:
+        atts = (req or {}).get('attachments')
+        if isinstance(atts, list):
+            attachments.extend(att for att in atts if isinstance(att, dict))
+    try:
+        signed = sign_attachment_urls(attachments)
+    except Exception:
+        signed = {}
+    links = {}
+    for att in attachments:
+        key = att.get('path') or att.get('url')
+        if key:
+            links[key] = signed.get(att.get('path')) or att.get('url', '')
+    return links
+
 # ==========================================
 # GESTION DES DEMANDES DE MISSION
 # ==========================================
@@ -60,18 +1125,19 @@ class MissionRequestManager:
         self.vehicles_collection = self.db.collection('vehicles')
         self.drivers_collection = self.db.collection('drivers')
     
-    def create_request(self, request_data: Dict) -> str:
+    def create_request(self, request_data: Dict, writer=None) -> str:
         """
         Crée une nouvelle demande de mission
         
         Args:
             request_data: Dictionnaire contenant les informations de la demande
+            writer: batch ou transaction optionnel (commit laissé à l'appelant)
         
         Returns:
             request_id: ID unique de la demande
         """
         # Générer un ID unique
-        request_id = f"DM-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        request_id = new_id('DM')
         
         # Enrichir les données
         request_data.update({
@@ -85,30 +1151,121 @@ class MissionRequestManager:
         })
         
         # Enregistrer dans Firestore
-        self.requests_collection.document(request_id).set(request_data)
+        if writer is not None:
+            writer.set(self.requests_collection.document(request_id), request_data)
+        else:
+            self.requests_collection.document(request_id).set(request_data)
+        invalidate_dashboard_stats()
         
         return request_id
     
     def get_request(self, request_id: str) -> Optional[Dict]:
-        """Récupère une demande par son ID"""
+        """Récupère une demande par son ID (y compris archivée)"""
         doc = self.requests_collection.document(request_id).get()
-        return doc.to_dict() if doc.exists else None
+        if doc.exists:
+            return doc.to_dict()
+        return ArchiveStore(self.db).get('mission_requests', request_id)
     
-    def get_user_requests(self, user_email: str) -> List[Dict]:
+    def get_user_requests(self, user_email: str, view: Optional[str] = None) -> List[Dict]:
         """Récupère toutes les demandes d'un utilisateur"""
-        requests = self.requests_collection.where('email_demandeur', '==', user_email).stream()
+        query = self.requests_collection.where('email_demandeur', '==', user_email)
+        requests = project(query, 'mission_requests', view).stream()
         return [{'id': req.id, **req.to_dict()} for req in requests]
     
-    def get_all_requests(self, status: Optional[str] = None) -> List[Dict]:
-        """Récupère toutes les demandes (avec filtre optionnel par statut)"""
+    def get_all_requests(self, status: Optional[str] = None, view: Optional[str] = None) -> List[Dict]:
+        """Récupère toutes les demandes (avec filtre optionnel par statut et vue de projection)"""
         query = self.requests_collection
         
         if status:
             query = query.where('status', '==', status)
         
+        query = project(query, 'mission_requests', view)
         requests = query.order_by('created_at', direction=firestore.Query.DESCENDING).stream()
         return [{'id': req.id, **req.to_dict()} for req in requests]
     
+    def get_requests_page(self, page_size: int = 10, cursor=None, status: Optional[str] = None,
+                          structure: Optional[str] = None, date_from: Optional[datetime] = None,
+                          date_to: Optional[datetime] = None, view: Optional[str] = None) -> Dict:
+        """
+        Récupère une page de demandes (limit + start_after) sans lire toute la collection
+
+        Tri par date de création décroissante, ou par date de départ décroissante
+        si une plage de dates est fournie : Firestore impose de trier d'abord sur
+        le champ filtré par plage (l'onglet Demandes l'indique à l'écran).
+
+        Index composites requis sur mission_requests :
+            (status ASC, date_depart DESC), (structure ASC, date_depart DESC),
+            (status ASC, structure ASC, date_depart DESC),
+            (status ASC, created_at DESC), (structure ASC, created_at DESC),
+            (status ASC, structure ASC, created_at DESC)
+        ainsi que les mêmes index sur les partitions d'archive interrogées.
+
+        Args:
+            page_size: Nombre de demandes par page
+            cursor: Dernier document de la page précédente (None pour la première page)
+            status: Filtre optionnel sur le statut
+            structure: Filtre optionnel sur la structure
+            date_from / date_to: Plage optionnelle sur la date de départ
+            view: Vue de projection (voir PROJECTION_VIEWS)
+
+        Returns:
+            {'items': [...], 'cursor': curseur de la page suivante, 'has_more': bool}
+        """
+        def build(collection):
+            query = collection
+            if status:
+                query = query.where('status', '==', status)
+            if structure:
+                query = query.where('structure', '==', structure)
+            if date_from or date_to:
+                if date_from:
+                    query = query.where('date_depart', '>=', date_from)
+                if date_to:
+                    query = query.where('date_depart', '<=', date_to)
+                query = query.order_by('date_depart', direction=firestore.Query.DESCENDING)
+            else:
+                query = query.order_by('created_at', direction=firestore.Query.DESCENDING)
+            return query
+
+        # Une plage de dates antérieure à la borne d'archivage s'étend aux partitions d'archive
+        archives = []
+        if date_from or date_to:
+            archives = ArchiveStore(self.db).partitions('mission_requests', date_from, date_to)
+        if not archives:
+            query = build(self.requests_collection)
+            if cursor is not None:
+                query = query.start_after(cursor)
+            query = project(query, 'mission_requests', view)
+            docs = list(query.limit(page_size + 1).stream())
+            has_more = len(docs) > page_size
+            docs = docs[:page_size]
+            return {
+                'items': [{'id': d.id, **d.to_dict()} for d in docs],
+                'cursor': docs[-1] if docs else None,
+                'has_more': has_more
+            }
+
+        # Plusieurs sources : fusion triée, curseur = dernier document lu par source
+        cursor = cursor if isinstance(cursor, dict) else {}
+        candidates = []
+        for source in [self.requests_collection] + archives:
+            query = build(source)
+            if cursor.get(source.id) is not None:
+                query = query.start_after(cursor[source.id])
+            query = project(query, 'mission_requests', view)
+            candidates.extend((source.id, d) for d in query.limit(page_size + 1).stream())
+        candidates.sort(key=lambda c: (as_datetime((c[1].to_dict() or {}).get('date_depart')) or datetime.min, c[1].id),
+                        reverse=True)
+        page = candidates[:page_size]
+        next_cursor = dict(cursor)
+        for source_id, doc in page:
+            next_cursor[source_id] = doc
+        return {
+            'items': [{'id': d.id, **d.to_dict()} for _, d in page],
+            'cursor': next_cursor,
+            'has_more': len(candidates) > page_size
+        }
+    
     def update_request_status(self, request_id: str, status: str, admin_notes: str = ''):
         """Met à jour le statut d'une demande"""
         self.requests_collection.document(request_id).update({
@@ -116,6 +1273,14 @@ class MissionRequestManager:
             'admin_notes': admin_notes,
             'updated_at': datetime.now()
         })
+        invalidate_dashboard_stats()
+    
+    def update_request_status_by_request_id(self, request_id: str, status: str, admin_notes: str = ''):
+        """Met à jour le statut d'une demande à partir de son numéro (champ request_id)"""
+        docs = list(self.requests_collection.where('request_id', '==', request_id).limit(1).stream())
+        if not docs:
+            raise ValueError(f"Demande {request_id} introuvable")
+        self.update_request_status(docs[0].id, status, admin_notes)
     
     def assign_vehicle_driver(self, request_id: str, vehicle_id: str, driver_id: str):
         """Assigne un véhicule et un chauffeur à une demande"""
@@ -125,6 +1290,7 @@ class MissionRequestManager:
             'status': 'approved',
             'updated_at': datetime.now()
         })
+        invalidate_dashboard_stats()
     
     def cancel_request(self, request_id: str, reason: str = ''):
         """Annule une demande"""
@@ -133,88 +1299,293 @@ class MissionRequestManager:
             'cancellation_reason': reason,
             'updated_at': datetime.now()
         })
+        invalidate_dashboard_stats()
 
-    def upload_attachment(self, request_id: str, uploaded_file) -> Dict:
-        project_id = None
-        try:
-            project_id = st.secrets.get('firebase_admin', {}).get('project_id')
-        except Exception:
-            project_id = (FIREBASE_CONFIG or {}).get('projectId')
-        bucket_name = (FIREBASE_CONFIG or {}).get('storageBucket') or (f"{project_id}.appspot.com" if project_id else None)
-        if not bucket_name:
-            raise ValueError("Firebase Storage non configuré: définissez 'firebase.storageBucket' dans secrets.")
+    def upload_attachment(self, request_id: str, uploaded_file, bucket=None) -> Dict:
+        """
+        Téléverse une pièce jointe et l'ajoute à la demande.
+
+        Le fichier est haché puis envoyé par morceaux (upload resumable) sans
+        être chargé en mémoire ; son chemin dépend de son contenu (sha256),
+        si bien qu'un même document n'est stocké qu'une fois. L'ajout à la
+        demande est un ArrayUnion atomique (aucune relecture du document).
+        """
+        bucket = bucket or attachment_bucket()
         try:
-            b = storage.bucket(bucket_name)
-            req_doc = self.requests_collection.document(request_id).get()
-            req_data = req_doc.to_dict() if req_doc.exists else {}
-            uid_or_email = (req_data.get('user_uid') or req_data.get('email_demandeur') or 'unknown').replace('@','_').replace('/','_')
-            ext = os.path.splitext(uploaded_file.name)[1]
-            path = f"mission_docs/{uid_or_email}/{datetime.now().strftime('%Y%m%d-%H%M%S')}{ext}"
-            blob = b.blob(path)
-            data = uploaded_file.getvalue() if hasattr(uploaded_file, 'getvalue') else uploaded_file.read()
-            blob.upload_from_string(data, content_type=getattr(uploaded_file, 'type', None))
-            url = blob.generate_signed_url(expiration=timedelta(days=365))
-            att = {"name": uploaded_file.name, "path": path, "url": url}
-            doc_ref = self.requests_collection.document(request_id)
-            doc = doc_ref.get()
-            attachments = []
-            if doc.exists:
-                attachments = (doc.to_dict() or {}).get('attachments', []) or []
-            attachments.append(att)
-            doc_ref.update({'attachments': attachments, 'updated_at': datetime.now()})
+            uploaded_file.seek(0)
+            digest = hashlib.sha256()
+            size = 0
+            for chunk in iter(lambda: uploaded_file.read(ATTACHMENT_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+            sha256 = digest.hexdigest()
+            ext = os.path.splitext(uploaded_file.name)[1].lower()
+            path = f"{ATTACHMENT_PREFIX}/{sha256[:2]}/{sha256}{ext}"
+            content_type = getattr(uploaded_file, 'type', None)
+
+            blob = bucket.blob(path, chunk_size=ATTACHMENT_CHUNK_SIZE)
+            if not blob.exists():
+                uploaded_file.seek(0)
+                blob.upload_from_file(uploaded_file, content_type=content_type, size=size)
+            # Pas d'URL stockée : elle est signée à l'affichage (sign_attachment_urls)
+            att = {"name": uploaded_file.name, "path": path, "sha256": sha256,
+                   "size": size, "content_type": content_type}
+            self.requests_collection.document(request_id).update({
+                'attachments': firestore.ArrayUnion([att]),
+                'updated_at': datetime.now()
+            })
             return att
         except Exception as e:
-            raise RuntimeError(f"Upload Storage échoué pour le bucket '{bucket_name}': {e}")
+            raise RuntimeError(f"Upload Storage échoué pour le bucket '{bucket.name}': {e}")
+
+    def upload_attachments(self, request_id: str, uploaded_files: List, max_workers: int = 4,
+                           progress=None) -> Dict:
+        """
+        Téléverse plusieurs pièces jointes en parallèle.
+
+        Args:
+            progress: callback optionnel progress(fichiers_traités, total, nom)
+
+        Returns:
+            {'uploaded': [pièces jointes], 'errors': [(nom, message)]}
+        """
+        files = [f for f in uploaded_files if f is not None]
+        result = {'uploaded': [], 'errors': []}
+        if not files:
+            return result
+        bucket = attachment_bucket()
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(files)))) as pool:
+            futures = {pool.submit(self.upload_attachment, request_id, f, bucket): f for f in files}
+            for done, future in enumerate(as_completed(futures), start=1):
+                uploaded_file = futures[future]
+                try:
+                    result['uploaded'].append(future.result())
+                except Exception as e:
+                    result['errors'].append((uploaded_file.name, str(e)))
+                if progress is not None:
+                    progress(done, len(files), uploaded_file.name)
+        return result
 
     def auto_assign(self, request_id: str) -> Optional[Dict]:
         """Calcule une recommandation d'affectation sans créer de mission.
         Écrit les champs 'recommended_driver' et 'recommended_vehicle' sur la demande.
         """
-        req = self.get_request(request_id)
-        if not req:
-            return None
-        start_date = req.get('date_depart')
-        end_date = req.get('date_retour')
-        v_type = req.get('type_vehicule')
-        veh_mgr = VehicleManager()
-        drv_mgr = DriverManager()
-        stats_mgr = StatisticsManager()
-        vehicles = veh_mgr.get_available_vehicles(start_date, end_date)
-        drivers = drv_mgr.get_available_drivers(start_date, end_date)
-        if v_type and v_type != 'Indifférent':
-            vehicles = [v for v in vehicles if v.get('type') == v_type]
-        report = stats_mgr.get_monthly_report(datetime.now().year, datetime.now().month)
+        return self.auto_assign_batch([request_id]).get(request_id)
+
+    def auto_assign_batch(self, request_ids: Optional[List[str]] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Recommande véhicule et chauffeur pour un lot de demandes (toutes les
+        demandes en attente par défaut), par couplage de coût minimal.
+
+        Disponibilités et charge des chauffeurs sont chargées une seule fois.
+        Les demandes qui se chevauchent reçoivent des ressources distinctes ;
+        les recommandations sont écrites en un seul commit.
+
+        Returns:
+            {request_id: {'driver_id', 'vehicle_id'} ou None si aucune ressource}
+        """
+        if request_ids is None:
+            requests = self.get_all_requests(status='pending', view='list')
+        else:
+            refs = [self.requests_collection.document(rid) for rid in request_ids]
+            requests = [{'id': d.id, **d.to_dict()} for d in self.db.get_all(refs) if d.exists]
+        results = {r['id']: None for r in requests}
+        requests = [r for r in requests if as_datetime(r.get('date_depart'))]
+        if not requests:
+            return results
+
+        window_start = min(as_datetime(r.get('date_depart')) for r in requests)
+        window_end = max(as_datetime(r.get('date_retour')) or as_datetime(r.get('date_depart')) for r in requests)
+        vehicles = VehicleManager().get_all_vehicles(view='picker')
+        drivers = [d for d in DriverManager().get_all_drivers(view='picker') if d.get('status') == 'active']
+        occupancy = OccupancyIndex(self.db).occupied_by_day(window_start, window_end)
+        now = datetime.now()
+        report = StatisticsManager().get_monthly_report(now.year, now.month)
         dstats = report.get('driver_stats', {}) if isinstance(report, dict) else {}
-        def missions_count(did):
-            s = dstats.get(did) or {}
-            return int(s.get('missions', s.get('missaions', 0) or 0))
-        drivers_sorted = sorted(drivers, key=lambda d: missions_count(d.get('id')))
-        vehicle = vehicles[0] if vehicles else None
-        driver = drivers_sorted[0] if drivers_sorted else None
-        if not vehicle or not driver:
-            return None
-        # Écrire la recommandation sur la demande, sans l'approuver ni créer la mission
-        self.requests_collection.document(request_id).update({
-            'recommended_vehicle': vehicle.get('id'),
-            'recommended_driver': driver.get('id'),
-            'updated_at': datetime.now()
-        })
-        return {'driver_id': driver.get('id'), 'vehicle_id': vehicle.get('id')}
+        load = {d['id']: int((dstats.get(d['id']) or {}).get('missions', 0) or 0) for d in drivers}
+
+        def busy(req, kind):
+            out = set()
+            for key in day_keys(req.get('date_depart'), req.get('date_retour') or req.get('date_depart')):
+                out |= occupancy.get(key, {}).get(kind, set())
+            return out
+
+        def vehicle_cost(req, vehicle, occupied):
+            if vehicle['id'] in occupied:
+                return ASSIGNMENT_INFEASIBLE_COST
+            v_type = req.get('type_vehicule')
+            if v_type and v_type != 'Indifférent' and vehicle.get('type') != v_type:
+                return ASSIGNMENT_INFEASIBLE_COST
+            passengers = int(req.get('nb_passagers') or 1)
+            capacity = vehicle.get('capacite')
+            if capacity is None:
+                return 0.0
+            if int(capacity) < passengers:
+                return ASSIGNMENT_INFEASIBLE_COST
+            # Préférer le véhicule le plus juste pour garder les grands libres
+            return float(int(capacity) - passengers)
+
+        writes = ChunkedBatch(self.db)
+        for group in overlap_groups(requests, 'date_depart', 'date_retour'):
+            v_cost = []
+            d_cost = []
+            for req in group:
+                occ_v, occ_d = busy(req, 'vehicles'), busy(req, 'drivers')
+                v_cost.append([vehicle_cost(req, v, occ_v) for v in vehicles])
+                d_cost.append([ASSIGNMENT_INFEASIBLE_COST if d['id'] in occ_d else float(load[d['id']])
+                               for d in drivers])
+            v_choice = min_cost_assignment(v_cost)
+            d_choice = min_cost_assignment(d_cost)
+            for req, vi, di in zip(group, v_choice, d_choice):
+                if vi is None or di is None:
+                    continue
+                vehicle, driver = vehicles[vi], drivers[di]
+                load[driver['id']] += 1
+                results[req['id']] = {'driver_id': driver['id'], 'vehicle_id': vehicle['id']}
+                # Écrire la recommandation sur la demande, sans l'approuver ni créer la mission
+                writes.update(self.requests_collection.document(req['id']), {
+                    'recommended_vehicle': vehicle['id'],
+                    'recommended_driver': driver['id'],
+                    'updated_at': now
+                })
+        writes.commit()
+        return results
+
+    def import_requests(self, records: List[Dict], batch_size: int = 450, max_workers: int = 4,
+                        progress=None) -> Dict:
+        """
+        Écrit des demandes importées par batches concurrents, de façon idempotente.
+
+        Chaque enregistrement porte un identifiant déterministe ('request_id')
+        et une empreinte de contenu ('import_hash') : une ligne inchangée n'est
+        pas réécrite, une ligne modifiée ne met à jour que ses champs importés
+        (statut et affectations conservés).
+
+        Args:
+            records: enregistrements issus de parse_excel_requests
+            progress: callback optionnel progress(lignes_traitées, total)
+        """
+        chunks = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+        result = {'created': 0, 'updated': 0, 'unchanged': 0, 'errors': []}
+        lock = threading.Lock()
+        done = [0]
+
+        def write_chunk(chunk: List[Dict]) -> Dict:
+            refs = [self.requests_collection.document(r['request_id']) for r in chunk]
+            existing = {doc.id: (doc.to_dict() or {}).get('import_hash')
+                        for doc in self.db.get_all(refs, field_paths=['import_hash']) if doc.exists}
+            batch = self.db.batch()
+            counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+            now = datetime.now()
+            for ref, record in zip(refs, chunk):
+                if ref.id not in existing:
+                    batch.set(ref, {
+                        **record,
+                        'status': 'pending',
+                        'created_at': now,
+                        'updated_at': now,
+                        'assigned_vehicle': None,
+                        'assigned_driver': None,
+                        'admin_notes': ''
+                    })
+                    counts['created'] += 1
+                elif existing[ref.id] != record['import_hash']:
+                    batch.set(ref, {**record, 'updated_at': now}, merge=True)
+                    counts['updated'] += 1
+                else:
+                    counts['unchanged'] += 1
+            if counts['created'] or counts['updated']:
+                batch.commit()
+            return counts
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = {pool.submit(write_chunk, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    for key, value in future.result().items():
+                        result[key] += value
+                except Exception as e:
+                    result['errors'].append(f"Lot de {len(chunk)} ligne(s) à partir de la ligne {chunk[0].get('import_row')}: {e}")
+                with lock:
+                    done[0] += len(chunk)
+                    if progress is not None:
+                        progress(done[0], len(records))
+
+        if result['created'] or result['updated']:
+            invalidate_dashboard_stats()
+        return result
 
     def manual_assign_and_create_mission(self, request_id: str, vehicle_id: str, driver_id: str) -> str:
+        """
+        Affecte véhicule et chauffeur à la demande et crée la mission, en une
+        seule transaction : si un autre administrateur réserve le même véhicule
+        ou chauffeur sur la période, la transaction est rejouée puis refusée.
+        Les conflits sont lus dans l'index d'occupation, ou, tant qu'il n'est
+        pas construit, par requêtes de plage sur les missions actives.
+        """
         cal = CalendarManager()
-        req = self.get_request(request_id)
-        self.assign_vehicle_driver(request_id, vehicle_id, driver_id)
-        return cal.create_mission({
-            'request_id': request_id,
-            'motif_mission': req.get('motif_mission','') if req else '',
-            'start_date': req.get('date_depart') if req else datetime.now(),
-            'end_date': req.get('date_retour') if req else datetime.now(),
-            'driver_id': driver_id,
-            'vehicle_id': vehicle_id,
-            'budget_perdiem_fcfa': req.get('budget_perdiem_fcfa') if req else None,
-            'hotel_driver_fcfa': req.get('hotel_driver_fcfa') if req else None
-        })
+        check_occupancy = cal.occupancy.is_built()
+
+        def assign(transaction):
+            req_ref = self.requests_collection.document(request_id)
+            req_doc = req_ref.get(transaction=transaction)
+            if not req_doc.exists:
+                raise ValueError(f"Demande introuvable: {request_id}")
+            req = req_doc.to_dict() or {}
+            if req.get('mission_id'):
+                raise ValueError(f"Une mission existe déjà pour la demande {request_id}: {req['mission_id']}")
+            start_date = req.get('date_depart') or datetime.now()
+            end_date = req.get('date_retour') or start_date
+
+            if check_occupancy:
+                day_refs = [cal.occupancy.days_collection.document(k) for k in day_keys(start_date, end_date)]
+                for day in self.db.get_all(day_refs, transaction=transaction):
+                    data = (day.to_dict() or {}) if day.exists else {}
+                    if (data.get('vehicles') or {}).get(vehicle_id):
+                        raise ValueError(f"Véhicule {vehicle_id} déjà réservé le {day.id}")
+                    if (data.get('drivers') or {}).get(driver_id):
+                        raise ValueError(f"Chauffeur {driver_id} déjà réservé le {day.id}")
+            else:
+                # Index d'occupation pas encore construit : requêtes de plage lues dans la transaction
+                # Index composites requis : active_missions (vehicle_id ASC, start_date ASC), (driver_id ASC, start_date ASC)
+                period_start = as_datetime(start_date)
+                for field, resource_id, label in (('vehicle_id', vehicle_id, 'Véhicule'),
+                                                  ('driver_id', driver_id, 'Chauffeur')):
+                    query = cal.missions_collection.where(field, '==', resource_id).where('start_date', '<=', end_date)
+                    for mission in transaction.get(query):
+                        data = mission.to_dict() or {}
+                        mission_end = as_datetime(data.get('end_date') or data.get('start_date'))
+                        if data.get('status', 'active') == 'active' and mission_end and mission_end >= period_start:
+                            raise ValueError(f"{label} {resource_id} déjà réservé sur la période (mission {mission.id})")
+
+            display = cal.display_fields(driver_id, vehicle_id, transaction=transaction)
+            mission_id = cal.create_mission({
+                'request_id': request_id,
+                'motif_mission': req.get('motif_mission', ''),
+                'start_date': start_date,
+                'end_date': end_date,
+                'driver_id': driver_id,
+                'vehicle_id': vehicle_id,
+                'budget_perdiem_fcfa': req.get('budget_perdiem_fcfa'),
+                'hotel_driver_fcfa': req.get('hotel_driver_fcfa'),
+                'structure': req.get('structure') or req.get('service_demandeur'),
+                'service': req.get('service_demandeur') or req.get('structure') or '',
+                **display
+            }, writer=transaction)
+            transaction.update(req_ref, {
+                'assigned_vehicle': vehicle_id,
+                'assigned_driver': driver_id,
+                'mission_id': mission_id,
+                'status': 'approved',
+                'updated_at': datetime.now()
+            })
+            return mission_id
+
+        mission_id = run_transaction(self.db, assign)
+        invalidate_dashboard_stats()
+        invalidate_mission_index()
+        return mission_id
 
 # ==========================================
 # GESTION DES VÉHICULES
@@ -228,13 +1599,17 @@ class VehicleManager:
         self.vehicles_collection = self.db.collection('vehicles')
         self.missions_collection = self.db.collection('active_missions')
         self.drivers_collection = self.db.collection('drivers')
+        self.occupancy = OccupancyIndex(self.db)
     
-    def get_all_vehicles(self) -> List[Dict]:
-        """Récupère tous les véhicules"""
-        vehicles = self.vehicles_collection.stream()
+    def get_all_vehicles(self, view: Optional[str] = None) -> List[Dict]:
+        """Récupère tous les véhicules (vue de projection optionnelle : list, picker, report)"""
+        live = live_cache('vehicles')
+        if live is not None:
+            return live.values(live_view_fields('vehicles', view))
+        vehicles = project(self.vehicles_collection, 'vehicles', view).stream()
         return [{'id': v.id, **v.to_dict()} for v in vehicles]
     
-    def get_available_vehicles(self, start_date: datetime, end_date: datetime) -> List[Dict]:
+    def get_available_vehicles(self, start_date: datetime, end_date: datetime, view: Optional[str] = None) -> List[Dict]:
         """
         Récupère les véhicules disponibles pour une période donnée
         
@@ -245,67 +1620,83 @@ class VehicleManager:
         Returns:
             Liste des véhicules disponibles
         """
-        all_vehicles = self.get_all_vehicles()
+        all_vehicles = self.get_all_vehicles(view=view)
         
-        # Récupérer les missions actives pendant cette période
-        active_missions = self.missions_collection.where(
-            'start_date', '<=', end_date
-        ).where(
-            'end_date', '>=', start_date
-        ).stream()
-        
-        # Véhicules occupés
-        occupied_vehicle_ids = {m.to_dict().get('vehicle_id') for m in active_missions}
+        # Véhicules occupés (lecture des seuls jours de la période)
+        occupied_vehicle_ids = self.occupancy.occupied(start_date, end_date)['vehicles']
         
         # Filtrer les véhicules disponibles
         available = [v for v in all_vehicles if v['id'] not in occupied_vehicle_ids]
         
         return available
     
-    def add_vehicle(self, vehicle_data: Dict):
-        """Ajoute un nouveau véhicule"""
-        vehicle_id = f"VH-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    def add_vehicle(self, vehicle_data: Dict, writer=None):
+        """Ajoute un nouveau véhicule (dans `writer` si fourni)"""
+        vehicle_id = new_id('VH')
         vehicle_data.update({
             'vehicle_id': vehicle_id,
             'created_at': datetime.now(),
             'status': 'active'  # active, maintenance, inactive
         })
-        self.vehicles_collection.document(vehicle_id).set(vehicle_data)
+        if writer is not None:
+            writer.set(self.vehicles_collection.document(vehicle_id), vehicle_data)
+        else:
+            self.vehicles_collection.document(vehicle_id).set(vehicle_data)
+        invalidate_dashboard_stats()
         return vehicle_id
     
     def update_vehicle_status(self, vehicle_id: str, status: str):
         """Met à jour le statut d'un véhicule"""
-        self.vehicles_collection.document(vehicle_id).update({
-            'status': status,
-            'updated_at': datetime.now()
-        })
-
-    def assign_driver(self, vehicle_id: str, driver_id: str):
-        # Clear previous driver assignment on this vehicle, if any
-        try:
-            vdoc = self.vehicles_collection.document(vehicle_id).get()
-            prev_driver = None
-            if vdoc.exists:
-                prev_driver = (vdoc.to_dict() or {}).get('assigned_driver')
-        except Exception:
-            prev_driver = None
-
-        self.vehicles_collection.document(vehicle_id).update({
-            'assigned_driver': driver_id,
-            'updated_at': datetime.now()
-        })
-        self.drivers_collection.document(driver_id).update({
-            'assigned_vehicle': vehicle_id,
+        self.vehicles_collection.document(vehicle_id).update({
+            'status': status,
             'updated_at': datetime.now()
         })
-        if prev_driver and prev_driver != driver_id:
-            try:
-                self.drivers_collection.document(prev_driver).update({
-                    'assigned_vehicle': None,
-                    'updated_at': datetime.now()
-                })
-            except Exception:
-                pass
+
+    def update_vehicle(self, vehicle_id: str, updates: Dict) -> int:
+        """
+        Met à jour un véhicule ; un changement d'immatriculation est recopié
+        sur ses missions. Retourne le nombre de missions mises à jour.
+        """
+        self.vehicles_collection.document(vehicle_id).update({**updates, 'updated_at': datetime.now()})
+        if 'immatriculation' in updates:
+            return CalendarManager().propagate_display_fields(vehicle_id=vehicle_id)
+        return 0
+
+    def assign_driver(self, vehicle_id: str, driver_id: str):
+        """
+        Lie un chauffeur à un véhicule (transaction) : les anciens liens du
+        véhicule et du chauffeur sont défaits dans le même commit.
+        """
+        def link(transaction):
+            vehicle_ref = self.vehicles_collection.document(vehicle_id)
+            driver_ref = self.drivers_collection.document(driver_id)
+            vdoc = vehicle_ref.get(transaction=transaction)
+            ddoc = driver_ref.get(transaction=transaction)
+            if not vdoc.exists:
+                raise ValueError(f"Véhicule introuvable: {vehicle_id}")
+            if not ddoc.exists:
+                raise ValueError(f"Chauffeur introuvable: {driver_id}")
+            prev_driver = (vdoc.to_dict() or {}).get('assigned_driver')
+            prev_vehicle = (ddoc.to_dict() or {}).get('assigned_vehicle')
+            # Anciens partenaires lus avant toute écriture (contrainte des transactions)
+            links = []
+            if prev_driver and prev_driver != driver_id:
+                links.append((self.drivers_collection.document(prev_driver), 'assigned_vehicle', vehicle_id))
+            if prev_vehicle and prev_vehicle != vehicle_id:
+                links.append((self.vehicles_collection.document(prev_vehicle), 'assigned_driver', driver_id))
+            stale = []
+            for ref, field, expected in links:
+                doc = ref.get(transaction=transaction)
+                if doc.exists and (doc.to_dict() or {}).get(field) == expected:
+                    stale.append((ref, field))
+
+            now = datetime.now()
+            transaction.update(vehicle_ref, {'assigned_driver': driver_id, 'updated_at': now})
+            transaction.update(driver_ref, {'assigned_vehicle': vehicle_id, 'updated_at': now})
+            for ref, field in stale:
+                transaction.update(ref, {field: None, 'updated_at': now})
+
+        run_transaction(self.db, link)
 
 # ==========================================
 # GESTION DES CHAUFFEURS
@@ -318,41 +1709,42 @@ class DriverManager:
         self.db = initialize_firebase()
         self.drivers_collection = self.db.collection('drivers')
         self.missions_collection = self.db.collection('active_missions')
+        self.occupancy = OccupancyIndex(self.db)
     
-    def get_all_drivers(self) -> List[Dict]:
-        """Récupère tous les chauffeurs"""
-        drivers = self.drivers_collection.stream()
+    def get_all_drivers(self, view: Optional[str] = None) -> List[Dict]:
+        """Récupère tous les chauffeurs (vue de projection optionnelle : list, picker, report)"""
+        live = live_cache('drivers')
+        if live is not None:
+            return live.values(live_view_fields('drivers', view))
+        drivers = project(self.drivers_collection, 'drivers', view).stream()
         return [{'id': d.id, **d.to_dict()} for d in drivers]
     
-    def get_available_drivers(self, start_date: datetime, end_date: datetime) -> List[Dict]:
+    def get_available_drivers(self, start_date: datetime, end_date: datetime, view: Optional[str] = None) -> List[Dict]:
         """Récupère les chauffeurs disponibles pour une période donnée"""
-        all_drivers = self.get_all_drivers()
-        
-        # Récupérer les missions actives
-        active_missions = self.missions_collection.where(
-            'start_date', '<=', end_date
-        ).where(
-            'end_date', '>=', start_date
-        ).stream()
+        all_drivers = self.get_all_drivers(view=view)
         
-        # Chauffeurs occupés
-        occupied_driver_ids = {m.to_dict().get('driver_id') for m in active_missions}
+        # Chauffeurs occupés (lecture des seuls jours de la période)
+        occupied_driver_ids = self.occupancy.occupied(start_date, end_date)['drivers']
         
         # Filtrer les chauffeurs disponibles
         available = [d for d in all_drivers if d['id'] not in occupied_driver_ids and d.get('status') == 'active']
         
         return available
     
-    def add_driver(self, driver_data: Dict):
-        """Ajoute un nouveau chauffeur"""
-        driver_id = f"DR-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    def add_driver(self, driver_data: Dict, writer=None):
+        """Ajoute un nouveau chauffeur (dans `writer` si fourni)"""
+        driver_id = new_id('DR')
         driver_data.update({
             'driver_id': driver_id,
             'created_at': datetime.now(),
             'status': 'active',  # active, on_leave, inactive
             'total_missions': 0
         })
-        self.drivers_collection.document(driver_id).set(driver_data)
+        if writer is not None:
+            writer.set(self.drivers_collection.document(driver_id), driver_data)
+        else:
+            self.drivers_collection.document(driver_id).set(driver_data)
+        invalidate_dashboard_stats()
         return driver_id
     
     def update_driver_status(self, driver_id: str, status: str):
@@ -361,62 +1753,181 @@ class DriverManager:
             'status': status,
             'updated_at': datetime.now()
         })
+
+    def update_driver(self, driver_id: str, updates: Dict) -> int:
+        """
+        Met à jour un chauffeur ; un changement de nom est recopié sur ses
+        missions. Retourne le nombre de missions mises à jour.
+        """
+        self.drivers_collection.document(driver_id).update({**updates, 'updated_at': datetime.now()})
+        if 'name' in updates:
+            return CalendarManager().propagate_display_fields(driver_id=driver_id)
+        return 0
     
+    def _mission_aggregates(self, driver_id: str, year: int, month: int) -> Dict:
+        """Deux agrégations : toutes les missions du chauffeur et celles du mois (année comprise)"""
+        start_of_month, end_of_month = month_bounds(year, month)
+        driver_missions = self.missions_collection.where('driver_id', '==', driver_id)
+        # Index composite requis : active_missions (driver_id ASC, start_date ASC)
+        this_month = driver_missions.where('start_date', '>=', start_of_month).where('start_date', '<', end_of_month)
+        totals = aggregate_documents(driver_missions, ['distance_km'])
+        # Missions archivées : une agrégation de plus par partition annuelle
+        for partition in ArchiveStore(self.db).partitions('active_missions'):
+            archived = aggregate_documents(partition.where('driver_id', '==', driver_id), ['distance_km'])
+            totals['count'] += archived['count']
+            totals['distance_km'] += archived['distance_km']
+        return {
+            'total_missions': totals['count'],
+            'missions_this_month': count_documents(this_month),
+            'total_km': totals['distance_km']
+        }
+
     def get_driver_statistics(self, driver_id: str) -> Dict:
-        """Récupère les statistiques d'un chauffeur"""
+        """Récupère les statistiques d'un chauffeur (agrégations count/sum, aucune mission rapatriée)"""
         driver = self.drivers_collection.document(driver_id).get()
         if not driver.exists:
             return {}
         
-        driver_data = driver.to_dict()
-        
-        # Récupérer les missions du chauffeur
-        missions = self.missions_collection.where('driver_id', '==', driver_id).stream()
-        missions_list = [m.to_dict() for m in missions]
-        
+        now = datetime.now()
         return {
-            'driver_info': driver_data,
-            'total_missions': len(missions_list),
-            'missions_this_month': len([m for m in missions_list if m['start_date'].month == datetime.now().month]),
-            'total_km': sum(m.get('distance_km', 0) for m in missions_list)
+            'driver_info': driver.to_dict(),
+            **self._mission_aggregates(driver_id, now.year, now.month)
         }
 
+    def get_all_driver_statistics(self, driver_ids: Optional[List[str]] = None, max_workers: int = 8) -> Dict[str, Dict]:
+        """
+        Statistiques de tous les chauffeurs (ou de ceux demandés) en un appel :
+        deux agrégations par chauffeur, lancées en parallèle.
+        """
+        if driver_ids is None:
+            driver_ids = [d['id'] for d in self.get_all_drivers(view='report')]
+        now = datetime.now()
+        stats = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = {pool.submit(self._mission_aggregates, did, now.year, now.month): did for did in driver_ids}
+            for future in as_completed(futures):
+                stats[futures[future]] = future.result()
+        return stats
+
 # ==========================================
 # GESTION DU CALENDRIER
 # ==========================================
 
+# Champs recopiés sur chaque mission pour éviter les jointures à l'affichage
+MISSION_DISPLAY_FIELDS = ('driver_name', 'vehicle_plate', 'service')
+
+
 class CalendarManager:
     """Gestionnaire du calendrier des missions"""
     
     def __init__(self):
         self.db = initialize_firebase()
         self.missions_collection = self.db.collection('active_missions')
+        self.occupancy = OccupancyIndex(self.db)
+        self.rollups = MonthlyRollups(self.db)
     
-    def get_missions_in_period(self, start_date: datetime, end_date: datetime) -> List[Dict]:
-        """Récupère toutes les missions dans une période donnée"""
-        missions = self.missions_collection.where(
-            'start_date', '>=', start_date
-        ).where(
-            'start_date', '<=', end_date
-        ).stream()
-        
-        return [{'id': m.id, **m.to_dict()} for m in missions]
+    def get_mission_index(self, start_date: datetime, end_date: datetime, refresh: bool = False) -> MissionIntervalIndex:
+        """
+        Index d'intervalles partagé couvrant au moins [start_date, end_date]
+
+        L'index en cache est réutilisé tant qu'il couvre la période demandée ;
+        sinon il est rechargé sur l'union des deux fenêtres si elle reste sous
+        MISSION_INDEX_MAX_SPAN_DAYS, et sur la seule période demandée au-delà.
+        """
+        start = as_datetime(start_date)
+        end = as_datetime(end_date)
+        cached = None if refresh else _mission_index_cache.get('index')
+        if cached is not None:
+            lo, hi, index = cached
+            if lo <= start and end <= hi:
+                return index
+            if max(hi, end) - min(lo, start) <= timedelta(days=MISSION_INDEX_MAX_SPAN_DAYS):
+                start, end = min(lo, start), max(hi, end)
+        missions = {}
+        # Collection chaude, plus les partitions d'archive si la période remonte avant la borne
+        for source in [self.missions_collection] + ArchiveStore(self.db).partitions('active_missions', start, end):
+            query = source.where(
+                'start_date', '<=', end
+            ).where(
+                'end_date', '>=', start
+            )
+            for m in project(query, 'active_missions', 'list').stream():
+                missions[m.id] = {'id': m.id, **m.to_dict()}
+        index = MissionIntervalIndex(list(missions.values()))
+        _mission_index_cache.set('index', (start, end, index))
+        return index
+
+    def get_active_missions(self, view: Optional[str] = None) -> List[Dict]:
+        """Missions au statut 'active' (depuis le réplica en mémoire s'il est chaud)"""
+        live = live_cache('active_missions')
+        if live is not None:
+            return live.values(live_view_fields('active_missions', view))
+        query = project(self.missions_collection.where('status', '==', 'active'), 'active_missions', view)
+        return [{'id': m.id, **m.to_dict()} for m in query.stream()]
+
+    def get_missions_in_period(self, start_date: datetime, end_date: datetime,
+                               view: Optional[str] = None) -> List[Dict]:
+        """Récupère toutes les missions qui commencent dans une période donnée (documents complets par défaut)"""
+        start, end = as_datetime(start_date), as_datetime(end_date)
+        missions = []
+        for source in [self.missions_collection] + ArchiveStore(self.db).partitions('active_missions', start, end):
+            query = source.where(
+                'start_date', '>=', start
+            ).where(
+                'start_date', '<=', end
+            )
+            missions.extend({'id': m.id, **m.to_dict()} for m in project(query, 'active_missions', view).stream())
+        return missions
+
+    def get_missions_overlapping(self, start_date: datetime, end_date: datetime) -> List[Dict]:
+        """Missions qui chevauchent la période (vue 'list', depuis l'index d'intervalles partagé)"""
+        return self.get_mission_index(start_date, end_date).overlapping(start_date, end_date)
+
+    def get_missions_on_day(self, day) -> List[Dict]:
+        """Récupère les missions en cours un jour donné"""
+        start = as_datetime(day).replace(hour=0, minute=0, second=0, microsecond=0)
+        return self.get_mission_index(start, start + timedelta(days=1)).on_day(start)
+
+    def get_free_slots(self, resource_id: str, start_date: datetime, end_date: datetime, kind: str = 'vehicle') -> List[tuple]:
+        """Créneaux libres d'un véhicule (kind='vehicle') ou chauffeur (kind='driver')"""
+        return self.get_mission_index(start_date, end_date).free_slots(resource_id, start_date, end_date, kind)
 
     def update_mission_assignment_by_request(self, request_id: str, driver_id: str, vehicle_id: str) -> bool:
         """Met à jour chauffeur et véhicule pour la mission liée à une demande."""
         missions = list(self.missions_collection.where('request_id', '==', request_id).stream())
         if not missions:
             return False
+        display = self.display_fields(driver_id, vehicle_id)
+        batch = self.db.batch()
         for m in missions:
-            try:
-                self.missions_collection.document(m.id).update({
-                    'driver_id': driver_id,
-                    'vehicle_id': vehicle_id,
-                    'updated_at': datetime.now()
-                })
-            except Exception:
-                pass
+            data = m.to_dict() or {}
+            batch.update(self.missions_collection.document(m.id), {
+                'driver_id': driver_id,
+                'vehicle_id': vehicle_id,
+                **display,
+                'updated_at': datetime.now()
+            })
+            if data.get('status', 'active') == 'active':
+                self.occupancy.release(batch, m.id, data.get('start_date'), data.get('end_date'),
+                                       data.get('vehicle_id'), data.get('driver_id'))
+                self.occupancy.reserve(batch, m.id, data.get('start_date'), data.get('end_date'),
+                                       vehicle_id, driver_id)
+            self.rollups.apply(batch, data, sign=-1)
+            self.rollups.apply(batch, {**data, 'driver_id': driver_id, 'vehicle_id': vehicle_id})
+        batch.commit()
+        invalidate_mission_index()
         return True
+
+    def get_available_resources(self, start_date: datetime, end_date: datetime) -> Dict:
+        """Véhicules et chauffeurs disponibles sur la période, en une seule lecture de l'index"""
+        occupied = self.occupancy.occupied(start_date, end_date)
+        vehicles = VehicleManager().get_all_vehicles(view='picker')
+        drivers = DriverManager().get_all_drivers(view='picker')
+        return {
+            'vehicles': [v for v in vehicles if v['id'] not in occupied['vehicles']],
+            'drivers': [d for d in drivers if d['id'] not in occupied['drivers'] and d.get('status') == 'active']
+        }
+
     def check_availability(self, start_date: datetime, end_date: datetime) -> Dict:
         """
         Vérifie la disponibilité pour une période
@@ -424,13 +1935,9 @@ class CalendarManager:
         Returns:
             Dict avec les véhicules et chauffeurs disponibles
         """
-        vehicle_mgr = VehicleManager()
-        driver_mgr = DriverManager()
-        
-        available_vehicles = vehicle_mgr.get_available_vehicles(start_date, end_date)
-        available_drivers = driver_mgr.get_available_drivers(start_date, end_date)
-        # Ne considérer que les missions actives dans les calculs internes
-        # (les méthodes get_available_* s'appuient déjà sur active_missions)
+        resources = self.get_available_resources(start_date, end_date)
+        available_vehicles = resources['vehicles']
+        available_drivers = resources['drivers']
         
         return {
             'available': len(available_vehicles) > 0 and len(available_drivers) > 0,
@@ -440,55 +1947,314 @@ class CalendarManager:
             'drivers': available_drivers
         }
     
-    def create_mission(self, mission_data: Dict):
-        """Crée une mission active (après approbation)"""
-        mission_id = f"MS-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    def display_fields(self, driver_id: Optional[str], vehicle_id: Optional[str],
+                       request_id: Optional[str] = None, transaction=None) -> Dict:
+        """
+        Champs d'affichage dénormalisés d'une mission (nom du chauffeur,
+        immatriculation, service demandeur), lus en un seul get_all.
+        Le service n'est renvoyé que si `request_id` est fourni.
+        """
+        refs = {}
+        if driver_id:
+            refs['drivers'] = self.db.collection('drivers').document(driver_id)
+        if vehicle_id:
+            refs['vehicles'] = self.db.collection('vehicles').document(vehicle_id)
+        if request_id:
+            refs['mission_requests'] = self.db.collection('mission_requests').document(request_id)
+        docs = {}
+        if refs:
+            field_paths = ['name', 'immatriculation', 'service_demandeur', 'structure']
+            for doc in self.db.get_all(list(refs.values()), field_paths=field_paths, transaction=transaction):
+                if doc.exists:
+                    docs[doc.reference.parent.id] = doc.to_dict() or {}
+        fields = {
+            'driver_name': docs.get('drivers', {}).get('name') or driver_id or '',
+            'vehicle_plate': docs.get('vehicles', {}).get('immatriculation') or vehicle_id or ''
+        }
+        if request_id:
+            request = docs.get('mission_requests', {})
+            fields['service'] = request.get('service_demandeur') or request.get('structure') or ''
+        return fields
+
+    def propagate_display_fields(self, driver_id: Optional[str] = None, vehicle_id: Optional[str] = None) -> int:
+        """
+        Recopie le nom courant du chauffeur et/ou l'immatriculation courante
+        du véhicule sur toutes leurs missions (archives comprises).
+        Retourne le nombre de missions réécrites.
+        """
+        display = self.display_fields(driver_id, vehicle_id)
+        targets = []
+        if driver_id:
+            targets.append(('driver_id', driver_id, 'driver_name'))
+        if vehicle_id:
+            targets.append(('vehicle_id', vehicle_id, 'vehicle_plate'))
+        sources = [self.missions_collection] + ArchiveStore(self.db).partitions('active_missions')
+        batch = ChunkedBatch(self.db)
+        updated = 0
+        for key_field, key, display_field in targets:
+            for source in sources:
+                query = source.where(key_field, '==', key).select([display_field])
+                for doc in query.stream():
+                    if (doc.to_dict() or {}).get(display_field) != display[display_field]:
+                        batch.update(source.document(doc.id), {display_field: display[display_field]})
+                        updated += 1
+        batch.commit()
+        if updated:
+            invalidate_mission_index()
+        return updated
+
+    def backfill_display_fields(self) -> int:
+        """
+        Renseigne driver_name, vehicle_plate et service sur les missions qui
+        ne les ont pas encore (à lancer une fois pour les missions existantes).
+        """
+        drivers = {d.id: (d.to_dict() or {}).get('name')
+                   for d in self.db.collection('drivers').select(['name']).stream()}
+        vehicles = {v.id: (v.to_dict() or {}).get('immatriculation')
+                    for v in self.db.collection('vehicles').select(['immatriculation']).stream()}
+        sources = [self.missions_collection] + ArchiveStore(self.db).partitions('active_missions')
+        fields = ['driver_id', 'vehicle_id', 'request_id'] + list(MISSION_DISPLAY_FIELDS)
+        pending = [(source, doc.id, doc.to_dict() or {})
+                   for source in sources for doc in source.select(fields).stream()]
+        pending = [p for p in pending if any(f not in p[2] for f in MISSION_DISPLAY_FIELDS)]
+
+        request_ids = sorted({data['request_id'] for _, _, data in pending if data.get('request_id')})
+        services = {}
+        for i in range(0, len(request_ids), 300):
+            refs = [self.db.collection('mission_requests').document(r) for r in request_ids[i:i + 300]]
+            for doc in self.db.get_all(refs, field_paths=['service_demandeur', 'structure']):
+                if doc.exists:
+                    data = doc.to_dict() or {}
+                    services[doc.id] = data.get('service_demandeur') or data.get('structure') or ''
+        missing = sorted(set(request_ids) - set(services))
+        for partition in ArchiveStore(self.db).partitions('mission_requests') if missing else []:
+            for i in range(0, len(missing), 300):
+                refs = [partition.document(r) for r in missing[i:i + 300]]
+                for doc in self.db.get_all(refs, field_paths=['service_demandeur', 'structure']):
+                    if doc.exists:
+                        data = doc.to_dict() or {}
+                        services[doc.id] = data.get('service_demandeur') or data.get('structure') or ''
+
+        batch = ChunkedBatch(self.db)
+        for source, mission_id, data in pending:
+            batch.update(source.document(mission_id), {
+                'driver_name': drivers.get(data.get('driver_id')) or data.get('driver_id') or '',
+                'vehicle_plate': vehicles.get(data.get('vehicle_id')) or data.get('vehicle_id') or '',
+                'service': services.get(data.get('request_id'), '')
+            })
+        batch.commit()
+        if pending:
+            invalidate_mission_index()
+        return len(pending)
+
+    def create_mission(self, mission_data: Dict, writer=None):
+        """
+        Crée une mission active (après approbation)
+
+        Si `writer` (batch ou transaction) est fourni, les écritures y sont
+        ajoutées et le commit est laissé à l'appelant.
+        """
+        mission_id = new_id('MS')
+        if any(field not in mission_data for field in MISSION_DISPLAY_FIELDS):
+            display = self.display_fields(mission_data.get('driver_id'), mission_data.get('vehicle_id'),
+                                          mission_data.get('request_id'))
+            mission_data.update({k: v for k, v in display.items() if k not in mission_data})
         mission_data.update({
             'mission_id': mission_id,
             'created_at': datetime.now(),
             'status': 'active'
         })
-        self.missions_collection.document(mission_id).set(mission_data)
+        batch = writer if writer is not None else self.db.batch()
+        batch.set(self.missions_collection.document(mission_id), mission_data)
+        self.occupancy.reserve(batch, mission_id, mission_data.get('start_date'), mission_data.get('end_date'),
+                               mission_data.get('vehicle_id'), mission_data.get('driver_id'))
+        self.rollups.apply(batch, mission_data)
+        if writer is None:
+            batch.commit()
+        invalidate_dashboard_stats()
+        invalidate_mission_index()
         return mission_id
     
     def complete_mission(self, mission_id: str, completion_notes: str = ''):
-        """Marque une mission comme terminée"""
-        self.missions_collection.document(mission_id).update({
-            'status': 'completed',
-            'completed_at': datetime.now(),
-            'completion_notes': completion_notes
-        })
+        """
+        Marque une mission comme terminée et libère ses réservations
+
+        Le statut est relu dans la transaction : deux clôtures concurrentes ne
+        comptent la mission qu'une fois dans les agrégats.
+        """
+        mission_ref = self.missions_collection.document(mission_id)
+
+        def complete(transaction):
+            doc = mission_ref.get(transaction=transaction)
+            data = (doc.to_dict() or {}) if doc.exists else {}
+            transaction.update(mission_ref, {
+                'status': 'completed',
+                'completed_at': datetime.now(),
+                'completion_notes': completion_notes
+            })
+            self.occupancy.release(transaction, mission_id, data.get('start_date'), data.get('end_date'),
+                                   data.get('vehicle_id'), data.get('driver_id'))
+            if data.get('status', 'active') != 'completed':
+                self.rollups.mark_completed(transaction, data)
+
+        run_transaction(self.db, complete)
+        invalidate_dashboard_stats()
+        invalidate_mission_index()
+
+    def archive_history(self, horizon_days: Optional[int] = None, dry_run: bool = False) -> Dict:
+        """Archive les missions terminées et demandes clôturées plus anciennes que l'horizon"""
+        return ArchiveStore(self.db).archive(horizon_days, dry_run=dry_run)
 
-    def cleanup_orphan_missions(self) -> int:
+    def rebuild_occupancy_index(self) -> int:
+        """Reconstruit l'index d'occupation (à lancer une fois pour les missions existantes)"""
+        return self.occupancy.rebuild()
+
+    def _find_orphan_missions(self, chunk_size: int, max_workers: int):
+        """(missions lues, demandes référencées, demandes introuvables, missions orphelines)"""
         reqs = self.db.collection('mission_requests')
-        missions = list(self.missions_collection.stream())
-        deleted = 0
-        for m in missions:
-            data = m.to_dict() or {}
-            rid = data.get('request_id')
-            if not rid:
-                continue
-            try:
-                rdoc = reqs.document(rid).get()
-                if not rdoc.exists:
-                    self.missions_collection.document(m.id).delete()
-                    deleted += 1
-            except Exception:
-                pass
-        return deleted
+        missions = [{'id': m.id, **(m.to_dict() or {})}
+                    for m in project(self.missions_collection, 'active_missions', 'report').stream()]
+        request_ids = sorted({m['request_id'] for m in missions if m.get('request_id')})
+
+        def existing(chunk: List[str]) -> set:
+            refs = [reqs.document(rid) for rid in chunk]
+            return {doc.id for doc in self.db.get_all(refs, field_paths=['request_id']) if doc.exists}
+
+        chunks = [request_ids[i:i + chunk_size] for i in range(0, len(request_ids), chunk_size)]
+        found = set()
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            for ids in pool.map(existing, chunks):
+                found |= ids
+        missing = set(request_ids) - found
+        # Les demandes archivées ne rendent pas leurs missions orphelines
+        missing -= ArchiveStore(self.db).existing_ids('mission_requests', sorted(missing))
+        orphans = [m for m in missions if m.get('request_id') in missing]
+        return missions, request_ids, missing, orphans
+
+    def orphan_missions_report(self, chunk_size: int = 300, max_workers: int = 8) -> Dict:
+        """
+        Missions dont la demande d'origine n'existe plus (aucune suppression).
+
+        Les identifiants de demandes référencés sont vérifiés par get_all en
+        lots parallèles.
+
+        Returns:
+            rapport {'scanned', 'referenced_requests', 'missing_requests',
+            'orphans': [...]}
+        """
+        missions, request_ids, missing, orphans = self._find_orphan_missions(chunk_size, max_workers)
+        return {
+            'scanned': len(missions),
+            'referenced_requests': len(request_ids),
+            'missing_requests': len(missing),
+            'orphans': [{
+                'mission_id': m['id'],
+                'request_id': m.get('request_id'),
+                'start_date': m.get('start_date'),
+                'end_date': m.get('end_date'),
+                'vehicle_id': m.get('vehicle_id'),
+                'driver_id': m.get('driver_id'),
+                'status': m.get('status')
+            } for m in orphans]
+        }
+
+    def cleanup_orphan_missions(self, chunk_size: int = 300, max_workers: int = 8) -> int:
+        """
+        Supprime les missions dont la demande d'origine n'existe plus.
+
+        Les orphelines (voir orphan_missions_report) sont supprimées par
+        batches, avec libération de l'occupation et retrait des agrégats.
+
+        Returns:
+            nombre de missions supprimées
+        """
+        _, _, _, orphans = self._find_orphan_missions(chunk_size, max_workers)
+        if not orphans:
+            return 0
+
+        batch = ChunkedBatch(self.db)
+        for m in orphans:
+            # Les écritures d'une même mission restent dans le même commit
+            batch.reserve(len(day_keys(m.get('start_date'), m.get('end_date'))) + 2)
+            batch.delete(self.missions_collection.document(m['id']))
+            self.occupancy.release(batch, m['id'], m.get('start_date'), m.get('end_date'),
+                                   m.get('vehicle_id'), m.get('driver_id'))
+            self.rollups.apply(batch, m, sign=-1)
+        batch.commit()
+        invalidate_mission_index()
+        invalidate_dashboard_stats()
+        return len(orphans)
 
 # ==========================================
 # NOTIFICATIONS
 # ==========================================
 
+NOTIFICATION_COUNTERS_COLLECTION = 'notification_counters'
+# Compteurs dont l'existence a été vérifiée (évite une lecture par envoi)
+_seeded_counters = TTLCache(3600)
+
+
+def normalize_email(user_email: Optional[str]) -> str:
+    """Email tel qu'il est stocké sur les notifications et requêté (sans espaces, minuscules)"""
+    return (user_email or '').strip().lower()
+
+
 class NotificationManager:
-    """Gestionnaire des notifications"""
+    """
+    Gestionnaire des notifications
+
+    Chaque utilisateur a un document compteur (notification_counters) tenu à
+    jour dans le même commit que les envois et lectures : le badge « non
+    lues » coûte une seule lecture, ou aucune via watch_unread_count. Un
+    compteur absent est d'abord initialisé à partir des non lues existantes,
+    avant tout incrément. Les emails sont normalisés (normalize_email) à
+    l'écriture comme à la lecture.
+    """
     
     def __init__(self):
         self.db = initialize_firebase()
         self.notifications_collection = self.db.collection('notifications')
+        self.counters_collection = self.db.collection(NOTIFICATION_COUNTERS_COLLECTION)
+
+    def _counter_ref(self, user_email: str):
+        return self.counters_collection.document((normalize_email(user_email) or 'unknown').replace('/', '_'))
+
+    def _unread_query(self, user_email: str):
+        return self.notifications_collection.where('user_email', '==', normalize_email(user_email)).where('read', '==', False)
+
+    def _ensure_counters(self, user_emails: List[str]):
+        """Initialise (count() des non lues) les compteurs qui n'existent pas encore"""
+        pending = [e for e in dict.fromkeys(normalize_email(e) for e in user_emails) if e and not _seeded_counters.get(e)]
+        if not pending:
+            return
+        snaps = self.db.get_all([self._counter_ref(e) for e in pending], field_paths=['unread'])
+        existing = {snap.id for snap in snaps if snap.exists}
+        for user_email in pending:
+            if self._counter_ref(user_email).id not in existing:
+                self.rebuild_unread_count(user_email, only_if_missing=True)
+            _seeded_counters.set(user_email, True)
+
+    def _stage_notification(self, writer, user_email: str, title: str, message: str, notification_type: str) -> str:
+        """Écritures d'un envoi ; le compteur doit exister (_ensure_counters) avant l'incrément"""
+        user_email = normalize_email(user_email)
+        notification_id = new_id('NT')
+        writer.set(self.notifications_collection.document(notification_id), {
+            'user_email': user_email,
+            'title': title,
+            'message': message,
+            'type': notification_type,
+            'read': False,
+            'created_at': datetime.now()
+        })
+        writer.set(self._counter_ref(user_email), {
+            'user_email': user_email,
+            'unread': firestore.Increment(1),
+            'updated_at': datetime.now()
+        }, merge=True)
+        return notification_id
     
-    def send_notification(self, user_email: str, title: str, message: str, notification_type: str = 'info'):
+    def send_notification(self, user_email: str, title: str, message: str, notification_type: str = 'info',
+                          writer=None) -> str:
         """
         Envoie une notification à un utilisateur
         
@@ -497,30 +2263,217 @@ class NotificationManager:
             title: Titre de la notification
             message: Message de la notification
             notification_type: Type (info, success, warning, error)
+            writer: batch ou transaction optionnel (commit laissé à l'appelant)
         """
-        notification_data = {
-            'user_email': user_email,
-            'title': title,
-            'message': message,
-            'type': notification_type,
-            'read': False,
-            'created_at': datetime.now()
-        }
-        self.notifications_collection.add(notification_data)
+        self._ensure_counters([user_email])
+        batch = writer if writer is not None else self.db.batch()
+        notification_id = self._stage_notification(batch, user_email, title, message, notification_type)
+        if writer is None:
+            batch.commit()
+        return notification_id
+
+    def send_bulk(self, user_emails: List[str], title: str, message: str, notification_type: str = 'info') -> int:
+        """Envoie la même notification à plusieurs destinataires (un commit par lot de 225)"""
+        recipients = list(dict.fromkeys(normalize_email(e) for e in user_emails if normalize_email(e)))
+        self._ensure_counters(recipients)
+        batch = ChunkedBatch(self.db)
+        for user_email in recipients:
+            batch.reserve(2)
+            self._stage_notification(batch, user_email, title, message, notification_type)
+        batch.commit()
+        return len(recipients)
     
-    def get_user_notifications(self, user_email: str, unread_only: bool = False) -> List[Dict]:
-        """Récupère les notifications d'un utilisateur"""
-        query = self.notifications_collection.where('user_email', '==', user_email)
+    def get_user_notifications(self, user_email: str, unread_only: bool = False, limit: Optional[int] = None) -> List[Dict]:
+        """Récupère les notifications d'un utilisateur (les plus récentes d'abord)"""
+        query = self.notifications_collection.where('user_email', '==', normalize_email(user_email))
         
         if unread_only:
             query = query.where('read', '==', False)
         
-        notifications = query.order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-        return [{'id': n.id, **n.to_dict()} for n in notifications]
+        query = query.order_by('created_at', direction=firestore.Query.DESCENDING)
+        if limit:
+            query = query.limit(limit)
+        return [{'id': n.id, **n.to_dict()} for n in query.stream()]
+
+    def get_notifications_page(self, user_email: str, page_size: int = 20, cursor=None,
+                               unread_only: bool = False) -> Dict:
+        """Page d'historique : {'items', 'cursor', 'has_more'} (cursor = dernier document de la page)"""
+        query = self.notifications_collection.where('user_email', '==', normalize_email(user_email))
+        if unread_only:
+            query = query.where('read', '==', False)
+        query = query.order_by('created_at', direction=firestore.Query.DESCENDING)
+        if cursor is not None:
+            query = query.start_after(cursor)
+        docs = list(query.limit(page_size + 1).stream())
+        page = docs[:page_size]
+        return {
+            'items': [{'id': n.id, **n.to_dict()} for n in page],
+            'cursor': page[-1] if page else cursor,
+            'has_more': len(docs) > page_size
+        }
+
+    def get_unread_count(self, user_email: str) -> int:
+        """Nombre de notifications non lues (une lecture du document compteur)"""
+        snap = self._counter_ref(user_email).get()
+        if snap.exists:
+            return max(0, int((snap.to_dict() or {}).get('unread', 0) or 0))
+        return self.rebuild_unread_count(user_email)
+
+    def rebuild_unread_count(self, user_email: str, only_if_missing: bool = False) -> int:
+        """
+        Recalcule le compteur d'un utilisateur (agrégation count(), transaction)
+
+        Avec only_if_missing, un compteur déjà créé (par un envoi concurrent)
+        est laissé tel quel.
+        """
+        user_email = normalize_email(user_email)
+        counter_ref = self._counter_ref(user_email)
+        query = self._unread_query(user_email)
+
+        def rebuild(transaction):
+            snap = counter_ref.get(transaction=transaction)
+            if only_if_missing and snap.exists:
+                return max(0, int((snap.to_dict() or {}).get('unread', 0) or 0))
+            unread = count_documents(query)
+            transaction.set(counter_ref, {'user_email': user_email, 'unread': unread, 'updated_at': datetime.now()})
+            return unread
+
+        unread = run_transaction(self.db, rebuild)
+        _seeded_counters.set(user_email, True)
+        return unread
+
+    def backfill_counters(self) -> int:
+        """
+        Migration unique : normalise les emails des notifications existantes
+        puis recalcule le compteur de chaque destinataire. Retourne le nombre
+        de compteurs recalculés.
+        """
+        batch = ChunkedBatch(self.db)
+        emails = set()
+        for n in self.notifications_collection.select(['user_email']).stream():
+            raw = (n.to_dict() or {}).get('user_email')
+            user_email = normalize_email(raw)
+            if not user_email:
+                continue
+            emails.add(user_email)
+            if raw != user_email:
+                batch.update(self.notifications_collection.document(n.id), {'user_email': user_email})
+        batch.commit()
+        for user_email in sorted(emails):
+            self.rebuild_unread_count(user_email)
+        return len(emails)
     
     def mark_as_read(self, notification_id: str):
-        """Marque une notification comme lue"""
-        self.notifications_collection.document(notification_id).update({'read': True})
+        """Marque une notification comme lue (et décrémente le compteur si elle ne l'était pas)"""
+        ref = self.notifications_collection.document(notification_id)
+
+        def mark(transaction):
+            snap = ref.get(transaction=transaction)
+            data = (snap.to_dict() or {}) if snap.exists else {}
+            if not snap.exists or data.get('read'):
+                return False
+            counter_ref = self._counter_ref(data.get('user_email'))
+            counter = counter_ref.get(transaction=transaction)
+            transaction.update(ref, {'read': True, 'read_at': datetime.now()})
+            if counter.exists:
+                transaction.set(counter_ref, {
+                    'unread': firestore.Increment(-1),
+                    'updated_at': datetime.now()
+                }, merge=True)
+            else:
+                # Compteur jamais créé : initialisé avec les non lues existantes, celle-ci déduite
+                user_email = normalize_email(data.get('user_email'))
+                transaction.set(counter_ref, {
+                    'user_email': user_email,
+                    'unread': max(0, count_documents(self._unread_query(user_email)) - 1),
+                    'updated_at': datetime.now()
+                })
+            return True
+
+        return run_transaction(self.db, mark)
+
+    def mark_all_read(self, user_email: str, chunk_size: int = 400) -> int:
+        """
+        Marque toutes les notifications non lues d'un utilisateur comme lues
+
+        Une transaction par lot : l'état 'read' est relu dans la transaction,
+        si bien qu'une notification marquée en parallèle (mark_as_read) n'est
+        décrémentée qu'une fois du compteur.
+        """
+        self._ensure_counters([user_email])
+        unread = self._unread_query(user_email)
+        refs = [self.notifications_collection.document(n.id) for n in unread.select(['read']).stream()]
+
+        def mark_chunk(chunk):
+            def mark(transaction):
+                now = datetime.now()
+                still_unread = [
+                    snap.reference
+                    for snap in self.db.get_all(chunk, field_paths=['read'], transaction=transaction)
+                    if snap.exists and not (snap.to_dict() or {}).get('read')
+                ]
+                for ref in still_unread:
+                    transaction.update(ref, {'read': True, 'read_at': now})
+                if still_unread:
+                    transaction.set(self._counter_ref(user_email), {
+                        'unread': firestore.Increment(-len(still_unread)),
+                        'updated_at': now
+                    }, merge=True)
+                return len(still_unread)
+            return run_transaction(self.db, mark)
+
+        return sum(mark_chunk(refs[i:i + chunk_size]) for i in range(0, len(refs), chunk_size))
+
+    def watch_unread_count(self, user_email: str, callback):
+        """
+        Pousse le nombre de non lues à callback(nombre) à chaque changement
+        (snapshot listener sur le compteur). Retourne le watch (unsubscribe()).
+        """
+        def on_snapshot(docs, changes, read_time):
+            data = (docs[0].to_dict() or {}) if docs and docs[0].exists else {}
+            callback(max(0, int(data.get('unread', 0) or 0)))
+
+        self._ensure_counters([user_email])
+        return self._counter_ref(user_email).on_snapshot(on_snapshot)
+
+    def watch_notifications(self, user_email: str, callback):
+        """Pousse les notifications non lues à callback(liste) à chaque changement"""
+        query = self._unread_query(user_email)
+
+        def on_snapshot(docs, changes, read_time):
+            callback([{'id': d.id, **(d.to_dict() or {})} for d in docs])
+
+        return query.on_snapshot(on_snapshot)
+
+# Listeners de compteurs « non lues » partagés par les sessions (les plus anciens arrêtés au-delà de la limite)
+UNREAD_WATCHES_MAX = 200
+_unread_watches = OrderedDict()
+_unread_watches_lock = threading.Lock()
+
+
+def live_unread_count(user_email: str) -> Optional[int]:
+    """
+    Nombre de non lues poussé par le listener du compteur (démarré au premier
+    appel pour cet email). None tant que le premier snapshot n'est pas arrivé.
+    """
+    user_email = normalize_email(user_email)
+    if not user_email:
+        return None
+    with _unread_watches_lock:
+        entry = _unread_watches.get(user_email)
+        if entry is None:
+            entry = {'unread': None}
+
+            def on_change(unread, entry=entry):
+                entry['unread'] = unread
+
+            entry['watch'] = NotificationManager().watch_unread_count(user_email, on_change)
+            _unread_watches[user_email] = entry
+            while len(_unread_watches) > UNREAD_WATCHES_MAX:
+                _, oldest = _unread_watches.popitem(last=False)
+                oldest['watch'].unsubscribe()
+        _unread_watches.move_to_end(user_email)
+    return entry['unread']
 
 # ==========================================
 # STATISTIQUES
@@ -535,20 +2488,19 @@ class StatisticsManager:
         self.missions_collection = self.db.collection('active_missions')
         self.drivers_collection = self.db.collection('drivers')
         self.vehicles_collection = self.db.collection('vehicles')
+        self.rollups = MonthlyRollups(self.db)
     
-    def get_dashboard_stats(self) -> Dict:
-        """Récupère les statistiques pour le tableau de bord admin"""
-        # Demandes en attente
-        pending_requests = len(list(self.requests_collection.where('status', '==', 'pending').stream()))
-        
-        # Missions actives
-        active_missions = len(list(self.missions_collection.where('status', '==', 'active').stream()))
-        
-        # Total véhicules
-        total_vehicles = len(list(self.vehicles_collection.stream()))
-        
-        # Total chauffeurs
-        total_drivers = len(list(self.drivers_collection.stream()))
+    def get_dashboard_stats(self, refresh: bool = False) -> Dict:
+        """
+        Récupère les statistiques pour le tableau de bord admin
+
+        Les KPI sont calculés par agrégations count() (aucun document rapatrié)
+        et partagés entre les sessions pendant DASHBOARD_STATS_TTL_SECONDS.
+        """
+        if not refresh:
+            cached = _dashboard_stats_cache.get('dashboard')
+            if cached is not None:
+                return dict(cached)
         
         # Statistiques du mois (basées sur start_date dans le mois en cours)
         now = datetime.now()
@@ -557,74 +2509,338 @@ class StatisticsManager:
             end_of_month = datetime(now.year + 1, 1, 1)
         else:
             end_of_month = datetime(now.year, now.month + 1, 1)
-        missions_this_month = len(list(
-            self.missions_collection.where('start_date', '>=', start_of_month).where('start_date', '<', end_of_month).stream()
-        ))
         
-        return {
-            'pending_requests': pending_requests,
-            'active_missions': active_missions,
-            'total_vehicles': total_vehicles,
-            'total_drivers': total_drivers,
-            'missions_this_month': missions_this_month
+        # Les collections répliquées en mémoire se comptent sans aucune lecture
+        live_missions = live_cache('active_missions')
+        live_vehicles = live_cache('vehicles')
+        live_drivers = live_cache('drivers')
+        stats = {
+            # Demandes en attente
+            'pending_requests': count_documents(self.requests_collection.where('status', '==', 'pending')),
+            # Missions actives
+            'active_missions': len(live_missions) if live_missions is not None else count_documents(self.missions_collection.where('status', '==', 'active')),
+            # Total véhicules
+            'total_vehicles': len(live_vehicles) if live_vehicles is not None else count_documents(self.vehicles_collection),
+            # Total chauffeurs
+            'total_drivers': len(live_drivers) if live_drivers is not None else count_documents(self.drivers_collection),
+            'missions_this_month': count_documents(
+                self.missions_collection.where('start_date', '>=', start_of_month).where('start_date', '<', end_of_month)
+            )
         }
+        _dashboard_stats_cache.set('dashboard', stats)
+        return dict(stats)
     
     def get_monthly_report(self, year: int, month: int) -> Dict:
-        start_date = datetime(year, month, 1)
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1)
-        else:
-            end_date = datetime(year, month + 1, 1)
-        
-        missions = list(self.missions_collection.where(
-            'start_date', '>=', start_date
-        ).where(
-            'start_date', '<', end_date
-        ).stream())
-        missions_data = [m.to_dict() for m in missions]
-        
-        total_missions = len(missions_data)
-        total_km = sum(m.get('distance_km', 0) for m in missions_data)
-        
-        perdiem_per_day_default = 8000
-        hotel_fee_per_night_default = 60000
-        driver_stats = {}
-        for mission in missions_data:
-            driver_id = mission.get('driver_id')
-            if not driver_id:
-                continue
-            start = mission.get('start_date')
-            end = mission.get('end_date')
-            days = 0
-            try:
-                if start and end:
-                    days = (end - start).days + 1
-            except Exception:
-                try:
-                    start_dt = datetime.fromisoformat(str(start)) if start else None
-                    end_dt = datetime.fromisoformat(str(end)) if end else None
-                    if start_dt and end_dt:
-                        days = (end_dt - start_dt).days + 1
-                except Exception:
-                    days = 0
-            nights = max(0, days - 1)
-            perdiem_rate = mission.get('budget_perdiem_fcfa') or perdiem_per_day_default
-            hotel_rate = mission.get('hotel_driver_fcfa') or hotel_fee_per_night_default
-            if driver_id not in driver_stats:
-                driver_stats[driver_id] = {'missions': 0, 'km': 0, 'days': 0, 'perdiem_fcfa': 0, 'hotel_fcfa': 0, 'total_fcfa': 0}
-            driver_stats[driver_id]['missions'] += 1
-            driver_stats[driver_id]['km'] += mission.get('distance_km', 0)
-            driver_stats[driver_id]['days'] += max(0, days)
-            driver_stats[driver_id]['perdiem_fcfa'] += int(perdiem_rate) * max(0, days)
-            driver_stats[driver_id]['hotel_fcfa'] += int(hotel_rate) * nights
-            driver_stats[driver_id]['total_fcfa'] = driver_stats[driver_id]['perdiem_fcfa'] + driver_stats[driver_id]['hotel_fcfa']
-        
+        """Rapport mensuel lu depuis le document d'agrégats du mois"""
+        return self._to_report(self.rollups.get(year, month))
+
+    def get_yearly_report(self, year: int) -> List[Dict]:
+        """Rapports des 12 mois d'une année en une seule lecture groupée"""
+        rollups = self.rollups.get_many([(year, month) for month in range(1, 13)])
+        return [self._to_report(rollups[(year, month)]) for month in range(1, 13)]
+
+    def rebuild_monthly_rollups(self, year: int, months: Optional[List[int]] = None) -> int:
+        """Recalcule les agrégats mensuels d'une année (tous les mois par défaut)"""
+        months = months or list(range(1, 13))
+        for month in months:
+            self.rollups.rebuild(year, month)
+        return len(months)
+
+    @staticmethod
+    def _to_report(rollup: Dict) -> Dict:
+        def active(stats):
+            return {k: v for k, v in (stats or {}).items() if (v or {}).get('missions', 0) > 0}
         return {
-            'period': f"{month}/{year}",
-            'total_missions': total_missions,
-            'total_km': total_km,
-            'driver_stats': driver_stats
+            'period': rollup.get('period'),
+            'total_missions': rollup.get('total_missions', 0),
+            'total_km': rollup.get('total_km', 0),
+            'completed_missions': rollup.get('completed_missions', 0),
+            'driver_stats': active(rollup.get('driver_stats')),
+            'vehicle_stats': active(rollup.get('vehicle_stats')),
+            'structure_stats': active(rollup.get('structure_stats'))
+        }
+
+# ==========================================
+# IMPORT EXCEL
+# ==========================================
+
+# Colonne Excel -> champ Firestore (texte)
+EXCEL_IMPORT_TEXT_COLUMNS = {
+    'Structure': 'structure',
+    'Action': 'action',
+    'Destination': 'destination',
+    'Porteur': 'porteur',
+    'CR': 'compte_cr',
+    'Etat Mission': 'etat_mission'
+}
+EXCEL_IMPORT_DATE_COLUMNS = {
+    'Date expression besoin': 'date_expression_besoin',
+    'DATE DEPART': 'date_depart',
+    'DATE RETOUR': 'date_retour'
+}
+# Colonnes qui identifient une ligne d'une année sur l'autre
+EXCEL_IMPORT_KEY_COLUMNS = ['Structure', 'Action', 'Destination', 'Porteur', 'DATE DEPART']
+
+
+def parse_excel_requests(df):
+    """
+    Convertit une feuille Excel en enregistrements de demandes (traitement
+    vectoriel par colonnes). Retourne (enregistrements, erreurs).
+    """
+    import pandas as pd
+
+    df = df.reset_index(drop=True)
+    out = pd.DataFrame(index=df.index)
+    for col, field in EXCEL_IMPORT_TEXT_COLUMNS.items():
+        values = df[col] if col in df.columns else pd.Series('', index=df.index)
+        out[field] = values.fillna('').astype(str).str.strip()
+    out['etat_mission'] = out['etat_mission'].mask(out['etat_mission'] == '', 'Planifié')
+    for col, field in EXCEL_IMPORT_DATE_COLUMNS.items():
+        values = df[col] if col in df.columns else pd.Series(pd.NaT, index=df.index)
+        try:
+            out[field] = pd.to_datetime(values, errors='coerce', dayfirst=True, format='mixed')
+        except (TypeError, ValueError):
+            out[field] = pd.to_datetime(values, errors='coerce', dayfirst=True)
+    nb = df['Nombre de véhicules validés'] if 'Nombre de véhicules validés' in df.columns else pd.Series(1, index=df.index)
+    out['nombre_vehicules_valides'] = pd.to_numeric(nb, errors='coerce').fillna(1).astype(int)
+    perdu = df['PERDU/M'] if 'PERDU/M' in df.columns else pd.Series('', index=df.index)
+    out['perdu_m'] = perdu.fillna('').astype(str).str.strip().str.upper() == 'OUI'
+
+    # Champs obligatoires du formulaire
+    out['nom_demandeur'] = out['porteur']
+    porteur = out['porteur'].mask(out['porteur'] == '', 'unknown')
+    out['email_demandeur'] = (porteur + '@sonatel.sn').str.lower().str.replace(' ', '.', regex=False)
+    out['service_demandeur'] = out['structure']
+    out['motif_mission'] = out['action']
+    out['nb_passagers'] = 1
+    out['type_vehicule'] = 'Indifférent'
+    out['avec_chauffeur'] = True
+
+    # Validation
+    invalid = out['date_depart'].isna()
+    inverted = out['date_retour'].notna() & ~invalid & (out['date_retour'] < out['date_depart'])
+    errors = [f"Ligne {i + 2}: date de départ manquante ou invalide" for i in out.index[invalid]]
+    errors += [f"Ligne {i + 2}: date de retour antérieure au départ" for i in out.index[inverted]]
+    out['import_row'] = out.index + 2
+    out = out[~(invalid | inverted)]
+
+    # Identifiant déterministe (clé métier) et empreinte du contenu
+    key_cols = [EXCEL_IMPORT_TEXT_COLUMNS.get(c) or EXCEL_IMPORT_DATE_COLUMNS.get(c) for c in EXCEL_IMPORT_KEY_COLUMNS]
+    key_hash = pd.util.hash_pandas_object(out[key_cols].astype(str), index=False)
+    content_cols = [c for c in out.columns if c != 'import_row']
+    content_hash = pd.util.hash_pandas_object(out[content_cols].astype(str), index=False)
+    out['request_id'] = 'DM-' + out['date_depart'].dt.strftime('%Y%m%d') + '-XL' + key_hash.map('{:016x}'.format)
+    out['import_hash'] = content_hash.map('{:016x}'.format)
+    # Une ligne répétée dans la feuille n'est écrite qu'une fois (la dernière l'emporte)
+    out = out.drop_duplicates('request_id', keep='last')
+
+    records = out.to_dict('records')
+    for record in records:
+        for field in EXCEL_IMPORT_DATE_COLUMNS.values():
+            value = record[field]
+            record[field] = value.to_pydatetime() if pd.notna(value) else None
+        record['import_row'] = int(record['import_row'])
+        record['nombre_vehicules_valides'] = int(record['nombre_vehicules_valides'])
+    return records, errors
+
+
+def import_excel_to_firebase(excel_file, progress=None, max_workers: int = 4) -> Dict:
+    """Importe un classeur Excel de missions (idempotent : seules les lignes nouvelles ou modifiées sont écrites)"""
+    import pandas as pd
+
+    df = pd.read_excel(excel_file)
+    records, errors = parse_excel_requests(df)
+    result = MissionRequestManager().import_requests(records, max_workers=max_workers, progress=progress)
+    result['errors'] = errors + result['errors']
+    result['imported'] = result['created'] + result['updated']
+    return result
+
+# ==========================================
+# ACCÈS ASYNCHRONE (LECTURES CONCURRENTES)
+# ==========================================
+
+_async_state = {'loop': None, 'client': None}
+_async_lock = threading.Lock()
+
+
+def _async_loop() -> asyncio.AbstractEventLoop:
+    """Boucle d'événements dédiée (thread de fond), partagée par le processus"""
+    with _async_lock:
+        if _async_state['loop'] is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='firestore-async', daemon=True).start()
+            _async_state['loop'] = loop
+        return _async_state['loop']
+
+
+def initialize_async_firebase():
+    """Client Firestore asynchrone (AsyncClient), à n'utiliser que sur la boucle de gather()"""
+    if os.getenv('FIRESTORE_BACKEND', '').lower() == 'memory':
+        from firestore_memory import get_async_memory_client
+        return get_async_memory_client()
+    initialize_firebase()
+    with _async_lock:
+        if _async_state['client'] is None:
+            _async_state['client'] = firestore_async.client()
+        return _async_state['client']
+
+
+def gather(*aws, timeout: Optional[float] = 60):
+    """
+    Exécute des coroutines indépendantes en parallèle depuis du code
+    synchrone (Streamlit) et retourne leurs résultats dans l'ordre.
+    Durée totale ≈ la plus lente des lectures au lieu de leur somme.
+    """
+    async def _all():
+        return await asyncio.gather(*aws)
+
+    return asyncio.run_coroutine_threadsafe(_all(), _async_loop()).result(timeout)
+
+
+async def count_documents_async(query) -> int:
+    """Nombre de documents d'une requête asynchrone (agrégation count())"""
+    result = await query.count(alias='total').get()
+    return int(result[0][0].value)
+
+
+class AsyncMissionRequestManager:
+    """Lectures asynchrones des demandes de mission"""
+
+    def __init__(self):
+        self.db = initialize_async_firebase()
+        self.requests_collection = self.db.collection('mission_requests')
+
+    async def get_request(self, request_id: str) -> Optional[Dict]:
+        doc = await self.requests_collection.document(request_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    async def get_all_requests(self, status: Optional[str] = None, view: Optional[str] = None) -> List[Dict]:
+        query = self.requests_collection
+        if status:
+            query = query.where('status', '==', status)
+        return [{'id': r.id, **r.to_dict()} async for r in project(query, 'mission_requests', view).stream()]
+
+
+class AsyncVehicleManager:
+    """Lectures asynchrones des véhicules"""
+
+    def __init__(self):
+        self.db = initialize_async_firebase()
+        self.vehicles_collection = self.db.collection('vehicles')
+
+    async def get_all_vehicles(self, view: Optional[str] = None) -> List[Dict]:
+        live = live_cache('vehicles')
+        if live is not None:
+            return live.values(live_view_fields('vehicles', view))
+        return [{'id': v.id, **v.to_dict()} async for v in project(self.vehicles_collection, 'vehicles', view).stream()]
+
+
+class AsyncDriverManager:
+    """Lectures asynchrones des chauffeurs"""
+
+    def __init__(self):
+        self.db = initialize_async_firebase()
+        self.drivers_collection = self.db.collection('drivers')
+
+    async def get_all_drivers(self, view: Optional[str] = None) -> List[Dict]:
+        live = live_cache('drivers')
+        if live is not None:
+            return live.values(live_view_fields('drivers', view))
+        return [{'id': d.id, **d.to_dict()} async for d in project(self.drivers_collection, 'drivers', view).stream()]
+
+
+class AsyncCalendarManager:
+    """Lectures asynchrones des missions"""
+
+    def __init__(self):
+        self.db = initialize_async_firebase()
+        self.missions_collection = self.db.collection('active_missions')
+
+    async def get_missions_overlapping(self, start_date: datetime, end_date: datetime,
+                                       view: Optional[str] = 'list') -> List[Dict]:
+        """Missions qui chevauchent la période (comme CalendarManager.get_missions_overlapping, vue 'list' par défaut)"""
+        start, end = as_datetime(start_date), as_datetime(end_date)
+        # Lecture (synchrone) de la borne d'archivage exécutée hors de la boucle
+        archives = await asyncio.to_thread(ArchiveStore(initialize_firebase()).partitions, 'active_missions', start, end)
+        sources = [self.missions_collection] + [self.db.collection(c.id) for c in archives]
+
+        async def read(source):
+            query = source.where('start_date', '<=', end).where('end_date', '>=', start)
+            return [{'id': m.id, **m.to_dict()} async for m in project(query, 'active_missions', view).stream()]
+
+        results = await asyncio.gather(*(read(source) for source in sources))
+        return [m for missions in results for m in missions]
+
+    async def check_availability(self, start_date: datetime, end_date: datetime) -> Dict:
+        """Disponibilités (index d'occupation synchrone, exécuté hors de la boucle)"""
+        return await asyncio.to_thread(CalendarManager().check_availability, start_date, end_date)
+
+
+class AsyncStatisticsManager:
+    """Statistiques calculées par agrégations concurrentes"""
+
+    def __init__(self):
+        self.db = initialize_async_firebase()
+        self.requests_collection = self.db.collection('mission_requests')
+        self.missions_collection = self.db.collection('active_missions')
+        self.drivers_collection = self.db.collection('drivers')
+        self.vehicles_collection = self.db.collection('vehicles')
+        self.rollups_collection = self.db.collection(ROLLUP_COLLECTION)
+
+    async def get_dashboard_stats(self, refresh: bool = False) -> Dict:
+        """Même résultat (et même cache) que StatisticsManager.get_dashboard_stats, counts lancés en parallèle"""
+        if not refresh:
+            cached = _dashboard_stats_cache.get('dashboard')
+            if cached is not None:
+                return dict(cached)
+        start_of_month, end_of_month = month_bounds(datetime.now().year, datetime.now().month)
+
+        async def live_or_count(name, query):
+            live = live_cache(name)
+            return len(live) if live is not None else await count_documents_async(query)
+
+        pending, active, vehicles, drivers, this_month = await asyncio.gather(
+            count_documents_async(self.requests_collection.where('status', '==', 'pending')),
+            live_or_count('active_missions', self.missions_collection.where('status', '==', 'active')),
+            live_or_count('vehicles', self.vehicles_collection),
+            live_or_count('drivers', self.drivers_collection),
+            count_documents_async(
+                self.missions_collection.where('start_date', '>=', start_of_month).where('start_date', '<', end_of_month)
+            )
+        )
+        stats = {
+            'pending_requests': pending,
+            'active_missions': active,
+            'total_vehicles': vehicles,
+            'total_drivers': drivers,
+            'missions_this_month': this_month
         }
+        _dashboard_stats_cache.set('dashboard', stats)
+        return dict(stats)
+
+    async def get_monthly_report(self, year: int, month: int) -> Dict:
+        """Rapport mensuel (document d'agrégats ; recalcul synchrone si absent)"""
+        snap = await self.rollups_collection.document(f"{year:04d}-{month:02d}").get()
+        data = snap.to_dict() if snap.exists else None
+        if not data or not data.get('built_at'):
+            data = await asyncio.to_thread(MonthlyRollups(initialize_firebase()).rebuild, year, month)
+        return StatisticsManager._to_report(data)
+
+
+def load_report_data(start_date: datetime, end_date: datetime) -> Dict:
+    """
+    Données de l'onglet rapports (missions qui chevauchent la période, vue
+    'list', et KPI) chargées en parallèle. Les missions portent déjà nom du chauffeur, immatriculation
+    et service : aucune lecture des chauffeurs, véhicules ou demandes.
+    """
+    missions, dashboard = gather(
+        AsyncCalendarManager().get_missions_overlapping(start_date, end_date),
+        AsyncStatisticsManager().get_dashboard_stats()
+    )
+    return {
+        'missions': missions,
+        'dashboard': dashboard
+    }
 
 # ==========================================
 # FONCTION D'AIDE POUR STREAMLIT
@@ -0,0 +1,1050 @@
+"""
+Backend Firestore en mémoire (mode hors ligne, tests de charge et benchmarks)
+
+Implémente, dans le processus, le sous-ensemble de l'API Firestore utilisé par
+les gestionnaires de firebase_config : collections et documents, where
+(égalité, intervalles, in, array_contains), order_by, limit, offset,
+start_after, select, agrégations count/sum/avg, get_all, batches,
+transactions, transformations (Increment, ArrayUnion, ArrayRemove,
+SERVER_TIMESTAMP, DELETE_FIELD) et snapshot listeners.
+
+Activation : FIRESTORE_BACKEND=memory (initialize_firebase renvoie alors ce
+client). FIRESTORE_MEMORY_SEED=<nb de demandes> peuple une flotte synthétique.
+
+Benchmark : python firestore_memory.py --requests 20000 --missions 10000
+"""
+
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, date, timezone
+from enum import Enum
+from typing import Dict, List, Optional
+
+from google.api_core.exceptions import NotFound
+
+ASCENDING = 'ASCENDING'
+DESCENDING = 'DESCENDING'
+
+
+# ==========================================
+# VALEURS ET TRANSFORMATIONS
+# ==========================================
+
+def _copy(value):
+    """Copie profonde limitée aux dict/list (les autres valeurs sont immuables)"""
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _sentinel_kind(value) -> Optional[str]:
+    """Reconnaît les sentinelles google-cloud-firestore sans en dépendre"""
+    name = type(value).__name__
+    if name in ('Increment', 'ArrayUnion', 'ArrayRemove', 'Maximum', 'Minimum'):
+        return name
+    if name == 'Sentinel':
+        description = getattr(value, 'description', '')
+        if 'server timestamp' in description:
+            return 'SERVER_TIMESTAMP'
+        if 'delete' in description:
+            return 'DELETE_FIELD'
+    return None
+
+
+def _encode(value):
+    """Normalise une valeur comme le ferait Firestore (datetimes en UTC, tuples en listes)"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+    if isinstance(value, date):
+        raise TypeError(f"Cannot convert to a Firestore Value: {value!r} (datetime.date)")
+    if isinstance(value, dict):
+        return {str(k): _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, set):
+        raise TypeError(f"Cannot convert to a Firestore Value: {value!r}")
+    return value
+
+
+def _apply_sentinel(kind: str, sentinel, current):
+    if kind == 'Increment':
+        step = getattr(sentinel, 'value', None)
+        step = sentinel._value if step is None else step
+        return (current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0) + step
+    if kind in ('Maximum', 'Minimum'):
+        other = getattr(sentinel, 'value', None)
+        if not isinstance(current, (int, float)) or isinstance(current, bool):
+            return other
+        return max(current, other) if kind == 'Maximum' else min(current, other)
+    if kind == 'ArrayUnion':
+        result = list(current) if isinstance(current, list) else []
+        for item in _encode(list(sentinel.values)):
+            if item not in result:
+                result.append(item)
+        return result
+    if kind == 'ArrayRemove':
+        removed = _encode(list(sentinel.values))
+        return [item for item in (current if isinstance(current, list) else []) if item not in removed]
+    if kind == 'SERVER_TIMESTAMP':
+        return datetime.now(timezone.utc)
+    raise ValueError(f"Sentinelle non supportée: {kind}")
+
+
+def _split_path(field_path: str) -> List[str]:
+    return [part.strip('`') for part in field_path.split('.')]
+
+
+def _get_field(data: Dict, field_path: str):
+    """Valeur d'un champ (chemin pointé) ; lève KeyError si absent"""
+    value = data
+    for part in _split_path(field_path):
+        if not isinstance(value, dict) or part not in value:
+            raise KeyError(field_path)
+        value = value[part]
+    return value
+
+
+def _set_field(data: Dict, parts: List[str], value):
+    """Affecte un champ (chemin découpé), sentinelles comprises"""
+    target = data
+    for part in parts[:-1]:
+        if not isinstance(target.get(part), dict):
+            target[part] = {}
+        target = target[part]
+    kind = _sentinel_kind(value)
+    if kind == 'DELETE_FIELD':
+        target.pop(parts[-1], None)
+    elif kind is not None:
+        target[parts[-1]] = _apply_sentinel(kind, value, target.get(parts[-1]))
+    elif isinstance(value, dict):
+        # Une map remplace la précédente ; ses éventuelles sentinelles sont appliquées
+        target[parts[-1]] = {}
+        _merge(target[parts[-1]], value)
+    else:
+        target[parts[-1]] = _encode(value)
+
+
+def _merge(target: Dict, data: Dict, prefix: Optional[List[str]] = None):
+    """set(merge=True) : les maps sont fusionnées récursivement"""
+    prefix = prefix or []
+    for key, value in data.items():
+        if isinstance(value, dict) and _sentinel_kind(value) is None and value:
+            _merge(target, value, prefix + [str(key)])
+        else:
+            _set_field(target, prefix + [str(key)], value)
+
+
+def _project(data: Dict, field_paths: Optional[List[str]]) -> Dict:
+    if field_paths is None:
+        return _copy(data)
+    out = {}
+    for field_path in field_paths:
+        try:
+            value = _get_field(data, field_path)
+        except KeyError:
+            continue
+        _set_field(out, _split_path(field_path), _copy(value))
+    return out
+
+
+# Ordre des types Firestore : null < booléen < nombre < date < chaîne < octets < référence < tableau < map
+def _type_rank(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, MemoryDocumentReference):
+        return 6
+    if isinstance(value, list):
+        return 8
+    if isinstance(value, dict):
+        return 9
+    return 7
+
+
+def _sort_key(value):
+    rank = _type_rank(value)
+    if rank == 6:
+        return (rank, value.path)
+    if rank == 8:
+        return (rank, tuple(_sort_key(v) for v in value))
+    if rank == 9:
+        return (rank, tuple((k, _sort_key(v)) for k, v in sorted(value.items())))
+    if rank == 7:
+        return (rank, repr(value))
+    return (rank, value)
+
+
+class _Reverse:
+    """Inverse l'ordre d'une clé de tri (order_by DESCENDING)"""
+
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+def _matches(data: Dict, field_path: str, op: str, value) -> bool:
+    try:
+        current = _get_field(data, field_path)
+    except KeyError:
+        return False
+    value = _encode(value) if not isinstance(value, MemoryDocumentReference) else value
+    if op == '==':
+        return _type_rank(current) == _type_rank(value) and current == value
+    if op == '!=':
+        return current is not None and not (_type_rank(current) == _type_rank(value) and current == value)
+    if op in ('<', '<=', '>', '>='):
+        if _type_rank(current) != _type_rank(value) or current is None:
+            return False
+        a, b = _sort_key(current), _sort_key(value)
+        return {'<': a < b, '<=': a <= b, '>': a > b, '>=': a >= b}[op]
+    if op == 'in':
+        return any(_type_rank(current) == _type_rank(v) and current == v for v in value)
+    if op == 'not-in':
+        return current is not None and not any(_type_rank(current) == _type_rank(v) and current == v for v in value)
+    if op == 'array_contains':
+        return isinstance(current, list) and value in current
+    if op == 'array_contains_any':
+        return isinstance(current, list) and any(v in current for v in value)
+    raise ValueError(f"Opérateur non supporté: {op}")
+
+
+# ==========================================
+# DOCUMENTS
+# ==========================================
+
+class MemoryDocumentSnapshot:
+    """Équivalent de DocumentSnapshot"""
+
+    def __init__(self, reference, data: Optional[Dict], read_time: datetime,
+                 create_time: Optional[datetime] = None, update_time: Optional[datetime] = None):
+        self.reference = reference
+        self._data = data
+        self.read_time = read_time
+        self.create_time = create_time
+        self.update_time = update_time
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict]:
+        return _copy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str):
+        if self._data is None:
+            raise KeyError(field_path)
+        return _copy(_get_field(self._data, field_path))
+
+
+class MemoryDocumentReference:
+    """Équivalent de DocumentReference"""
+
+    def __init__(self, client, collection_path: str, doc_id: str):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection_path}/{self.id}"
+
+    @property
+    def parent(self):
+        return MemoryCollectionReference(self._client, self._collection_path)
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f"MemoryDocumentReference({self.path!r})"
+
+    def collection(self, name: str):
+        return MemoryCollectionReference(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths: Optional[List[str]] = None, transaction=None) -> MemoryDocumentSnapshot:
+        return self._client._snapshot(self, field_paths)
+
+    def set(self, data: Dict, merge: bool = False):
+        self._client._commit([('set', self, data, merge)])
+
+    def update(self, data: Dict):
+        self._client._commit([('update', self, data, False)])
+
+    def delete(self):
+        self._client._commit([('delete', self, None, False)])
+
+    def create(self, data: Dict):
+        self._client._commit([('create', self, data, False)])
+
+    def on_snapshot(self, callback):
+        query = MemoryQuery(self._client, self._collection_path, filters=(('__name__', '==', self.id),))
+        return self._client._watch(query, callback)
+
+
+# ==========================================
+# REQUÊTES ET AGRÉGATIONS
+# ==========================================
+
+class AggregationResult:
+    def __init__(self, alias: str, value):
+        self.alias = alias
+        self.value = value
+        self.read_time = datetime.now(timezone.utc)
+
+
+class MemoryAggregationQuery:
+    """Équivalent de AggregationQuery (count, sum, avg)"""
+
+    def __init__(self, query):
+        self._query = query
+        self._aggregations = []
+
+    def _add(self, kind: str, field_path: Optional[str], alias: Optional[str]):
+        self._aggregations.append((kind, field_path, alias or f"field_{len(self._aggregations) + 1}"))
+        return self
+
+    def count(self, alias: Optional[str] = None):
+        return self._add('count', None, alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None):
+        return self._add('sum', field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None):
+        return self._add('avg', field_ref, alias)
+
+    def get(self, transaction=None, **kwargs) -> List[List[AggregationResult]]:
+        docs = [snap._data for snap in self._query._run()]
+        results = []
+        for kind, field_path, alias in self._aggregations:
+            if kind == 'count':
+                results.append(AggregationResult(alias, len(docs)))
+                continue
+            values = []
+            for data in docs:
+                try:
+                    value = _get_field(data, field_path)
+                except KeyError:
+                    continue
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values.append(value)
+            if kind == 'sum':
+                total = sum(values)
+                results.append(AggregationResult(alias, total if values else 0))
+            else:
+                results.append(AggregationResult(alias, sum(values) / len(values) if values else None))
+        return [results]
+
+    def stream(self, transaction=None, **kwargs):
+        yield from self.get(transaction)
+
+
+class MemoryQuery:
+    """Équivalent (immuable) de Query"""
+
+    ASCENDING = ASCENDING
+    DESCENDING = DESCENDING
+
+    def __init__(self, client, collection_path: str, filters=(), orders=(), limit: Optional[int] = None,
+                 offset: int = 0, cursor=None, projection: Optional[List[str]] = None):
+        self._client = client
+        self._collection_path = collection_path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._offset = offset
+        self._cursor = cursor
+        self._projection = projection
+
+    def _clone(self, **changes):
+        params = dict(filters=self._filters, orders=self._orders, limit=self._limit, offset=self._offset,
+                      cursor=self._cursor, projection=self._projection)
+        params.update(changes)
+        return MemoryQuery(self._client, self._collection_path, **params)
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._clone(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING):
+        return self._clone(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int):
+        return self._clone(limit=count)
+
+    def offset(self, num_to_skip: int):
+        return self._clone(offset=num_to_skip)
+
+    def select(self, field_paths: List[str]):
+        return self._clone(projection=list(field_paths))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._clone(cursor=('after', document_fields_or_snapshot))
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._clone(cursor=('at', document_fields_or_snapshot))
+
+    def count(self, alias: Optional[str] = None) -> MemoryAggregationQuery:
+        return MemoryAggregationQuery(self).count(alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> MemoryAggregationQuery:
+        return MemoryAggregationQuery(self).sum(field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> MemoryAggregationQuery:
+        return MemoryAggregationQuery(self).avg(field_ref, alias)
+
+    def matches(self, data: Optional[Dict], doc_id: Optional[str] = None) -> bool:
+        """Vrai si le document satisfait les filtres (et possède les champs triés)"""
+        if data is None:
+            return False
+        for field_path, op, value in self._filters:
+            if field_path == '__name__':
+                target = value.id if isinstance(value, MemoryDocumentReference) else value
+                if not _matches({'__name__': doc_id}, '__name__', op, target):
+                    return False
+            elif not _matches(data, field_path, op, value):
+                return False
+        for field_path, _ in self._orders:
+            try:
+                _get_field(data, field_path)
+            except KeyError:
+                return False
+        return True
+
+    def _order_key(self, doc_id: str, data: Dict):
+        key = []
+        for field_path, direction in self._orders:
+            value = _sort_key(_get_field(data, field_path))
+            key.append(_Reverse(value) if direction == DESCENDING else value)
+        last_desc = bool(self._orders) and self._orders[-1][1] == DESCENDING
+        key.append(_Reverse(doc_id) if last_desc else doc_id)
+        return key
+
+    def _run(self) -> List[MemoryDocumentSnapshot]:
+        client = self._client
+        with client._lock:
+            docs = client._collections.get(self._collection_path, {})
+            rows = [(doc_id, entry) for doc_id, entry in docs.items() if self.matches(entry['data'], doc_id)]
+            rows.sort(key=lambda row: self._order_key(row[0], row[1]['data']))
+            if self._cursor is not None:
+                mode, ref = self._cursor
+                if isinstance(ref, MemoryDocumentSnapshot):
+                    cursor_key = self._order_key(ref.id, ref._data or {})
+                else:
+                    values = ref if isinstance(ref, (list, tuple)) else [ref.get(f) for f, _ in self._orders]
+                    cursor_key = [(_Reverse(_sort_key(_encode(v))) if d == DESCENDING else _sort_key(_encode(v)))
+                                  for v, (_, d) in zip(values, self._orders)]
+                n = len(cursor_key)
+
+                def past(row):
+                    key = self._order_key(row[0], row[1]['data'])[:n]
+                    return cursor_key < key if mode == 'after' else not (key < cursor_key)
+
+                rows = [row for row in rows if past(row)]
+            rows = rows[self._offset:]
+            if self._limit is not None:
+                rows = rows[:self._limit]
+            read_time = datetime.now(timezone.utc)
+            return [MemoryDocumentSnapshot(MemoryDocumentReference(client, self._collection_path, doc_id),
+                                           _project(entry['data'], self._projection), read_time,
+                                           entry['create_time'], entry['update_time'])
+                    for doc_id, entry in rows]
+
+    def stream(self, transaction=None, **kwargs):
+        yield from self._run()
+
+    def get(self, transaction=None, **kwargs) -> List[MemoryDocumentSnapshot]:
+        return self._run()
+
+    def on_snapshot(self, callback):
+        return self._client._watch(self, callback)
+
+
+class MemoryCollectionReference(MemoryQuery):
+    """Équivalent de CollectionReference"""
+
+    def __init__(self, client, path: str):
+        super().__init__(client, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def path(self) -> str:
+        return self._collection_path
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self._client, self._collection_path, document_id or os.urandom(10).hex())
+
+    def add(self, document_data: Dict, document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return datetime.now(timezone.utc), ref
+
+    def list_documents(self):
+        with self._client._lock:
+            ids = list(self._client._collections.get(self._collection_path, {}))
+        return [self.document(doc_id) for doc_id in ids]
+
+
+# ==========================================
+# ÉCRITURES : BATCHES ET TRANSACTIONS
+# ==========================================
+
+class MemoryWriteBatch:
+    """Équivalent de WriteBatch (écritures appliquées atomiquement au commit)"""
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, reference, document_data: Dict, merge: bool = False):
+        self._writes.append(('set', reference, document_data, merge))
+        return self
+
+    def update(self, reference, field_updates: Dict):
+        self._writes.append(('update', reference, field_updates, False))
+        return self
+
+    def delete(self, reference):
+        self._writes.append(('delete', reference, None, False))
+        return self
+
+    def create(self, reference, document_data: Dict):
+        self._writes.append(('create', reference, document_data, False))
+        return self
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """Transaction : exécutée sous le verrou du client, donc sans conflit possible"""
+
+    def __init__(self, client, max_attempts: int = 5):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, MemoryDocumentReference):
+            return iter([ref_or_query.get()])
+        return ref_or_query.stream()
+
+
+# ==========================================
+# SNAPSHOT LISTENERS
+# ==========================================
+
+class ChangeType(Enum):
+    ADDED = 1
+    REMOVED = 2
+    MODIFIED = 3
+
+
+class DocumentChange:
+    def __init__(self, change_type: ChangeType, document: MemoryDocumentSnapshot, old_index: int, new_index: int):
+        self.type = change_type
+        self.document = document
+        self.old_index = old_index
+        self.new_index = new_index
+
+
+class MemoryWatch:
+    """Équivalent de Watch : rappelle callback(docs, changes, read_time) à chaque commit concerné"""
+
+    def __init__(self, client, query: MemoryQuery, callback):
+        self._client = client
+        self._query = query
+        self._callback = callback
+        self._current = {}
+        self._started = False
+        self.is_active = True
+
+    def _refresh(self):
+        snaps = self._query._run()
+        current = {snap.id: snap for snap in snaps}
+        changes = []
+        for doc_id, snap in current.items():
+            previous = self._current.get(doc_id)
+            if previous is None:
+                changes.append(DocumentChange(ChangeType.ADDED, snap, -1, 0))
+            elif previous._data != snap._data:
+                changes.append(DocumentChange(ChangeType.MODIFIED, snap, 0, 0))
+        for doc_id, snap in self._current.items():
+            if doc_id not in current:
+                changes.append(DocumentChange(ChangeType.REMOVED, snap, 0, -1))
+        first = not self._started
+        self._started = True
+        self._current = current
+        if changes or first:
+            self._callback(snaps, changes, datetime.now(timezone.utc))
+
+    def unsubscribe(self):
+        self.is_active = False
+        self._client._unwatch(self)
+
+    close = unsubscribe
+
+
+# ==========================================
+# CLIENT
+# ==========================================
+
+class MemoryFirestore:
+    """Client Firestore en mémoire, thread-safe, compatible avec les gestionnaires"""
+
+    def __init__(self):
+        self._collections: Dict[str, Dict[str, Dict]] = {}
+        self._lock = threading.RLock()
+        self._watches: List[MemoryWatch] = []
+
+    def collection(self, path: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, path)
+
+    def document(self, path: str) -> MemoryDocumentReference:
+        collection_path, doc_id = path.rsplit('/', 1)
+        return MemoryDocumentReference(self, collection_path, doc_id)
+
+    def collections(self) -> List[MemoryCollectionReference]:
+        with self._lock:
+            return [self.collection(path) for path in self._collections if '/' not in path]
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, **kwargs) -> MemoryTransaction:
+        return MemoryTransaction(self, max_attempts)
+
+    def run_transaction(self, fn, max_attempts: int = 5):
+        """Exécute fn(transaction) de façon sérialisée puis commit (rien n'est écrit en cas d'exception)"""
+        with self._lock:
+            transaction = self.transaction(max_attempts)
+            result = fn(transaction)
+            transaction.commit()
+            return result
+
+    def get_all(self, references, field_paths: Optional[List[str]] = None, transaction=None):
+        with self._lock:
+            snaps = [self._snapshot(ref, field_paths) for ref in references]
+        yield from snaps
+
+    def reset(self):
+        """Vide toutes les collections"""
+        with self._lock:
+            self._collections.clear()
+
+    # Internes
+    def _snapshot(self, ref: MemoryDocumentReference, field_paths: Optional[List[str]] = None):
+        with self._lock:
+            entry = self._collections.get(ref._collection_path, {}).get(ref.id)
+            read_time = datetime.now(timezone.utc)
+            if entry is None:
+                return MemoryDocumentSnapshot(ref, None, read_time)
+            return MemoryDocumentSnapshot(ref, _project(entry['data'], field_paths), read_time,
+                                          entry['create_time'], entry['update_time'])
+
+    def _commit(self, writes) -> List:
+        touched = set()
+        with self._lock:
+            # Préparation hors place : une erreur n'applique aucune écriture
+            staged = {}
+            now = datetime.now(timezone.utc)
+            for op, ref, data, merge in writes:
+                key = (ref._collection_path, ref.id)
+                if key in staged:
+                    current = staged[key]
+                else:
+                    entry = self._collections.get(ref._collection_path, {}).get(ref.id)
+                    current = None if entry is None else {'data': _copy(entry['data']),
+                                                          'create_time': entry['create_time']}
+                if op == 'delete':
+                    staged[key] = None
+                    continue
+                if op == 'update' and current is None:
+                    raise NotFound(f"No document to update: {ref.path}")
+                if op == 'create' and current is not None:
+                    raise ValueError(f"Document already exists: {ref.path}")
+                base = current['data'] if current is not None and (op == 'update' or merge) else {}
+                if op == 'update':
+                    for field_path, value in data.items():
+                        _set_field(base, _split_path(field_path), value)
+                elif merge:
+                    _merge(base, data)
+                else:
+                    for field, value in data.items():
+                        _set_field(base, [str(field)], value)
+                staged[key] = {'data': base, 'create_time': current['create_time'] if current else now}
+            for (collection_path, doc_id), entry in staged.items():
+                docs = self._collections.setdefault(collection_path, {})
+                if entry is None:
+                    docs.pop(doc_id, None)
+                else:
+                    entry['update_time'] = now
+                    docs[doc_id] = entry
+                touched.add(collection_path)
+            watches = [w for w in self._watches if w._query._collection_path in touched]
+        for watch in watches:
+            watch._refresh()
+        return [now] * len(writes)
+
+    def _watch(self, query: MemoryQuery, callback) -> MemoryWatch:
+        watch = MemoryWatch(self, query, callback)
+        with self._lock:
+            self._watches.append(watch)
+        watch._refresh()
+        return watch
+
+    def _unwatch(self, watch: MemoryWatch):
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+
+# ==========================================
+# VARIANTE ASYNCHRONE (API DE AsyncClient)
+# ==========================================
+
+class _AsyncAggregation:
+    def __init__(self, aggregation: MemoryAggregationQuery):
+        self._aggregation = aggregation
+
+    def count(self, alias: Optional[str] = None):
+        return _AsyncAggregation(self._aggregation.count(alias))
+
+    def sum(self, field_ref: str, alias: Optional[str] = None):
+        return _AsyncAggregation(self._aggregation.sum(field_ref, alias))
+
+    def avg(self, field_ref: str, alias: Optional[str] = None):
+        return _AsyncAggregation(self._aggregation.avg(field_ref, alias))
+
+    async def get(self, transaction=None, **kwargs):
+        return self._aggregation.get()
+
+
+class _AsyncDocument:
+    def __init__(self, ref: MemoryDocumentReference):
+        self._ref = ref
+        self.id = ref.id
+
+    @property
+    def path(self) -> str:
+        return self._ref.path
+
+    def collection(self, name: str):
+        return _AsyncQuery(self._ref.collection(name))
+
+    async def get(self, field_paths: Optional[List[str]] = None, transaction=None):
+        return self._ref.get(field_paths)
+
+    async def set(self, data: Dict, merge: bool = False):
+        return self._ref.set(data, merge)
+
+    async def update(self, data: Dict):
+        return self._ref.update(data)
+
+    async def delete(self):
+        return self._ref.delete()
+
+
+class _AsyncQuery:
+    def __init__(self, query: MemoryQuery):
+        self._query = query
+
+    def _wrap(name):
+        def method(self, *args, **kwargs):
+            return _AsyncQuery(getattr(self._query, name)(*args, **kwargs))
+        return method
+
+    where = _wrap('where')
+    order_by = _wrap('order_by')
+    limit = _wrap('limit')
+    offset = _wrap('offset')
+    select = _wrap('select')
+    start_after = _wrap('start_after')
+    start_at = _wrap('start_at')
+    del _wrap
+
+    def document(self, document_id: Optional[str] = None) -> _AsyncDocument:
+        return _AsyncDocument(self._query.document(document_id))
+
+    def count(self, alias: Optional[str] = None):
+        return _AsyncAggregation(self._query.count(alias))
+
+    def sum(self, field_ref: str, alias: Optional[str] = None):
+        return _AsyncAggregation(self._query.sum(field_ref, alias))
+
+    def avg(self, field_ref: str, alias: Optional[str] = None):
+        return _AsyncAggregation(self._query.avg(field_ref, alias))
+
+    async def stream(self, transaction=None, **kwargs):
+        for snap in self._query._run():
+            yield snap
+
+    async def get(self, transaction=None, **kwargs):
+        return self._query._run()
+
+
+class AsyncMemoryFirestore:
+    """Façade asynchrone (même données que le client synchrone)"""
+
+    def __init__(self, client: MemoryFirestore):
+        self._client = client
+
+    def collection(self, path: str) -> _AsyncQuery:
+        return _AsyncQuery(self._client.collection(path))
+
+    def document(self, path: str) -> _AsyncDocument:
+        return _AsyncDocument(self._client.document(path))
+
+    async def get_all(self, references, field_paths: Optional[List[str]] = None, transaction=None):
+        for snap in self._client.get_all([r._ref if isinstance(r, _AsyncDocument) else r for r in references],
+                                         field_paths):
+            yield snap
+
+
+_memory_client = None
+_memory_lock = threading.Lock()
+
+
+def get_memory_client() -> MemoryFirestore:
+    """Client en mémoire partagé par le processus (peuplé si FIRESTORE_MEMORY_SEED est défini)"""
+    global _memory_client
+    with _memory_lock:
+        if _memory_client is None:
+            _memory_client = MemoryFirestore()
+            seed_requests = os.getenv('FIRESTORE_MEMORY_SEED')
+            if seed_requests:
+                n_requests = int(seed_requests)
+                seed_synthetic_fleet(_memory_client, n_requests=n_requests, n_missions=n_requests // 2)
+        return _memory_client
+
+
+def get_async_memory_client() -> AsyncMemoryFirestore:
+    return AsyncMemoryFirestore(get_memory_client())
+
+
+# ==========================================
+# FLOTTE SYNTHÉTIQUE
+# ==========================================
+
+SYNTHETIC_FIRST_NAMES = ['Mamadou', 'Ousmane', 'Ibrahima', 'Cheikh', 'Abdoulaye', 'Moussa', 'Aliou', 'Modou',
+                         'Fatou', 'Aminata', 'Awa', 'Mariama', 'Khady', 'Ndeye', 'Babacar', 'Pape']
+SYNTHETIC_LAST_NAMES = ['Diop', 'Ndiaye', 'Fall', 'Sow', 'Ba', 'Diallo', 'Sy', 'Gueye', 'Faye', 'Sarr',
+                        'Mbaye', 'Cisse', 'Kane', 'Thiam', 'Seck', 'Diouf']
+SYNTHETIC_CITIES = ['Thiès', 'Saint-Louis', 'Kaolack', 'Ziguinchor', 'Touba', 'Mbour', 'Tambacounda',
+                    'Kolda', 'Louga', 'Fatick', 'Matam', 'Kédougou', 'Diourbel', 'Sédhiou', 'Kaffrine']
+SYNTHETIC_STRUCTURES = ['DRH', 'DSI', 'DAF', 'DG', 'Direction Technique', 'Direction Commerciale', 'Audit']
+SYNTHETIC_VEHICLE_TYPES = [('Berline', 4), ('4x4', 6), ('Minibus', 14), ('Pick-up', 4)]
+
+
+def seed_synthetic_fleet(client, n_vehicles: int = 40, n_drivers: int = 50, n_requests: int = 2000,
+                         n_missions: int = 1000, start: Optional[datetime] = None, seed: int = 0) -> Dict:
+    """
+    Peuple une base (en mémoire ou réelle) avec une flotte synthétique :
+    véhicules, chauffeurs, demandes et missions enchaînées par véhicule sur
+    l'année écoulée. Retourne le nombre de documents créés par collection.
+    """
+    rng = random.Random(seed)
+    start = start or datetime.now() - timedelta(days=365)
+    span_days = 365 + 60
+    writes = []
+
+    vehicles = []
+    for i in range(n_vehicles):
+        vtype, capacity = rng.choice(SYNTHETIC_VEHICLE_TYPES)
+        vid = f"VH-SYN-{i:05d}"
+        vehicles.append(vid)
+        writes.append(('vehicles', vid, {
+            'vehicle_id': vid,
+            'immatriculation': f"DK-{rng.randint(1000, 9999)}-{rng.choice('ABCDEFGH')}{rng.choice('ABCDEFGH')}",
+            'marque': rng.choice(['Toyota', 'Nissan', 'Hyundai', 'Mitsubishi']),
+            'modele': rng.choice(['Hilux', 'Land Cruiser', 'Patrol', 'H1', 'L200']),
+            'type': vtype,
+            'capacite': capacity,
+            'annee': rng.randint(2012, 2024),
+            'status': 'active' if rng.random() > 0.1 else 'maintenance',
+            'assigned_driver': None,
+            'created_at': start
+        }))
+
+    drivers = []
+    for i in range(n_drivers):
+        did = f"DR-SYN-{i:05d}"
+        drivers.append(did)
+        writes.append(('drivers', did, {
+            'driver_id': did,
+            'name': f"{rng.choice(SYNTHETIC_FIRST_NAMES)} {rng.choice(SYNTHETIC_LAST_NAMES)}",
+            'email': f"chauffeur{i}@sonatel.sn",
+            'phone': f"77{rng.randint(1000000, 9999999)}",
+            'license_number': f"SN{rng.randint(100000, 999999)}",
+            'status': 'active' if rng.random() > 0.08 else 'on_leave',
+            'assigned_vehicle': None,
+            'total_missions': 0,
+            'created_at': start
+        }))
+
+    requests = []
+    for i in range(n_requests):
+        rid = f"DM-SYN-{i:07d}"
+        depart = start + timedelta(days=rng.uniform(0, span_days), hours=rng.randint(6, 10))
+        structure = rng.choice(SYNTHETIC_STRUCTURES)
+        first, last = rng.choice(SYNTHETIC_FIRST_NAMES), rng.choice(SYNTHETIC_LAST_NAMES)
+        requests.append((rid, depart, structure))
+        writes.append(('mission_requests', rid, {
+            'request_id': rid,
+            'nom_demandeur': f"{first} {last}",
+            'email_demandeur': f"{first}.{last}@sonatel.sn".lower(),
+            'service_demandeur': structure,
+            'structure': structure,
+            'motif_mission': rng.choice(['Audit site', 'Maintenance réseau', 'Formation', 'Visite client', 'Inventaire']),
+            'destination': rng.choice(SYNTHETIC_CITIES),
+            'date_depart': depart,
+            'date_retour': depart + timedelta(days=rng.randint(0, 4), hours=8),
+            'nb_passagers': rng.randint(1, 6),
+            'type_vehicule': rng.choice(['Indifférent'] + [t for t, _ in SYNTHETIC_VEHICLE_TYPES]),
+            'avec_chauffeur': True,
+            'status': rng.choice(['pending', 'approved', 'approved', 'approved', 'rejected', 'cancelled']),
+            'assigned_vehicle': None,
+            'assigned_driver': None,
+            'admin_notes': '',
+            'created_at': depart - timedelta(days=rng.randint(2, 20)),
+            'updated_at': depart
+        }))
+
+    # Missions enchaînées par véhicule (pas de chevauchement pour un même véhicule)
+    n_missions = min(n_missions, n_requests)
+    next_free = {vid: start for vid in vehicles}
+    now = datetime.now()
+    # Écart moyen entre deux missions d'un véhicule pour couvrir toute la période
+    mean_gap = max(0.5, span_days * n_vehicles / max(1, n_missions) - 2.5)
+    for i, (rid, _, structure) in enumerate(rng.sample(requests, n_missions)):
+        vid = rng.choice(vehicles)
+        mstart = next_free[vid] + timedelta(days=rng.uniform(0, 2 * mean_gap))
+        mend = mstart + timedelta(days=rng.randint(0, 3), hours=rng.randint(4, 10))
+        next_free[vid] = mend
+        mid = f"MS-SYN-{i:07d}"
+        writes.append(('active_missions', mid, {
+            'mission_id': mid,
+            'request_id': rid,
+            'motif_mission': 'Mission synthétique',
+            'destination': rng.choice(SYNTHETIC_CITIES),
+            'start_date': mstart,
+            'end_date': mend,
+            'vehicle_id': vid,
+            'driver_id': rng.choice(drivers),
+            'structure': structure,
+            'distance_km': round(rng.uniform(40, 900), 1),
+            'status': 'completed' if mend < now else 'active',
+            'created_at': mstart - timedelta(days=1)
+        }))
+
+    counts = {}
+    batch = client.batch()
+    pending = 0
+    for collection, doc_id, data in writes:
+        batch.set(client.collection(collection).document(doc_id), data)
+        counts[collection] = counts.get(collection, 0) + 1
+        pending += 1
+        if pending >= 450:
+            batch.commit()
+            batch = client.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return counts
+
+
+# ==========================================
+# BENCHMARK
+# ==========================================
+
+def benchmark(n_requests: int = 20000, n_missions: int = 10000, n_vehicles: int = 80, n_drivers: int = 100,
+              repeat: int = 3) -> Dict[str, float]:
+    """Chronomètre les gestionnaires sur une flotte synthétique (meilleur temps, en ms)"""
+    os.environ['FIRESTORE_BACKEND'] = 'memory'
+    client = get_memory_client()
+    client.reset()
+    seed_synthetic_fleet(client, n_vehicles=n_vehicles, n_drivers=n_drivers,
+                         n_requests=n_requests, n_missions=n_missions)
+
+    from firebase_config import (MissionRequestManager, CalendarManager, StatisticsManager,
+                                 invalidate_mission_index)
+
+    req_mgr, cal, stats = MissionRequestManager(), CalendarManager(), StatisticsManager()
+    now = datetime.now()
+    month_start = datetime(now.year, now.month, 1)
+
+    def mission_index():
+        invalidate_mission_index()
+        return cal.get_mission_index(month_start - timedelta(days=90), month_start + timedelta(days=30))
+
+    scenarios = {
+        'dashboard_stats': lambda: stats.get_dashboard_stats(refresh=True),
+        'requests_page': lambda: req_mgr.get_requests_page(page_size=20, status='pending', view='list'),
+        'all_requests_report': lambda: req_mgr.get_all_requests(view='report'),
+        'mission_index_120d': mission_index,
+        'availability_week': lambda: cal.check_availability(now, now + timedelta(days=7)),
+        'monthly_report': lambda: stats.get_monthly_report(now.year, now.month),
+        'rollups_rebuild_year': lambda: stats.rebuild_monthly_rollups(now.year),
+        'auto_assign_pending': lambda: req_mgr.auto_assign_batch()
+    }
+    timings = {}
+    for name, scenario in scenarios.items():
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            scenario()
+            elapsed = (time.perf_counter() - t0) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    return timings
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark des gestionnaires sur le backend en mémoire")
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--missions', type=int, default=10000)
+    parser.add_argument('--vehicles', type=int, default=80)
+    parser.add_argument('--drivers', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # Passer par le module importé : firebase_config doit voir le même client partagé
+    from firestore_memory import benchmark as run_benchmark
+
+    results = run_benchmark(args.requests, args.missions, args.vehicles, args.drivers, args.repeat)
+    for name, ms in results.items():
+        print(f"{name:<24} {ms:10.1f} ms")
@@ -0,0 +1,260 @@
+"""
+Gazetteer hors-ligne des localités du Sénégal.
+
+Charge un fichier compact (data/senegal_localities.tsv) et, s'ils existent,
+des extraits GeoNames (data/SN.txt ou fichiers listés dans GAZETTEER_PATHS).
+Les noms normalisés sont indexés par trigrammes pour une recherche
+approchée. Une indication de région ("Ndiaganiao, Thiès" ou
+"Ndiaganiao (Mbour)") permet de départager les homonymes.
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+GAZETTEER_DEFAULT_FILES = (
+    os.path.join(DATA_DIR, 'senegal_localities.tsv'),
+    os.path.join(DATA_DIR, 'SN.txt'),
+)
+# Score minimal (0-1) d'une correspondance approchée
+GAZETTEER_MIN_SCORE = float(os.environ.get('GAZETTEER_MIN_SCORE', 0.82))
+
+# Priorité des types de localité pour départager les homonymes
+KIND_RANK = {'region': 0, 'department': 1, 'arrondissement': 2, 'commune': 3, 'village': 4}
+
+# Codes admin1 GeoNames du Sénégal
+GEONAMES_SN_REGIONS = {
+    '01': 'Dakar', '03': 'Diourbel', '05': 'Tambacounda', '07': 'Thiès', '09': 'Fatick',
+    '10': 'Kaolack', '11': 'Kolda', '12': 'Ziguinchor', '13': 'Louga', '14': 'Saint-Louis',
+    '15': 'Matam', '16': 'Kaffrine', '17': 'Kédougou', '18': 'Sédhiou'
+}
+GEONAMES_KINDS = {'PPLA': 'region', 'PPLA2': 'department', 'PPLA3': 'arrondissement', 'PPLC': 'region'}
+
+
+def normalize_name(name: str) -> str:
+    """Nom sans accents, espaces ni ponctuation ('St-Louis' -> 'saintlouis')"""
+    if not isinstance(name, str):
+        return ""
+    s = name.strip().lower()
+    s = unicodedata.normalize("NFKD", s)
+    s = s.encode("ascii", "ignore").decode("ascii")
+    # Unifier les variantes de 'saint', 'ste', 'st'
+    s = re.sub(r"\bste\b", "saint", s)
+    s = re.sub(r"\bst\b", "saint", s)
+    return re.sub(r"[^a-z0-9]", "", s)
+
+
+def trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def split_region_hint(query: str) -> Tuple[str, Optional[str]]:
+    """'Ndiaganiao, Thiès' ou 'Ndiaganiao (Thiès)' -> ('Ndiaganiao', 'Thiès')"""
+    if not isinstance(query, str):
+        return "", None
+    query = re.sub(r",?\s*s[ée]n[ée]gal\s*$", "", query.strip(), flags=re.IGNORECASE)
+    m = re.match(r"^(.*?)\s*\(([^)]+)\)\s*$", query)
+    if m:
+        return m.group(1).strip(), m.group(2).strip()
+    if ',' in query:
+        name, hint = query.split(',', 1)
+        return name.strip(), hint.strip() or None
+    return query, None
+
+
+def _read_compact(path: str) -> Iterable[Dict]:
+    header = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            cols = line.split('\t')
+            if header is None:
+                header = cols
+                continue
+            row = dict(zip(header, cols))
+            try:
+                lon, lat = float(row['lon']), float(row['lat'])
+            except (KeyError, ValueError):
+                continue
+            yield {
+                'name': row.get('name', ''),
+                'alt_names': [a for a in (row.get('alt_names') or '').split('|') if a],
+                'kind': row.get('kind') or 'village',
+                'region': row.get('region') or '',
+                'lon': lon,
+                'lat': lat
+            }
+
+
+def _read_geonames(path: str) -> Iterable[Dict]:
+    """Dump GeoNames (19 colonnes) : lieux habités (classe P) uniquement"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            cols = line.rstrip('\n').split('\t')
+            if len(cols) < 11 or cols[6] != 'P':
+                continue
+            try:
+                lat, lon = float(cols[4]), float(cols[5])
+            except ValueError:
+                continue
+            yield {
+                'name': cols[1],
+                'alt_names': [a for a in cols[3].split(',') if a and len(a) < 60][:20],
+                'kind': GEONAMES_KINDS.get(cols[7], 'village'),
+                'region': GEONAMES_SN_REGIONS.get(cols[10], ''),
+                'lon': lon,
+                'lat': lat
+            }
+
+
+def read_gazetteer_file(path: str) -> Iterable[Dict]:
+    """Lit un fichier compact (en-tête 'name\\t...') ou un dump GeoNames"""
+    with open(path, encoding='utf-8') as f:
+        first = next((l for l in f if l.strip() and not l.startswith('#')), '')
+    if first.startswith('name\t'):
+        return _read_compact(path)
+    return _read_geonames(path)
+
+
+class Gazetteer:
+    """Index exact + trigrammes sur les noms normalisés"""
+
+    def __init__(self, entries: Iterable[Dict] = ()):
+        self.entries: List[Dict] = []
+        self.by_key: Dict[str, List[int]] = {}
+        self.by_trigram: Dict[str, set] = {}
+        self.gram_count: Dict[str, int] = {}
+        self.regions: Dict[str, str] = {}
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry: Dict):
+        idx = len(self.entries)
+        self.entries.append(entry)
+        region_key = normalize_name(entry.get('region'))
+        if region_key:
+            self.regions[region_key] = entry['region']
+        for name in [entry['name']] + list(entry.get('alt_names') or []):
+            key = normalize_name(name)
+            if not key:
+                continue
+            ids = self.by_key.setdefault(key, [])
+            if idx in ids:
+                continue
+            if not ids:
+                grams = trigrams(key)
+                self.gram_count[key] = len(grams)
+                for tri in grams:
+                    self.by_trigram.setdefault(tri, set()).add(key)
+            ids.append(idx)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _best(self, ids: List[int], hint: Optional[str]) -> int:
+        """Homonymes : la région indiquée, sinon le plus proche du lieu indiqué, sinon le plus important"""
+        hint_key = normalize_name(hint) if hint else ''
+        if hint_key in self.regions:
+            ids = [i for i in ids if normalize_name(self.entries[i]['region']) == hint_key] or ids
+        elif hint_key in self.by_key:
+            anchor = self.entries[self.by_key[hint_key][0]]
+            return min(ids, key=lambda i: (self.entries[i]['lon'] - anchor['lon']) ** 2
+                       + (self.entries[i]['lat'] - anchor['lat']) ** 2)
+        return min(ids, key=lambda i: KIND_RANK.get(self.entries[i].get('kind'), 9))
+
+    def candidates(self, key: str, limit: int = 5) -> List[Tuple[float, str]]:
+        """Noms indexés les plus proches de `key` : [(score, clé)] décroissant"""
+        grams = trigrams(key)
+        counts: Dict[str, int] = {}
+        for tri in grams:
+            for other in self.by_trigram.get(tri, ()):
+                counts[other] = counts.get(other, 0) + 1
+        # Présélection par coefficient de Dice, affinage par SequenceMatcher
+        shortlist = sorted(
+            counts.items(),
+            key=lambda kv: 2 * kv[1] / (len(grams) + self.gram_count[kv[0]]),
+            reverse=True
+        )[:max(limit * 4, 20)]
+        scored = [(SequenceMatcher(None, key, other).ratio(), other) for other, _ in shortlist]
+        return sorted(scored, reverse=True)[:limit]
+
+    def lookup(self, query: str, region: Optional[str] = None,
+               min_score: float = GAZETTEER_MIN_SCORE) -> Optional[Dict]:
+        """
+        Localité correspondant à `query`, ou None.
+
+        Returns:
+            {'name', 'region', 'kind', 'lon', 'lat', 'score', 'exact'}
+        """
+        name, hint = split_region_hint(query)
+        hint = region or hint
+        key = normalize_name(name)
+        if not key:
+            return None
+        exact = key in self.by_key
+        if exact:
+            ids, score = self.by_key[key], 1.0
+        else:
+            ranked = self.candidates(key, limit=5)
+            if not ranked or ranked[0][0] < min_score:
+                return None
+            score = ranked[0][0]
+            # Candidats quasi ex aequo : l'indication de région départage
+            ids = [i for s, k in ranked if s >= score - 0.02 for i in self.by_key[k]]
+        entry = self.entries[self._best(ids, hint)]
+        return {
+            'name': entry['name'],
+            'region': entry.get('region', ''),
+            'kind': entry.get('kind'),
+            'lon': entry['lon'],
+            'lat': entry['lat'],
+            'score': round(score, 3),
+            'exact': exact
+        }
+
+    def suggest(self, query: str, limit: int = 5) -> List[Dict]:
+        """Suggestions pour un nom introuvable (affichage)"""
+        name, _ = split_region_hint(query)
+        key = normalize_name(name)
+        out, seen = [], set()
+        for score, other in self.candidates(key, limit * 2) if key else []:
+            idx = self.by_key[other][0]
+            if idx in seen:
+                continue
+            seen.add(idx)
+            entry = self.entries[idx]
+            out.append({'name': entry['name'], 'region': entry.get('region', ''), 'score': round(score, 3)})
+        return out[:limit]
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def gazetteer_paths() -> List[str]:
+    extra = [p for p in os.environ.get('GAZETTEER_PATHS', '').split(os.pathsep) if p]
+    return [p for p in list(GAZETTEER_DEFAULT_FILES) + extra if os.path.exists(p)]
+
+
+def get_gazetteer() -> Gazetteer:
+    """Gazetteer partagé du processus (chargé au premier appel)"""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                gazetteer = Gazetteer()
+                for path in gazetteer_paths():
+                    try:
+                        for entry in read_gazetteer_file(path):
+                            gazetteer.add(entry)
+                    except (OSError, UnicodeDecodeError):
+                        continue
+                _gazetteer = gazetteer
+    return _gazetteer
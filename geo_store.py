@@ -0,0 +1,364 @@
+"""
+Stockage persistant des résultats de géocodage.
+
+Les résultats sont indexés par nom de localité normalisé et survivent aux
+redémarrages. Ils sont partagés entre processus (fichier SQLite) ou entre
+réplicas (collection Firestore). Chaque entrée mémorise le fournisseur, un
+niveau de confiance et la date de résolution. Les échecs sont aussi mémorisés
+pour ne pas re-solliciter Nominatim à chaque rechargement : une localité
+introuvable pour une durée limitée (cache négatif), une erreur réseau ou de
+quota quelques minutes seulement.
+
+Backends :
+- 'sqlite' (défaut) : fichier local GEOCODE_DB_PATH
+- 'firestore'       : collection 'geocode_cache' du projet Firebase
+
+Le module fournit aussi les seaux à jetons (un par fournisseur, partagés
+par tout le processus) qui bornent le débit des appels de géocodage, et le
+store des temps de trajet entre paires de points (même fichier SQLite).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+GEOCODE_DB_PATH = os.environ.get(
+    'GEOCODE_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'geo.sqlite3')
+)
+# Une localité introuvable n'est mémorisée qu'un temps (le fournisseur peut l'ajouter)
+GEOCODE_NEGATIVE_TTL_SECONDS = int(os.environ.get('GEOCODE_NEGATIVE_TTL_SECONDS', 24 * 3600))
+# Panne réseau ou quota : la ville est retentée après quelques minutes
+GEOCODE_ERROR_TTL_SECONDS = int(os.environ.get('GEOCODE_ERROR_TTL_SECONDS', 300))
+GEOCODE_FIRESTORE_COLLECTION = 'geocode_cache'
+
+# Du plus sûr au moins sûr
+CONFIDENCE_LEVELS = ('verified', 'high', 'medium', 'low')
+
+
+def geocode_hit(query: str, coords: Tuple[float, float], provider: str, confidence: str) -> Dict:
+    """Entrée positive : coordonnées (lon, lat) résolues par `provider`"""
+    return {
+        'status': 'ok',
+        'query': query,
+        'lon': float(coords[0]),
+        'lat': float(coords[1]),
+        'provider': provider,
+        'confidence': confidence,
+        'error': None,
+        'updated_at': time.time()
+    }
+
+
+def geocode_miss(query: str, provider: str = '', error: str = '') -> Dict:
+    """Entrée négative : aucun fournisseur n'a trouvé la localité"""
+    return {
+        'status': 'miss',
+        'query': query,
+        'lon': None,
+        'lat': None,
+        'provider': provider,
+        'confidence': None,
+        'error': (error or '')[:500],
+        'updated_at': time.time()
+    }
+
+
+def geocode_error(query: str, provider: str = '', error: str = '') -> Dict:
+    """Entrée d'erreur transitoire (réseau, quota) : le fournisseur n'a pas répondu"""
+    return {**geocode_miss(query, provider, error), 'status': 'error'}
+
+
+def record_coords(record: Optional[Dict]) -> Optional[Tuple[float, float]]:
+    """Coordonnées (lon, lat) d'une entrée positive, None sinon"""
+    if not record or record.get('status') != 'ok':
+        return None
+    return (record['lon'], record['lat'])
+
+
+def _sqlite_connection(local: threading.local, path: str) -> sqlite3.Connection:
+    """Connexion SQLite du thread courant (sqlite3 interdit le partage entre threads)"""
+    conn = getattr(local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        local.conn = conn
+    return conn
+
+
+class GeocodeStore(ABC):
+    """Interface commune des backends : get / put par clé normalisée"""
+
+    def __init__(self, negative_ttl: int = GEOCODE_NEGATIVE_TTL_SECONDS, error_ttl: int = GEOCODE_ERROR_TTL_SECONDS):
+        self.negative_ttl = negative_ttl
+        self.error_ttl = error_ttl
+
+    def _fresh(self, record: Optional[Dict]) -> Optional[Dict]:
+        if record is None:
+            return None
+        ttl = {'miss': self.negative_ttl, 'error': self.error_ttl}.get(record.get('status'))
+        if ttl is not None and time.time() - (record.get('updated_at') or 0) > ttl:
+            return None
+        return record
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Entrée valide pour `key` (positive, ou échec non expiré), None sinon"""
+        if not key:
+            return None
+        return self._fresh(self._read(key))
+
+    def put(self, key: str, record: Dict):
+        """Enregistre une entrée ; un échec n'écrase jamais une entrée positive"""
+        if key:
+            self._write(key, record)
+
+    @abstractmethod
+    def _read(self, key: str) -> Optional[Dict]:
+        """Entrée brute stockée pour `key`, None si absente"""
+
+    @abstractmethod
+    def _write(self, key: str, record: Dict):
+        """Écrit l'entrée brute de `key` (sans écraser un succès par un échec)"""
+
+
+class SQLiteGeocodeStore(GeocodeStore):
+    """Fichier SQLite (WAL) partagé par tous les processus de la machine"""
+
+    _COLUMNS = ('status', 'query', 'lon', 'lat', 'provider', 'confidence', 'error', 'updated_at')
+
+    def __init__(self, path: str = GEOCODE_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocodes (
+                key TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                query TEXT,
+                lon REAL,
+                lat REAL,
+                provider TEXT,
+                confidence TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        return _sqlite_connection(self._local, self.path)
+
+    def _read(self, key: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            f"SELECT {', '.join(self._COLUMNS)} FROM geocodes WHERE key = ?", (key,)
+        ).fetchone()
+        return dict(zip(self._COLUMNS, row)) if row else None
+
+    def _write(self, key: str, record: Dict):
+        conn = self._conn()
+        updates = ', '.join(f"{c} = excluded.{c}" for c in self._COLUMNS)
+        conn.execute(
+            f"INSERT INTO geocodes (key, {', '.join(self._COLUMNS)}) "
+            f"VALUES (?, {', '.join('?' for _ in self._COLUMNS)}) "
+            f"ON CONFLICT(key) DO UPDATE SET {updates} "
+            f"WHERE excluded.status = 'ok' OR geocodes.status != 'ok'",
+            (key, *(record.get(c) for c in self._COLUMNS))
+        )
+        conn.commit()
+
+    def keys(self, status: Optional[str] = 'ok') -> Iterable[str]:
+        """Clés enregistrées (positives par défaut)"""
+        query = "SELECT key FROM geocodes" + (" WHERE status = ?" if status else "")
+        return [row[0] for row in self._conn().execute(query, (status,) if status else ())]
+
+
+class FirestoreGeocodeStore(GeocodeStore):
+    """Collection Firestore partagée par toutes les instances de l'application"""
+
+    def __init__(self, db=None, collection: str = GEOCODE_FIRESTORE_COLLECTION, **kwargs):
+        super().__init__(**kwargs)
+        if db is None:
+            from firebase_config import initialize_firebase
+            db = initialize_firebase()
+        self.collection = db.collection(collection)
+
+    def _read(self, key: str) -> Optional[Dict]:
+        doc = self.collection.document(key).get()
+        return doc.to_dict() if doc.exists else None
+
+    def _write(self, key: str, record: Dict):
+        if record.get('status') != 'ok':
+            existing = self._read(key)
+            if existing and existing.get('status') == 'ok':
+                return
+        self.collection.document(key).set(record)
+
+
+_stores: Dict[str, GeocodeStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_geocode_store(backend: Optional[str] = None) -> GeocodeStore:
+    """
+    Store partagé du processus. Backend choisi par l'argument, sinon par la
+    variable d'environnement GEOCODE_STORE ('sqlite' par défaut).
+    """
+    backend = (backend or os.environ.get('GEOCODE_STORE') or 'sqlite').lower()
+    with _stores_lock:
+        store = _stores.get(backend)
+        if store is None:
+            if backend == 'firestore':
+                store = FirestoreGeocodeStore()
+            elif backend == 'sqlite':
+                store = SQLiteGeocodeStore()
+            else:
+                raise ValueError(f"Backend de géocodage inconnu: {backend}")
+            _stores[backend] = store
+        return store
+
+
+# ==========================================
+# LIMITATION DE DÉBIT PAR FOURNISSEUR
+# ==========================================
+
+# (requêtes par seconde, rafale) ; surchargeable par GEOCODE_RATE_<FOURNISSEUR>="débit[,rafale]"
+PROVIDER_RATE_LIMITS = {
+    'nominatim': (1.0, 1),      # politique d'usage de Nominatim : 1 requête/seconde
+    'graphhopper': (5.0, 5),
+}
+
+
+class TokenBucket:
+    """Seau à jetons thread-safe : `rate` jetons par seconde, au plus `capacity` en réserve"""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Attend un jeton ; False si `timeout` (secondes) est dépassé"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+
+
+def provider_bucket(provider: str) -> TokenBucket:
+    """Seau partagé par tout le processus pour `provider`"""
+    with _stores_lock:
+        bucket = _buckets.get(provider)
+        if bucket is None:
+            rate, capacity = PROVIDER_RATE_LIMITS.get(provider, (1.0, 1))
+            override = os.environ.get(f"GEOCODE_RATE_{provider.upper()}")
+            if override:
+                parts = override.split(',')
+                rate = float(parts[0])
+                capacity = int(parts[1]) if len(parts) > 1 else max(1, int(rate))
+            bucket = _buckets[provider] = TokenBucket(rate, capacity)
+        return bucket
+
+
+# ==========================================
+# TEMPS DE TRAJET ENTRE PAIRES DE POINTS
+# ==========================================
+
+# Les temps de route évoluent lentement : une paire reste valable 30 jours par défaut
+TRAVEL_TIME_TTL_SECONDS = int(os.environ.get('TRAVEL_TIME_TTL_SECONDS', 30 * 24 * 3600))
+# 4 décimales ≈ 11 m : deux géocodages d'une même ville tombent sur la même clé
+COORD_KEY_DECIMALS = 4
+
+
+def coord_key(coord) -> str:
+    """Clé d'un point (lon, lat) arrondi"""
+    return f"{float(coord[0]):.{COORD_KEY_DECIMALS}f},{float(coord[1]):.{COORD_KEY_DECIMALS}f}"
+
+
+class TravelTimeStore:
+    """Durées (s) et distances (m) origine → destination, par fournisseur"""
+
+    def __init__(self, path: str = GEOCODE_DB_PATH, max_age: int = TRAVEL_TIME_TTL_SECONDS):
+        self.path = path
+        self.max_age = max_age
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS travel_times (
+                provider TEXT NOT NULL,
+                origin TEXT NOT NULL,
+                dest TEXT NOT NULL,
+                duration REAL NOT NULL,
+                distance REAL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (provider, origin, dest)
+            )
+        """)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        return _sqlite_connection(self._local, self.path)
+
+    def get_pairs(self, provider: str, keys: List[str]) -> Dict[Tuple[str, str], Tuple[float, Optional[float]]]:
+        """Paires connues et non expirées entre les points `keys` : {(origine, destination): (durée, distance)}"""
+        keys = sorted(set(keys))
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' for _ in keys)
+        rows = self._conn().execute(
+            f"SELECT origin, dest, duration, distance FROM travel_times "
+            f"WHERE provider = ? AND updated_at >= ? "
+            f"AND origin IN ({placeholders}) AND dest IN ({placeholders})",
+            (provider, time.time() - self.max_age, *keys, *keys)
+        )
+        return {(o, d): (duration, distance) for o, d, duration, distance in rows}
+
+    def put_pairs(self, provider: str, pairs: Iterable[Tuple[str, str, float, Optional[float]]]):
+        """Enregistre des paires (origine, destination, durée, distance)"""
+        now = time.time()
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO travel_times (provider, origin, dest, duration, distance, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(provider, o, d, duration, distance, now) for o, d, duration, distance in pairs]
+        )
+        conn.commit()
+
+
+_travel_time_store: Optional[TravelTimeStore] = None
+
+
+def get_travel_time_store() -> TravelTimeStore:
+    """Store des temps de trajet partagé du processus"""
+    global _travel_time_store
+    with _stores_lock:
+        if _travel_time_store is None:
+            _travel_time_store = TravelTimeStore()
+        return _travel_time_store
@@ -104,6 +104,51 @@ st.markdown("""
 if 'app_mode' not in st.session_state:
     st.session_state.app_mode = None
 
+# Notifications du demandeur
+def _render_unread_badge(user_email):
+    """Badge « non lues » servi par le listener du compteur (aucune lecture Firestore au rafraîchissement)"""
+    from firebase_config import NotificationManager, live_unread_count
+    unread = live_unread_count(user_email)
+    if unread is None:
+        unread = NotificationManager().get_unread_count(user_email)
+    st.caption(f"🔔 {unread} notification(s) non lue(s)" if unread else "🔔 Aucune notification non lue")
+
+# Le fragment ne relit que la valeur poussée en mémoire par le listener
+render_unread_badge = st.fragment(run_every=5)(_render_unread_badge) if hasattr(st, "fragment") else _render_unread_badge
+
+def render_notifications_panel(user_email, page_size=10):
+    """Historique paginé (curseurs) des notifications d'un demandeur"""
+    from firebase_config import NotificationManager
+    notif_mgr = NotificationManager()
+    st.subheader("🔔 Mes notifications")
+    render_unread_badge(user_email)
+    cursors = st.session_state.setdefault("notif_cursors", [None])
+    page = notif_mgr.get_notifications_page(user_email, page_size=page_size, cursor=cursors[-1])
+    if not page['items']:
+        st.info("Aucune notification")
+    for n in page['items']:
+        col_msg, col_action = st.columns([5, 1])
+        with col_msg:
+            st.markdown(f"{'⚪' if n.get('read') else '🔵'} **{n.get('title', '')}** — {n.get('message', '')}")
+            st.caption(str(n.get('created_at', '')))
+        with col_action:
+            if not n.get('read') and st.button("Marquer lue", key=f"notif_read_{n['id']}"):
+                notif_mgr.mark_as_read(n['id'])
+                st.rerun()
+    col_prev, col_next, col_all = st.columns(3)
+    with col_prev:
+        if len(cursors) > 1 and st.button("◀️ Plus récentes", key="notif_prev"):
+            cursors.pop()
+            st.rerun()
+    with col_next:
+        if page['has_more'] and st.button("Plus anciennes ▶️", key="notif_next"):
+            cursors.append(page['cursor'])
+            st.rerun()
+    with col_all:
+        if st.button("✅ Tout marquer comme lu", key="notif_mark_all"):
+            notif_mgr.mark_all_read(user_email)
+            st.rerun()
+
 # En-tête principal
 st.markdown("""
 <div class="main-header">
@@ -630,22 +675,27 @@ if st.session_state.app_mode == "demande":
                         # Créer la demande
                         request_id = req_mgr.create_request(request_data)
                         
-                        # Upload des documents
+                        # Upload des documents (en parallèle)
                         docs_uploaded = []
-                        if ordre_mission is not None:
+                        files_to_upload = ([ordre_mission] if ordre_mission is not None else []) + list(autres_docs or [])
+                        if files_to_upload:
+                            upload_bar = st.progress(0.0, text="Envoi des documents...")
                             try:
-                                att = req_mgr.upload_attachment(request_id, ordre_mission)
-                                docs_uploaded.append("Ordre de mission")
+                                upload_result = req_mgr.upload_attachments(
+                                    request_id,
+                                    files_to_upload,
+                                    progress=lambda done, total, name: upload_bar.progress(
+                                        done / total, text=f"Envoi des documents... {done}/{total}"
+                                    )
+                                )
+                                for att in upload_result['uploaded']:
+                                    is_ordre = ordre_mission is not None and att['name'] == ordre_mission.name
+                                    docs_uploaded.append("Ordre de mission" if is_ordre else att['name'])
+                                for name, error in upload_result['errors']:
+                                    st.warning(f"⚠️ Impossible de charger {name}: {error}")
                             except Exception as e:
-                                st.warning(f"⚠️ Impossible de charger l'ordre de mission: {e}")
-                        
-                        if autres_docs:
-                            for doc in autres_docs:
-                                try:
-                                    req_mgr.upload_attachment(request_id, doc)
-                                    docs_uploaded.append(doc.name)
-                                except Exception as e:
-                                    st.warning(f"⚠️ Impossible de charger {doc.name}: {e}")
+                                st.warning(f"⚠️ Impossible de charger les documents: {e}")
+                            upload_bar.empty()
                         
                         # Notification de succès
                         st.success("✅ Votre demande a été soumise avec succès !")
@@ -714,7 +764,7 @@ if st.session_state.app_mode == "demande":
         
     with tab_suivi:
         st.header("🔍 Suivre mes Demandes")
-        tracking_id = st.text_input("Numéro de suivi", placeholder="Ex: DM-20250114-153045")
+        tracking_id = st.text_input("Numéro de suivi", placeholder="Ex: DM-20250114-153045123-0000-a3f")
         if st.button("🔍 Rechercher", type="primary"):
             try:
                 from firebase_config import MissionRequestManager
@@ -739,9 +789,11 @@ if st.session_state.app_mode == "demande":
                                 st.write(f"• Hôtel chauffeur: {int(req.get('hotel_driver_fcfa')):,} FCFA/nuit")
                         atts = req.get('attachments', []) or []
                         if atts:
+                            from firebase_config import attachment_links
+                            att_links = attachment_links([req])
                             st.markdown("**Documents:**")
                             for a in atts:
-                                st.markdown(f"- [{a.get('name','Pièce jointe')}]({a.get('url','')})")
+                                st.markdown(f"- [{a.get('name','Pièce jointe')}]({att_links.get(a.get('path') or a.get('url'), '')})")
             except Exception as e:
                 st.error(f"❌ Recherche impossible: {e}")
         st.divider()
@@ -751,7 +803,11 @@ if st.session_state.app_mode == "demande":
             try:
                 from firebase_config import MissionRequestManager
                 req_mgr = MissionRequestManager()
-                reqs = req_mgr.get_user_requests(email_lookup.strip()) if email_lookup else []
+                reqs = req_mgr.get_user_requests(email_lookup.strip(), view="list") if email_lookup else []
+                if email_lookup:
+                    # Panneau de notifications de cet email (affiché sous la liste)
+                    st.session_state.notif_email = email_lookup.strip()
+                    st.session_state.notif_cursors = [None]
                 if not reqs:
                     st.info("Aucune demande trouvée")
                 else:
@@ -770,6 +826,12 @@ if st.session_state.app_mode == "demande":
                     st.dataframe(df, use_container_width=True)
             except Exception as e:
                 st.error(f"❌ Chargement impossible: {e}")
+        if st.session_state.get("notif_email"):
+            st.divider()
+            try:
+                render_notifications_panel(st.session_state.notif_email)
+            except Exception as e:
+                st.error(f"❌ Notifications indisponibles: {e}")
 
 elif st.session_state.app_mode == "planification":
     # Bouton retour
@@ -988,49 +1050,8 @@ def generate_monthly_report(year: int, month: int) -> pd.DataFrame:
 
 
 # Fonction pour l'import Excel vers Firebase
-def import_excel_to_firebase(excel_file):
-    """Importe un fichier Excel existant dans Firebase"""
-    import pandas as pd
-    from firebase_config import MissionRequestManager
-    
-    df = pd.read_excel(excel_file)
-    mgr = MissionRequestManager()
-    
-    imported_count = 0
-    errors = []
-    
-    for idx, row in df.iterrows():
-        try:
-            request_data = {
-                'structure': row.get('Structure', ''),
-                'action': row.get('Action', ''),
-                'destination': row.get('Destination', ''),
-                'porteur': row.get('Porteur', ''),
-                'date_expression_besoin': pd.to_datetime(row.get('Date expression besoin')),
-                'date_depart': pd.to_datetime(row.get('DATE DEPART')),
-                'date_retour': pd.to_datetime(row.get('DATE RETOUR')),
-                'nombre_vehicules_valides': int(row.get('Nombre de véhicules validés', 1)),
-                'compte_cr': row.get('CR', ''),
-                'etat_mission': row.get('Etat Mission', 'Planifié'),
-                'perdu_m': row.get('PERDU/M', '') == 'OUI',
-                
-                # Champs obligatoires
-                'nom_demandeur': row.get('Porteur', ''),
-                'email_demandeur': f"{row.get('Porteur', 'unknown')}@sonatel.sn".lower().replace(' ', '.'),
-                'service_demandeur': row.get('Structure', ''),
-                'motif_mission': row.get('Action', ''),
-                'nb_passagers': 1,
-                'type_vehicule': 'Indifférent',
-                'avec_chauffeur': True
-            }
-            
-            mgr.create_request(request_data)
-            imported_count += 1
-            
-        except Exception as e:
-            errors.append(f"Ligne {idx + 2}: {str(e)}")
-    
-    return {
-        'imported': imported_count,
-        'errors': errors
-    }
+def import_excel_to_firebase(excel_file, progress=None):
+    """Importe un fichier Excel existant dans Firebase (batches parallèles, idempotent)"""
+    from firebase_config import import_excel_to_firebase as _import_excel
+
+    return _import_excel(excel_file, progress=progress)
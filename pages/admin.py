@@ -175,6 +175,14 @@ def initialize_firebase_safe():
 
 db, firebase_error = initialize_firebase_safe()
 
+# Réplicas temps réel (véhicules, chauffeurs, missions actives) partagés par les sessions
+if db is not None:
+    try:
+        from firebase_config import start_live_caches
+        start_live_caches()
+    except Exception:
+        pass
+
 # -------------------------
 # Système de notifications toast
 # -------------------------
@@ -395,7 +403,7 @@ def load_requests_live(_db=None, status=None):
     try:
         from firebase_config import MissionRequestManager
         req_mgr = MissionRequestManager()
-        reqs = req_mgr.get_all_requests(status=status) if status and status != "all" else req_mgr.get_all_requests()
+        reqs = req_mgr.get_all_requests(status=status if status and status != "all" else None, view='report')
         out = []
         for r in reqs:
             created = r.get('created_at')
@@ -407,14 +415,35 @@ def load_requests_live(_db=None, status=None):
         return []
 
 @st.cache_data(ttl=120)
-def cached_all_drivers():
+def _fetched_all_drivers():
     from firebase_config import DriverManager
-    return DriverManager().get_all_drivers()
+    return DriverManager().get_all_drivers(view='picker')
 
 @st.cache_data(ttl=120)
-def cached_all_vehicles():
+def _fetched_all_vehicles():
     from firebase_config import VehicleManager
-    return VehicleManager().get_all_vehicles()
+    return VehicleManager().get_all_vehicles(view='picker')
+
+def cached_all_drivers():
+    # Lu depuis le réplica temps réel quand il est chaud (aucune lecture Firestore),
+    # sinon depuis le cache TTL
+    from firebase_config import DriverManager, live_cache
+    if live_cache('drivers') is not None:
+        return DriverManager().get_all_drivers(view='picker')
+    return _fetched_all_drivers()
+
+def cached_all_vehicles():
+    from firebase_config import VehicleManager, live_cache
+    if live_cache('vehicles') is not None:
+        return VehicleManager().get_all_vehicles(view='picker')
+    return _fetched_all_vehicles()
+
+def notify_requesters(rows, request_ids, title, message, notification_type="info"):
+    """Notifie en un envoi groupé les demandeurs des demandes traitées"""
+    from firebase_config import NotificationManager
+    done = set(request_ids)
+    emails = [r.get('email_demandeur') for r in rows if r.get('request_id') in done]
+    return NotificationManager().send_bulk(emails, title, message, notification_type)
 
 # -------------------------
 # Utilitaires
@@ -503,6 +532,77 @@ def advanced_pagination(data, items_per_page=10, key="pagination"):
     end_idx = min(start_idx + items_per_page, total_items)
     return data[start_idx:end_idx], current_page, total_pages
 
+def cursor_page_data(fetch_page, signature, key="cursor_pagination", ttl_seconds=30):
+    """Charge la page courante (et précharge la suivante) via fetch_page(cursor).
+    fetch_page renvoie {'items', 'cursor', 'has_more'} ; les pages sont gardées
+    en session et réinitialisées quand la signature des filtres change."""
+    import time as _time
+    state_key = f"{key}_state"
+    state = st.session_state.get(state_key)
+    if not state or state.get('signature') != signature:
+        state = {'signature': signature, 'page': 0, 'cursors': [None], 'pages': {}}
+        st.session_state[state_key] = state
+
+    def load(idx):
+        cached = state['pages'].get(idx)
+        if cached and _time.time() - cached['loaded_at'] < ttl_seconds:
+            return cached
+        result = {**fetch_page(state['cursors'][idx]), 'loaded_at': _time.time()}
+        state['pages'][idx] = result
+        if result.get('has_more'):
+            if len(state['cursors']) == idx + 1:
+                state['cursors'].append(result.get('cursor'))
+            else:
+                state['cursors'][idx + 1] = result.get('cursor')
+        return result
+
+    current = load(state['page'])
+    if current.get('has_more'):
+        load(state['page'] + 1)
+    return current['items'], state
+
+def all_pages_data(fetch_page, signature, key="all_pages", ttl_seconds=30, page_size=200):
+    """Charge toutes les pages de fetch_page(cursor, page_size) (recherche sur
+    l'ensemble des résultats) ; gardées en session tant que la signature et le
+    délai ttl_seconds le permettent."""
+    import time as _time
+    state_key = f"{key}_state"
+    state = st.session_state.get(state_key)
+    if state and state.get('signature') == signature and _time.time() - state['loaded_at'] < ttl_seconds:
+        return state['items']
+    items, cursor = [], None
+    while True:
+        result = fetch_page(cursor, page_size=page_size)
+        items.extend(result['items'])
+        if not result.get('has_more'):
+            break
+        cursor = result.get('cursor')
+    st.session_state[state_key] = {'signature': signature, 'items': items, 'loaded_at': _time.time()}
+    return items
+
+def cursor_pagination_controls(state, key="cursor_pagination"):
+    current_page = state['page']
+    has_next = bool(state['pages'].get(current_page, {}).get('has_more'))
+    col1, col2, col3, col4 = st.columns([1, 1, 2, 1])
+    with col1:
+        if st.button("⏮️ Première", key=f"{key}_first", disabled=(current_page == 0)):
+            state['page'] = 0
+            st.rerun()
+    with col2:
+        if st.button("◀️ Préc", key=f"{key}_prev", disabled=(current_page == 0)):
+            state['page'] = current_page - 1
+            st.rerun()
+    with col3:
+        st.markdown(f"""
+        <div style='text-align: center; padding: 8px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; border-radius: 8px; font-weight: 700;'>
+            Page {current_page + 1}{'' if has_next else ' (dernière)'}
+        </div>
+        """, unsafe_allow_html=True)
+    with col4:
+        if st.button("Suiv ▶️", key=f"{key}_next", disabled=not has_next):
+            state['page'] = current_page + 1
+            st.rerun()
+
 def advanced_search_bar(data, columns=None):
     st.markdown("""
     <div style='background: white; padding: 20px; border-radius: 16px; box-shadow: 0 4px 16px rgba(0,0,0,0.08); margin-bottom: 24px;'>
@@ -672,11 +772,14 @@ if page == "📊 Tableau de bord":
     with st.spinner("📊 Chargement des statistiques..."):
         try:
             if db is not None:
-                from firebase_config import StatisticsManager, CalendarManager
-                stats = StatisticsManager().get_dashboard_stats()
-                availability = CalendarManager().check_availability(
-                    datetime.now(), 
-                    datetime.now() + timedelta(days=1)
+                from firebase_config import AsyncStatisticsManager, AsyncCalendarManager, gather
+                # KPI et disponibilités chargés en parallèle
+                stats, availability = gather(
+                    AsyncStatisticsManager().get_dashboard_stats(),
+                    AsyncCalendarManager().check_availability(
+                        datetime.now(),
+                        datetime.now() + timedelta(days=1)
+                    )
                 )
                 pending = stats.get('pending_requests', 0)
                 active = stats.get('active_missions', 0)
@@ -1064,13 +1167,9 @@ elif page == "📝 Demandes":
         st.warning("⚠️ Firebase non disponible. Mode lecture simulée activé.")
 
     try:
-        # Chargement avec indicateur
-        with st.spinner("🔄 Chargement des demandes..."):
-            requests_all = load_requests_live(_db=db) if db is not None else load_requests_mock()
-        
         # Filtres avancés
         with st.expander("🔍 Filtres avancés", expanded=True):
-            col1, col2, col3, col4 = st.columns(4)
+            col1, col2, col3, col4, col5 = st.columns(5)
             
             with col1:
                 status_filter = st.selectbox(
@@ -1099,28 +1198,69 @@ elif page == "📝 Demandes":
                 )
             
             with col4:
+                structure_filter = st.text_input(
+                    "Structure",
+                    placeholder="Ex: DAL/GPR/ESP"
+                )
+            
+            with col5:
                 q = st.text_input(
                     "Recherche",
                     placeholder="Réf, demandeur, destination..."
                 )
         
+        # Chargement paginé côté serveur : page visible + page suivante préchargée
+        date_from_dt = datetime.combine(date_from, datetime.min.time())
+        date_to_dt = datetime.combine(date_to, datetime.max.time())
+        if db is not None:
+            from firebase_config import MissionRequestManager
+            req_mgr = MissionRequestManager()
+            
+            def fetch_requests_page(cursor, page_size=10):
+                return req_mgr.get_requests_page(
+                    page_size=page_size,
+                    cursor=cursor,
+                    status=status_filter if status_filter != "all" else None,
+                    structure=structure_filter.strip() or None,
+                    date_from=date_from_dt,
+                    date_to=date_to_dt,
+                    view='list'
+                )
+        else:
+            def fetch_requests_page(cursor, page_size=10):
+                offset = cursor or 0
+                rows = [
+                    r for r in load_requests_mock(status_filter)
+                    if date_from <= pd.to_datetime(r['date_depart']).date() <= date_to
+                    and (not structure_filter.strip() or r.get('service_demandeur') == structure_filter.strip())
+                ]
+                return {'items': rows[offset:offset + page_size], 'cursor': offset + page_size,
+                        'has_more': len(rows) > offset + page_size}
+        
+        # Recherche globale active : elle doit porter sur toutes les demandes filtrées,
+        # pas seulement sur la page visible
+        search_active = bool(st.session_state.get("global_search"))
+        req_signature = (status_filter, str(date_from), str(date_to), structure_filter.strip())
+        with st.spinner("🔄 Chargement des demandes..."):
+            if search_active:
+                requests_page = all_pages_data(fetch_requests_page, signature=req_signature, key="req_search")
+            else:
+                requests_page, req_pag_state = cursor_page_data(
+                    fetch_requests_page,
+                    signature=req_signature,
+                    key="req_pag"
+                )
+        
         # Application des filtres
-        df_all = pd.DataFrame(requests_all)
+        df_all = pd.DataFrame(requests_page)
         
         if not df_all.empty:
             df_all['created_at'] = pd.to_datetime(df_all['created_at'], errors='coerce', utc=True).dt.tz_convert(None)
-            df_all['date_depart_dt'] = pd.to_datetime(df_all['date_depart'], errors='coerce')
-            
-            # Filtres
-            df_all = df_all[
-                (df_all['date_depart_dt'].dt.date >= date_from) &
-                (df_all['date_depart_dt'].dt.date <= date_to)
-            ]
-            
-            if status_filter != "all":
-                df_all = df_all[df_all['status'] == status_filter]
-            
+            if search_active:
+                df_all = df_all.sort_values('created_at', ascending=False)
             df_all = advanced_search_bar(df_all)
+        elif search_active:
+            advanced_search_bar(df_all)
         
         drivers_map = {}
         vehicles_map = {}
@@ -1136,14 +1276,44 @@ elif page == "📝 Demandes":
         if not df_all.empty:
             st.markdown("<div class='section-header'>⚡ Actions en masse</div>", unsafe_allow_html=True)
             
-            display_for_select = df_all[['request_id', 'motif_mission', 'nom_demandeur', 'date_depart', 'status']].copy()
+            if st.button("🎯 Auto-affecter toutes les demandes en attente", key="bulk_auto_assign", use_container_width=True):
+                try:
+                    if db is not None:
+                        from firebase_config import MissionRequestManager
+                        recos = MissionRequestManager().auto_assign_batch()
+                        for rid, rec in recos.items():
+                            if rec:
+                                st.session_state[f"auto_info_{rid}"] = {
+                                    **rec,
+                                    'driver_name': drivers_map.get(rec['driver_id'], rec['driver_id']),
+                                    'vehicle_name': vehicles_map.get(rec['vehicle_id'], rec['vehicle_id'])
+                                }
+                        assigned_count = sum(1 for rec in recos.values() if rec)
+                        show_toast(f"{assigned_count}/{len(recos)} recommandation(s) générée(s)", "success")
+                    else:
+                        show_toast("Recommandations générées (simulé)", "info")
+                    st.rerun()
+                except Exception as e:
+                    show_toast(f"Erreur: {e}", "error")
+            
+            # Sélection sur la page courante, ou sur toutes les demandes filtrées (la recherche porte déjà sur tout)
+            bulk_all_pages = search_active or st.checkbox(
+                "Sélectionner parmi toutes les demandes filtrées (sinon la page courante)",
+                key="bulk_all_pages"
+            )
+            if bulk_all_pages and not search_active:
+                df_bulk = pd.DataFrame(all_pages_data(fetch_requests_page, signature=req_signature, key="req_bulk"))
+            else:
+                df_bulk = df_all
+            
+            display_for_select = df_bulk[['request_id', 'motif_mission', 'nom_demandeur', 'date_depart', 'status']].copy()
             display_for_select['label'] = display_for_select.apply(
                 lambda r: f"{r['request_id']} • {r['motif_mission']} • {r['nom_demandeur']} ({r['status']})",
                 axis=1
             )
             
             selected_bulk = st.multiselect(
-                "Sélectionner des demandes",
+                "Sélectionner des demandes" + ("" if bulk_all_pages else " (page courante)"),
                 options=display_for_select['label'].tolist(),
                 help="Sélectionnez une ou plusieurs demandes pour une action groupée"
             )
@@ -1163,14 +1333,19 @@ elif page == "📝 Demandes":
                         if db is not None:
                             from firebase_config import MissionRequestManager
                             mgr = MissionRequestManager()
-                            success_count = 0
+                            done_ids = []
                             for rid in ids_bulk:
                                 try:
                                     mgr.update_request_status_by_request_id(rid, 'approved')
-                                    success_count += 1
+                                    done_ids.append(rid)
                                 except Exception:
                                     pass
-                            show_toast(f"{success_count}/{len(ids_bulk)} demandes approuvées", "success")
+                            try:
+                                notify_requesters(df_bulk.to_dict(orient='records'), done_ids, "✅ Demande approuvée",
+                                                  "Votre demande de mission a été approuvée.", "success")
+                            except Exception:
+                                pass
+                            show_toast(f"{len(done_ids)}/{len(ids_bulk)} demandes approuvées", "success")
                         else:
                             show_toast(f"{len(ids_bulk)} demandes approuvées (simulé)", "success")
                         st.rerun()
@@ -1180,20 +1355,25 @@ elif page == "📝 Demandes":
                         if db is not None:
                             from firebase_config import MissionRequestManager
                             mgr = MissionRequestManager()
-                            success_count = 0
+                            done_ids = []
                             for rid in ids_bulk:
                                 try:
                                     mgr.update_request_status_by_request_id(rid, 'rejected')
-                                    success_count += 1
+                                    done_ids.append(rid)
                                 except Exception:
                                     pass
-                            show_toast(f"{success_count}/{len(ids_bulk)} demandes rejetées", "warning")
+                            try:
+                                notify_requesters(df_bulk.to_dict(orient='records'), done_ids, "❌ Demande rejetée",
+                                                  "Votre demande de mission a été rejetée.", "error")
+                            except Exception:
+                                pass
+                            show_toast(f"{len(done_ids)}/{len(ids_bulk)} demandes rejetées", "warning")
                         else:
                             show_toast(f"{len(ids_bulk)} demandes rejetées (simulé)", "warning")
                         st.rerun()
                 
                 with col3:
-                    sel_rows = df_all[df_all['request_id'].isin(ids_bulk)]
+                    sel_rows = df_bulk[df_bulk['request_id'].isin(ids_bulk)]
                     csv = sel_rows.to_csv(index=False).encode('utf-8')
                     st.download_button(
                         "📥 Export CSV",
@@ -1222,9 +1402,21 @@ elif page == "📝 Demandes":
             modern_file_uploader(accept_multiple=True, file_types=["pdf","jpg","jpeg","png"]) 
         
         # Pagination et affichage
-        if not df_all.empty:
-            df_all = df_all.sort_values('created_at', ascending=False)
-            subset, current_page, total_pages = advanced_pagination(df_all.to_dict(orient='records'), items_per_page=10, key="req_pag")
+        if search_active:
+            st.caption("Résultats de la recherche triés par date de création (plus récente d'abord)")
+            subset = []
+            if not df_all.empty:
+                subset, _, _ = advanced_pagination(df_all.to_dict(orient='records'), items_per_page=10, key="req_search_pag")
+        else:
+            # Le filtre de dates impose le tri Firestore sur la date de départ
+            st.caption("Demandes triées par date de départ (plus récente d'abord)")
+            cursor_pagination_controls(req_pag_state, key="req_pag")
+            subset = df_all.to_dict(orient='records') if not df_all.empty else []
+        if subset:
+            
+            # URLs des pièces jointes de la page signées en une passe
+            from firebase_config import attachment_links
+            att_links = attachment_links(subset) if db is not None else {}
             
             # Affichage des demandes
             for idx, r in enumerate(subset, 1):
@@ -1262,7 +1454,7 @@ elif page == "📝 Demandes":
                         if atts:
                             st.markdown("**📎 Documents:**")
                             for a in atts:
-                                st.markdown(f"- [{a.get('name', 'Pièce jointe')}]({a.get('url', '')})")
+                                st.markdown(f"- [{a.get('name', 'Pièce jointe')}]({att_links.get(a.get('path') or a.get('url'), a.get('url', ''))})")
                     
                     with col2:
                         st.markdown(status_badge_html(r.get('status', 'pending')), unsafe_allow_html=True)
@@ -1307,17 +1499,14 @@ elif page == "📝 Demandes":
                             if st.button("🎯 Auto-affecter", key=f"auto_{r.get('id')}", use_container_width=True):
                                 try:
                                     if db is not None:
-                                        from firebase_config import MissionRequestManager, DriverManager, VehicleManager
+                                        from firebase_config import MissionRequestManager
                                         res = MissionRequestManager().auto_assign(r['id'])
                                         if res:
-                                            try:
-                                                dlist = DriverManager().get_all_drivers()
-                                                vlist = VehicleManager().get_all_vehicles()
-                                                dname = next((d.get('name') for d in dlist if d.get('id') == res.get('driver_id')), res.get('driver_id'))
-                                                vlabel = next((v.get('immatriculation') for v in vlist if v.get('id') == res.get('vehicle_id')), res.get('vehicle_id'))
-                                                rec = {**res, 'driver_name': dname, 'vehicle_name': vlabel}
-                                            except Exception:
-                                                rec = res
+                                            rec = {
+                                                **res,
+                                                'driver_name': drivers_map.get(res.get('driver_id'), res.get('driver_id')),
+                                                'vehicle_name': vehicles_map.get(res.get('vehicle_id'), res.get('vehicle_id'))
+                                            }
                                             st.session_state[f"auto_info_{r['id']}"] = rec
                                             show_toast("Recommandation générée avec succès !", "success")
                                             st.rerun()
@@ -1431,9 +1620,10 @@ elif page == "📝 Demandes":
                                 
                                 if db is not None and start_dt and end_dt:
                                     try:
-                                        from firebase_config import DriverManager, VehicleManager
-                                        d_list = DriverManager().get_available_drivers(start_dt, end_dt)
-                                        v_list = VehicleManager().get_available_vehicles(start_dt, end_dt)
+                                        from firebase_config import CalendarManager
+                                        resources = CalendarManager().get_available_resources(start_dt, end_dt)
+                                        d_list = resources['drivers']
+                                        v_list = resources['vehicles']
                                         
                                         d_options.update({
                                             f"{d.get('name', 'Sans nom')} (#{d.get('id')[:6]})": d.get('id')
@@ -1495,8 +1685,8 @@ elif page == "🚗 Véhicules":
             from firebase_config import VehicleManager, DriverManager
             vehicle_manager = VehicleManager()
             driver_manager = DriverManager()
-            vehicles = vehicle_manager.get_all_vehicles()
-            drivers = driver_manager.get_all_drivers()
+            vehicles = vehicle_manager.get_all_vehicles(view='list')
+            drivers = driver_manager.get_all_drivers(view='list')
         else:
             vehicles = [
                 {
@@ -1627,6 +1817,33 @@ elif page == "🚗 Véhicules":
                             st.rerun()
                         except Exception as e:
                             show_toast(f"Erreur: {e}", "error")
+
+        # Changement d'immatriculation (recopiée sur les missions du véhicule)
+        if vehicles:
+            with st.expander("✏️ Modifier l'immatriculation d'un véhicule"):
+                with st.form("rename_vehicle_form"):
+                    plate_options = {
+                        f"{v.get('immatriculation', '')} ({v.get('type', '')})": v.get('id')
+                        for v in vehicles
+                    }
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        selected_plate_label = st.selectbox("🚗 Véhicule", list(plate_options.keys()))
+                    with col2:
+                        new_plate = st.text_input("📋 Nouvelle immatriculation", placeholder="Ex: DK-1234-AB")
+                    if st.form_submit_button("💾 Enregistrer"):
+                        if not new_plate.strip():
+                            show_toast("L'immatriculation est obligatoire", "error")
+                        elif db is not None:
+                            try:
+                                updated = vehicle_manager.update_vehicle(plate_options[selected_plate_label],
+                                                                         {'immatriculation': new_plate.strip().upper()})
+                                show_toast(f"Immatriculation modifiée ({updated} mission(s) mise(s) à jour)", "success")
+                                st.rerun()
+                            except Exception as e:
+                                show_toast(f"Erreur: {e}", "error")
+                        else:
+                            show_toast("Immatriculation modifiée (simulé)", "success")
         
         st.markdown("---")
         
@@ -1714,7 +1931,7 @@ elif page == "👨‍✈️ Chauffeurs":
             from firebase_config import DriverManager, VehicleManager
             driver_manager = DriverManager()
             vehicle_manager = VehicleManager()
-            drivers = driver_manager.get_all_drivers()
+            drivers = driver_manager.get_all_drivers(view='list')
         else:
             drivers = [
                 {
@@ -1793,6 +2010,27 @@ elif page == "👨‍✈️ Chauffeurs":
                     col_i2.write(f"📞 Téléphone: {info.get('phone', '—')}")
                     col_i3.write(f"🪪 Permis: {info.get('license_number', '—')}")
         
+        # Classement (agrégations count/sum par chauffeur)
+        with st.expander("🏆 Classement des chauffeurs"):
+            if not drivers:
+                st.info("Aucun chauffeur disponible")
+            elif st.button("📊 Calculer le classement", key="drivers_leaderboard"):
+                if db is not None:
+                    all_stats = driver_manager.get_all_driver_statistics([d.get('id') for d in drivers])
+                else:
+                    all_stats = {d.get('id'): {'total_missions': 0, 'missions_this_month': 0, 'total_km': 0} for d in drivers}
+                names = {d.get('id'): d.get('name') for d in drivers}
+                df_rank = pd.DataFrame([
+                    {
+                        'Chauffeur': names.get(did, did),
+                        'Missions totales': dstats.get('total_missions', 0),
+                        'Missions ce mois': dstats.get('missions_this_month', 0),
+                        'Kilomètres': round(float(dstats.get('total_km', 0) or 0), 1)
+                    }
+                    for did, dstats in all_stats.items()
+                ]).sort_values('Missions totales', ascending=False)
+                st.dataframe(df_rank, use_container_width=True, hide_index=True)
+        
         # Ajout d'un chauffeur
         with st.expander("➕ Ajouter un nouveau chauffeur"):
             with st.form("create_driver_form", clear_on_submit=True):
@@ -1836,6 +2074,33 @@ elif page == "👨‍✈️ Chauffeurs":
                             st.rerun()
                         except Exception as e:
                             show_toast(f"Erreur: {e}", "error")
+
+        # Changement de nom (recopié sur les missions du chauffeur)
+        if drivers:
+            with st.expander("✏️ Renommer un chauffeur"):
+                with st.form("rename_driver_form"):
+                    rename_options = {
+                        f"{d.get('name', '')} (ID: {d.get('id', '')[:6]})": d.get('id')
+                        for d in drivers
+                    }
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        selected_rename_label = st.selectbox("👨‍✈️ Chauffeur", list(rename_options.keys()))
+                    with col2:
+                        new_driver_name = st.text_input("👤 Nouveau nom", placeholder="Ex: Amadou Diallo")
+                    if st.form_submit_button("💾 Enregistrer"):
+                        if not new_driver_name.strip():
+                            show_toast("Le nom est obligatoire", "error")
+                        elif db is not None:
+                            try:
+                                updated = driver_manager.update_driver(rename_options[selected_rename_label],
+                                                                       {'name': new_driver_name.strip()})
+                                show_toast(f"Chauffeur renommé ({updated} mission(s) mise(s) à jour)", "success")
+                                st.rerun()
+                            except Exception as e:
+                                show_toast(f"Erreur: {e}", "error")
+                        else:
+                            show_toast("Chauffeur renommé (simulé)", "success")
         
         st.markdown("---")
         
@@ -1942,7 +2207,7 @@ elif page == "📅 Calendrier":
         if db is not None:
             from firebase_config import CalendarManager, DriverManager, VehicleManager
             calendar_manager = CalendarManager()
-            missions = calendar_manager.get_missions_in_period(start_dt, end_dt)
+            missions = calendar_manager.get_missions_overlapping(start_dt, end_dt)
             drivers_map = {d.get('id'): d.get('name') for d in cached_all_drivers()}
             vehicles_map = {v.get('id'): v.get('immatriculation') for v in cached_all_vehicles()}
         else:
@@ -2023,25 +2288,6 @@ elif page == "📅 Calendrier":
 
                 month_start = st.session_state.cal_month_start
                 month_end = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
-                # Préparer mapping missions par jour
-                def to_dt(x):
-                    if isinstance(x, str):
-                        try:
-                            return pd.to_datetime(x, utc=True, errors='coerce').tz_convert(None).to_pydatetime()
-                        except Exception:
-                            return pd.to_datetime(x, errors='coerce')
-                    return x
-                mission_map = {}
-                for m in missions:
-                    s = to_dt(m.get('start_date'))
-                    e = to_dt(m.get('end_date'))
-                    if not s or not e:
-                        continue
-                    day = s.date()
-                    while day <= e.date():
-                        mission_map.setdefault(day, []).append(m)
-                        day = (datetime.combine(day, datetime.min.time()) + timedelta(days=1)).date()
-
                 # En-têtes jours
                 headers = ["Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim"]
                 hc = st.columns(7)
@@ -2053,6 +2299,13 @@ elif page == "📅 Calendrier":
                 grid_start = month_start - timedelta(days=first_weekday)
                 days_grid = [grid_start + timedelta(days=i) for i in range(42)]
 
+                # Index d'intervalles partagé : missions par jour sans re-parcourir les jours
+                from firebase_config import MissionIntervalIndex
+                if db is not None:
+                    mission_index = calendar_manager.get_mission_index(grid_start, grid_start + timedelta(days=42))
+                else:
+                    mission_index = MissionIntervalIndex(missions)
+
                 selected_date = st.session_state.get("calendar_selected_date")
                 idx = 0
                 for _ in range(6):
@@ -2060,7 +2313,7 @@ elif page == "📅 Calendrier":
                     for ci in range(7):
                         d = days_grid[idx]; idx += 1
                         in_month = (d.month == month_start.month)
-                        count = len(mission_map.get(d.date(), []))
+                        count = len(mission_index.on_day(d))
                         label = f"{d.day} ({count})" if count else f"{d.day}"
                         if cols[ci].button(label, key=f"daybtn_{d.date().isoformat()}"):
                             st.session_state["calendar_selected_date"] = d.date()
@@ -2074,7 +2327,7 @@ elif page == "📅 Calendrier":
                 sd = st.session_state.get("calendar_selected_date")
                 if sd:
                     st.markdown(f"### 📅 Missions du {sd.strftime('%d/%m/%Y')}")
-                    items = mission_map.get(sd, [])
+                    items = mission_index.on_day(sd)
                     if not items:
                         st.info("Aucune mission ce jour")
                     else:
@@ -2144,6 +2397,58 @@ elif page == "📅 Calendrier":
                     except:
                         pass
     
+        if db is not None:
+            with st.expander("🛠️ Maintenance du calendrier"):
+                st.caption("Reconstruit l'index d'occupation jour par jour à partir des missions actives.")
+                if st.button("🔄 Reconstruire l'index d'occupation", key="rebuild_occupancy"):
+                    days_written = calendar_manager.rebuild_occupancy_index()
+                    show_toast(f"Index reconstruit ({days_written} jour(s) réservé(s))", "success")
+                st.caption("Recalcule les agrégats mensuels (chauffeurs, véhicules, structures) d'une année.")
+                rollup_year = st.number_input("Année", min_value=2020, max_value=2100, value=datetime.now().year, key="rollup_year")
+                if st.button("🔄 Recalculer les agrégats mensuels", key="rebuild_rollups"):
+                    from firebase_config import StatisticsManager
+                    months_built = StatisticsManager().rebuild_monthly_rollups(int(rollup_year))
+                    show_toast(f"{months_built} mois recalculé(s)", "success")
+                st.caption("Renseigne nom du chauffeur, immatriculation et service sur les missions existantes.")
+                if st.button("🔄 Compléter les champs d'affichage des missions", key="backfill_display"):
+                    filled = calendar_manager.backfill_display_fields()
+                    show_toast(f"{filled} mission(s) complétée(s)", "success")
+                st.caption("Normalise les emails des notifications existantes et recalcule les compteurs « non lues ».")
+                if st.button("🔄 Recalculer les compteurs de notifications", key="backfill_notification_counters"):
+                    from firebase_config import NotificationManager
+                    counters = NotificationManager().backfill_counters()
+                    show_toast(f"{counters} compteur(s) recalculé(s)", "success")
+                st.caption("Missions dont la demande d'origine a été supprimée.")
+                col_orph1, col_orph2 = st.columns(2)
+                with col_orph1:
+                    if st.button("🔍 Analyser les missions orphelines", key="orphans_dry_run"):
+                        st.session_state['orphans_report'] = calendar_manager.orphan_missions_report()
+                with col_orph2:
+                    if st.button("🗑️ Supprimer les missions orphelines", key="orphans_delete"):
+                        deleted = calendar_manager.cleanup_orphan_missions()
+                        st.session_state.pop('orphans_report', None)
+                        show_toast(f"{deleted} mission(s) orpheline(s) supprimée(s)", "success")
+                st.caption("Archive les missions terminées et les demandes clôturées plus anciennes que l'horizon (partitions annuelles).")
+                archive_days = st.number_input("Horizon (jours)", min_value=30, max_value=3650, value=365, step=30, key="archive_days")
+                col_arch1, col_arch2 = st.columns(2)
+                with col_arch1:
+                    if st.button("🔍 Simuler l'archivage", key="archive_dry_run"):
+                        arch = calendar_manager.archive_history(int(archive_days), dry_run=True)
+                        st.info(f"{arch['missions']} mission(s) et {arch['requests']} demande(s) antérieures au {arch['cutoff']:%d/%m/%Y} seraient archivées")
+                with col_arch2:
+                    if st.button("🗄️ Archiver", key="archive_run"):
+                        arch = calendar_manager.archive_history(int(archive_days))
+                        show_toast(f"{arch['missions']} mission(s) et {arch['requests']} demande(s) archivées", "success")
+                orphan_report = st.session_state.get('orphans_report')
+                if orphan_report:
+                    st.info(
+                        f"{orphan_report['scanned']} mission(s) analysée(s), "
+                        f"{orphan_report['missing_requests']} demande(s) introuvable(s), "
+                        f"{len(orphan_report['orphans'])} mission(s) à supprimer"
+                    )
+                    if orphan_report['orphans']:
+                        st.dataframe(pd.DataFrame(orphan_report['orphans']), use_container_width=True, hide_index=True)
+    
     except Exception as e:
         show_toast(f"Erreur: {e}", "error")
         st.exception(e)
@@ -2197,32 +2502,37 @@ elif page == "📈 Statistiques":
 
         # Missions sur la période (pour stats avancées)
         df_missions = pd.DataFrame()
-        drivers_map = {}
-        vehicles_map = {}
-        services_map = {}
+        mission_index = None
+        report_dash = None
         period_start_dt = datetime.combine(rpt_from, datetime.min.time())
         period_end_dt = datetime.combine(rpt_to, datetime.max.time())
         if db is not None:
             try:
-                from firebase_config import CalendarManager, DriverManager, VehicleManager, MissionRequestManager
-                cal = CalendarManager()
-                missions = cal.get_missions_in_period(period_start_dt, period_end_dt)
+                from firebase_config import MissionIntervalIndex, as_datetime, load_report_data
+                # Missions et KPI lus en parallèle
+                report_data = load_report_data(period_start_dt, period_end_dt)
+                report_dash = report_data['dashboard']
+                # L'index (chevauchements) sert aux heures occupées, bornées à la période ;
+                # les totaux ne comptent que les missions qui commencent dans la période,
+                # comme les agrégats mensuels (une mission à cheval n'est pas comptée deux fois)
+                mission_index = MissionIntervalIndex(report_data['missions'])
+                missions = [
+                    m for m in mission_index.overlapping(period_start_dt, period_end_dt)
+                    if period_start_dt <= (as_datetime(m.get('start_date')) or datetime.min) <= period_end_dt
+                ]
                 df_missions = pd.DataFrame(missions)
-                drivers_map = {d.get('id'): d.get('name') for d in cached_all_drivers()}
-                vehicles_map = {v.get('id'): v.get('immatriculation') for v in cached_all_vehicles()}
-                # map request_id -> service
-                try:
-                    reqs = MissionRequestManager().get_all_requests()
-                    services_map = {r.get('request_id'): r.get('service_demandeur') for r in reqs}
-                except Exception:
-                    services_map = {}
                 if not df_missions.empty:
                     df_missions['start_date'] = pd.to_datetime(df_missions['start_date'], errors='coerce')
                     df_missions['end_date'] = pd.to_datetime(df_missions['end_date'], errors='coerce')
                     df_missions['duration_hours'] = (df_missions['end_date'] - df_missions['start_date']).dt.total_seconds() / 3600
-                    df_missions['driver_name'] = df_missions['driver_id'].apply(lambda x: drivers_map.get(x, x))
-                    df_missions['vehicle_plate'] = df_missions['vehicle_id'].apply(lambda x: vehicles_map.get(x, x))
-                    df_missions['service'] = df_missions['request_id'].apply(lambda x: services_map.get(x, '—'))
+                    # Champs dénormalisés ; repli sur les identifiants pour les missions pas encore migrées
+                    for col, fallback in (('driver_name', 'driver_id'), ('vehicle_plate', 'vehicle_id')):
+                        if col not in df_missions.columns:
+                            df_missions[col] = None
+                        df_missions[col] = df_missions[col].fillna(df_missions[fallback])
+                    if 'service' not in df_missions.columns:
+                        df_missions['service'] = None
+                    df_missions['service'] = df_missions['service'].replace('', None).fillna('—')
                     if 'distance_km' not in df_missions.columns:
                         df_missions['distance_km'] = 0.0
             except Exception as e:
@@ -2235,7 +2545,9 @@ elif page == "📈 Statistiques":
             st.markdown("<div class='section-header'>📊 Vue d'ensemble</div>", unsafe_allow_html=True)
             
             # KPIs
-            if db is not None:
+            if report_dash is not None:
+                dash = report_dash
+            elif db is not None:
                 from firebase_config import StatisticsManager
                 sm = StatisticsManager()
                 dash = sm.get_dashboard_stats()
@@ -2414,7 +2726,19 @@ elif page == "📈 Statistiques":
                 st.info("🔍 Aucune mission sur la période")
             else:
                 total_hours_period = max((period_end_dt - period_start_dt).total_seconds() / 3600, 0.001)
-                util = df_missions.groupby('vehicle_plate')['duration_hours'].sum().reset_index().rename(columns={'duration_hours':'Heures occupées'})
+                if mission_index is not None:
+                    # Heures occupées bornées à la période, chevauchements fusionnés
+                    vehicles_map = dict(zip(df_missions['vehicle_id'], df_missions['vehicle_plate']))
+                    util = pd.DataFrame([
+                        {
+                            'vehicle_plate': vehicles_map.get(vid, vid),
+                            'Heures occupées': mission_index.busy_hours(vid, period_start_dt, period_end_dt, kind='vehicle')
+                        }
+                        for vid in mission_index.resources('vehicle')
+                    ])
+                    util = util[util['Heures occupées'] > 0] if not util.empty else util
+                else:
+                    util = df_missions.groupby('vehicle_plate')['duration_hours'].sum().reset_index().rename(columns={'duration_hours':'Heures occupées'})
                 util['Utilisation'] = (util['Heures occupées'] / total_hours_period) * 100
                 util = util.sort_values('Utilisation', ascending=False)
                 fig = px.bar(util, x='vehicle_plate', y='Utilisation', title='🚗 Taux d\'utilisation des véhicules (période)', labels={'vehicle_plate':'Véhicule','Utilisation':'% utilisation'})
@@ -3115,9 +3439,18 @@ elif page == "📊 Suivi Style Excel":
                 if st.button("🚀 Lancer l'import", type="primary"):
                     try:
                         if db is not None:
-                            result = import_excel_to_firebase(uploaded_file)
+                            from firebase_config import import_excel_to_firebase
+                            progress_bar = st.progress(0.0, text="Import en cours...")
+                            result = import_excel_to_firebase(
+                                uploaded_file,
+                                progress=lambda done, total: progress_bar.progress(
+                                    done / total if total else 1.0, text=f"Import en cours... {done}/{total} ligne(s)"
+                                )
+                            )
+                            progress_bar.empty()
                             
                             st.success(f"✅ {result['imported']} mission(s) importée(s) avec succès")
+                            st.caption(f"{result['created']} nouvelle(s), {result['updated']} mise(s) à jour, {result['unchanged']} inchangée(s)")
                             
                             if result['errors']:
                                 st.warning(f"⚠️ {len(result['errors'])} erreur(s) rencontrée(s)")
@@ -2,11 +2,13 @@ import os
 import json
 from datetime import datetime, timedelta, time
 import time as time_module
+import threading
+from collections import OrderedDict
 from itertools import permutations
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 import toml
 import re
-import unicodedata
 
 import streamlit as st
 import pandas as pd
@@ -96,7 +98,9 @@ except ImportError as e:
     st.warning(f"⚠️ Module PDF/Word non disponible: {e}. Installez: pip install reportlab python-docx")
 
 from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
+from geo_store import (coord_key, geocode_error, geocode_hit, geocode_miss, get_geocode_store,
+                       get_travel_time_store, provider_bucket, record_coords)
+from gazetteer import get_gazetteer, normalize_name
 
 import folium
 from streamlit_folium import st_folium
@@ -1432,9 +1436,142 @@ def _get_matrix_ttl_seconds():
     except Exception:
         return 24 * 3600
 
+def _missing_points(keys, known):
+    """Points dont les lignes/colonnes suffisent à couvrir les paires inconnues (couverture gloutonne)."""
+    n = len(keys)
+    missing = {(i, j) for i in range(n) for j in range(n)
+               if i != j and keys[i] != keys[j] and (keys[i], keys[j]) not in known}
+    chosen = []
+    while missing:
+        counts = {}
+        for i, j in missing:
+            counts[i] = counts.get(i, 0) + 1
+            counts[j] = counts.get(j, 0) + 1
+        best = max(counts, key=counts.get)
+        chosen.append(best)
+        missing = {(i, j) for i, j in missing if best not in (i, j)}
+    return sorted(chosen)
+
+def _assemble_duration_matrix(provider, coords, fetch):
+    """Matrice N×N assemblée depuis le store des temps de trajet.
+
+    Seules les lignes et colonnes des points manquants sont demandées au
+    fournisseur via `fetch(sources, destinations)` (indices dans `coords`),
+    qui retourne (durées, distances, message) de taille sources × destinations.
+    Ajouter un site à un itinéraire connu coûte une ligne et une colonne.
+
+    Returns:
+        (durations_sec, distances_m, message)
+    """
+    n = len(coords)
+    keys = [coord_key(c) for c in coords]
+    try:
+        store = get_travel_time_store()
+        known = store.get_pairs(provider, keys)
+    except Exception:
+        store, known = None, {}
+
+    durations = [[0.0] * n for _ in range(n)]
+    distances = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(n):
+            if i != j and keys[i] != keys[j]:
+                duration, distance = known.get((keys[i], keys[j]), (None, None))
+                durations[i][j] = duration
+                distances[i][j] = distance
+
+    points = _missing_points(keys, known)
+    if not points:
+        return durations, distances, "Succès"
+    everyone = list(range(n))
+    if len(points) * 2 >= n:
+        # Peu de paires connues : une seule matrice complète
+        requests_to_make = [(everyone, everyone)]
+    else:
+        others = [i for i in everyone if i not in points]
+        requests_to_make = [(points, everyone), (others, points)]
+
+    fetched = []
+    for sources, destinations in requests_to_make:
+        rect_durations, rect_distances, message = fetch(sources, destinations)
+        if rect_durations is None:
+            return None, None, message
+        for a, i in enumerate(sources):
+            for b, j in enumerate(destinations):
+                if i == j or keys[i] == keys[j]:
+                    continue
+                duration = rect_durations[a][b]
+                distance = rect_distances[a][b] if rect_distances else None
+                durations[i][j] = duration
+                distances[i][j] = distance
+                if duration is not None:
+                    fetched.append((keys[i], keys[j], float(duration), None if distance is None else float(distance)))
+    if store is not None and fetched:
+        try:
+            store.put_pairs(provider, fetched)
+        except Exception:
+            pass
+    return durations, distances, "Succès"
+
+def _graphhopper_matrix_request(api_key, coords, sources, destinations):
+    """Appel GraphHopper Matrix (from_points/to_points) avec retries."""
+    url = "https://graphhopper.com/api/1/matrix"
+    data = {
+        "from_points": [[coords[i][0], coords[i][1]] for i in sources],
+        "to_points": [[coords[j][0], coords[j][1]] for j in destinations],
+        "profile": "car",
+        "out_arrays": ["times", "distances"]
+    }
+    headers = {"Content-Type": "application/json"}
+    params = {"key": api_key}
+
+    last_error = None
+    for attempt in range(3):
+        try:
+            response = requests.post(url, json=data, params=params, headers=headers, timeout=30)
+        except Exception as e:
+            last_error = str(e)
+            time_module.sleep(1 + attempt)
+            continue
+        
+        if response.status_code == 200:
+            result = response.json()
+            times = result.get("times")
+            distances = result.get("distances")
+            if not times or not distances:
+                return None, None, "Données manquantes dans la réponse"
+            try:
+                flat_times = [t for row in times for t in row if t is not None]
+                max_time = max(flat_times) if flat_times else 0
+            except Exception:
+                max_time = 0
+            durations = [[t / 1000.0 if t is not None else None for t in row] for row in times] if max_time > 100000 else times
+            return durations, distances, "Succès"
+        else:
+            if response.status_code == 401:
+                return None, None, "Clé API invalide"
+            elif response.status_code == 400:
+                try:
+                    error_detail = response.json()
+                    error_msg = error_detail.get('message', 'Requête invalide')
+                    return None, None, f"Erreur HTTP 400: {error_msg}. Vérifiez que toutes les villes sont valides et géolocalisables."
+                except:
+                    return None, None, "Erreur HTTP 400: Requête invalide. Vérifiez que toutes les villes sont valides et géolocalisables."
+            elif response.status_code == 429:
+                last_error = "Limite de requêtes atteinte"
+                time_module.sleep(2 + attempt)
+                continue
+            elif 500 <= response.status_code < 600:
+                last_error = f"Erreur HTTP {response.status_code}"
+                time_module.sleep(1 + attempt)
+                continue
+            else:
+                return None, None, f"Erreur HTTP {response.status_code}"
+    return None, None, f"Échec après retries: {last_error or 'Erreur inconnue'}"
+
 @st.cache_data(ttl=_get_matrix_ttl_seconds(), show_spinner=False)
 def improved_graphhopper_duration_matrix(api_key, coords):
-    """Calcul de matrice via GraphHopper avec gestion d'erreurs"""
+    """Calcul de matrice via GraphHopper avec gestion d'erreurs (paires connues réutilisées)"""
     if not api_key:
         return None, None, "Clé API manquante"
     
@@ -1450,65 +1587,72 @@ def improved_graphhopper_duration_matrix(api_key, coords):
             if not (-180 <= lon <= 180) or not (-90 <= lat <= 90):
                 return None, None, f"Coordonnées hors limites pour le point {i+1}: ({lon}, {lat})"
         
-        points = [[coord[0], coord[1]] for coord in coords]
-        url = "https://graphhopper.com/api/1/matrix"
-        data = {
-            "points": points,
-            "profile": "car",
-            "out_arrays": ["times", "distances"]
-        }
-        headers = {"Content-Type": "application/json"}
-        params = {"key": api_key}
+        return _assemble_duration_matrix(
+            "graphhopper", coords,
+            lambda sources, destinations: _graphhopper_matrix_request(api_key, coords, sources, destinations)
+        )
+    except Exception as e:
+        return None, None, f"Erreur: {str(e)}"
 
-        last_error = None
-        for attempt in range(3):
-            try:
-                response = requests.post(url, json=data, params=params, headers=headers, timeout=30)
-            except Exception as e:
-                last_error = str(e)
+def _osrm_table_request(base_url, coords, sources, destinations):
+    """Appel OSRM Table (sources/destinations) avec retries et fallback distances."""
+    coord_str = ';'.join([f"{c[0]},{c[1]}" for c in coords])
+    url = f"{base_url.rstrip('/')}/table/v1/driving/{coord_str}"
+    params = {"annotations": "duration,distance"}
+    if len(sources) < len(coords):
+        params["sources"] = ";".join(str(i) for i in sources)
+    if len(destinations) < len(coords):
+        params["destinations"] = ";".join(str(j) for j in destinations)
+    headers = {"Accept": "application/json"}
+
+    last_error = None
+    for attempt in range(3):
+        try:
+            response = requests.get(url, params=params, headers=headers, timeout=30)
+        except Exception as e:
+            last_error = str(e)
+            time_module.sleep(1 + attempt)
+            continue
+        if response.status_code == 200:
+            result = response.json()
+            durations = result.get("durations")
+            distances = result.get("distances")
+            if durations is None:
+                return None, None, "Données manquantes: durations"
+            # OSRM fournit les durées en secondes; distances en mètres si activées
+            if distances is None:
+                # Fallback distances via Haversine (corrigé 1.2) si non fournies
+                distances = [[0.0] * len(destinations) for _ in sources]
+                for a, i in enumerate(sources):
+                    for b, j in enumerate(destinations):
+                        if i != j:
+                            km = haversine(coords[i][0], coords[i][1], coords[j][0], coords[j][1]) * 1.2
+                            distances[a][b] = km * 1000.0
+            return durations, distances, "Succès"
+        else:
+            if response.status_code == 429:
+                last_error = "Limite de requêtes atteinte (OSRM)"
+                time_module.sleep(2 + attempt)
+                continue
+            elif 500 <= response.status_code < 600:
+                last_error = f"Erreur HTTP {response.status_code} (OSRM)"
                 time_module.sleep(1 + attempt)
                 continue
-            
-            if response.status_code == 200:
-                result = response.json()
-                times = result.get("times")
-                distances = result.get("distances")
-                if not times or not distances:
-                    return None, None, "Données manquantes dans la réponse"
+            elif response.status_code == 400:
                 try:
-                    flat_times = [t for row in times for t in row]
-                    max_time = max(flat_times) if flat_times else 0
+                    err = response.json()
+                    msg = err.get('message') or err.get('error') or 'Requête invalide (OSRM)'
+                    return None, None, f"Erreur HTTP 400: {msg}"
                 except Exception:
-                    max_time = 0
-                durations = [[t / 1000.0 for t in row] for row in times] if max_time > 100000 else times
-                return durations, distances, "Succès"
+                    return None, None, "Erreur HTTP 400: Requête invalide (OSRM)"
             else:
-                if response.status_code == 401:
-                    return None, None, "Clé API invalide"
-                elif response.status_code == 400:
-                    try:
-                        error_detail = response.json()
-                        error_msg = error_detail.get('message', 'Requête invalide')
-                        return None, None, f"Erreur HTTP 400: {error_msg}. Vérifiez que toutes les villes sont valides et géolocalisables."
-                    except:
-                        return None, None, "Erreur HTTP 400: Requête invalide. Vérifiez que toutes les villes sont valides et géolocalisables."
-                elif response.status_code == 429:
-                    last_error = "Limite de requêtes atteinte"
-                    time_module.sleep(2 + attempt)
-                    continue
-                elif 500 <= response.status_code < 600:
-                    last_error = f"Erreur HTTP {response.status_code}"
-                    time_module.sleep(1 + attempt)
-                    continue
-                else:
-                    return None, None, f"Erreur HTTP {response.status_code}"
-        return None, None, f"Échec après retries: {last_error or 'Erreur inconnue'}"
-    except Exception as e:
-        return None, None, f"Erreur: {str(e)}"
+                return None, None, f"Erreur HTTP {response.status_code} (OSRM)"
+    return None, None, f"Échec après retries: {last_error or 'Erreur inconnue'}"
 
 @st.cache_data(ttl=_get_matrix_ttl_seconds(), show_spinner=False)
 def improved_osrm_duration_matrix(base_url, coords):
     """Calcul de matrice via OSRM Table avec gestion d'erreurs et fallback distances.
+    Les paires déjà connues sont réutilisées ; seuls les points manquants sont demandés.
     Retourne (durations_sec, distances_m, message).
     """
     if not base_url:
@@ -1516,59 +1660,14 @@ def improved_osrm_duration_matrix(base_url, coords):
     try:
         if len(coords) > 100:
             return None, None, f"Trop de points ({len(coords)}), limite recommandée: 100"
-        # Préparer la chaîne de coordonnées pour l'API OSRM
         try:
-            coord_str = ';'.join([f"{c[0]},{c[1]}" for c in coords])
+            coords = [(float(c[0]), float(c[1])) for c in coords]
         except Exception:
             return None, None, "Coordonnées invalides"
-        url = f"{base_url.rstrip('/')}/table/v1/driving/{coord_str}"
-        params = {"annotations": "duration,distance"}
-        headers = {"Accept": "application/json"}
-
-        last_error = None
-        for attempt in range(3):
-            try:
-                response = requests.get(url, params=params, headers=headers, timeout=30)
-            except Exception as e:
-                last_error = str(e)
-                time_module.sleep(1 + attempt)
-                continue
-            if response.status_code == 200:
-                result = response.json()
-                durations = result.get("durations")
-                distances = result.get("distances")
-                if durations is None:
-                    return None, None, "Données manquantes: durations"
-                # OSRM fournit les durées en secondes; distances en mètres si activées
-                if distances is None:
-                    # Fallback distances via Haversine (corrigé 1.2) si non fournies
-                    n = len(coords)
-                    distances = [[0.0]*n for _ in range(n)]
-                    for i in range(n):
-                        for j in range(n):
-                            if i != j:
-                                km = haversine(coords[i][0], coords[i][1], coords[j][0], coords[j][1]) * 1.2
-                                distances[i][j] = km * 1000.0
-                return durations, distances, "Succès"
-            else:
-                if response.status_code == 429:
-                    last_error = "Limite de requêtes atteinte (OSRM)"
-                    time_module.sleep(2 + attempt)
-                    continue
-                elif 500 <= response.status_code < 600:
-                    last_error = f"Erreur HTTP {response.status_code} (OSRM)"
-                    time_module.sleep(1 + attempt)
-                    continue
-                elif response.status_code == 400:
-                    try:
-                        err = response.json()
-                        msg = err.get('message') or err.get('error') or 'Requête invalide (OSRM)'
-                        return None, None, f"Erreur HTTP 400: {msg}"
-                    except Exception:
-                        return None, None, "Erreur HTTP 400: Requête invalide (OSRM)"
-                else:
-                    return None, None, f"Erreur HTTP {response.status_code} (OSRM)"
-        return None, None, f"Échec après retries: {last_error or 'Erreur inconnue'}"
+        return _assemble_duration_matrix(
+            f"osrm:{base_url.rstrip('/')}", coords,
+            lambda sources, destinations: _osrm_table_request(base_url, coords, sources, destinations)
+        )
     except Exception as e:
         return None, None, f"Erreur: {str(e)}"
 
@@ -1702,32 +1801,24 @@ def _get_geolocator():
     return _cached_geolocator()
 
 def _get_rate_limited_geocode():
-    """Retourne une fonction geocode rate-limitée avec retries."""
-    @st.cache_resource(show_spinner=False)
-    def _cached_rate_limiter():
-        geolocator = _get_geolocator()
-        return RateLimiter(
-            geolocator.geocode,
-            min_delay_seconds=1,
-            max_retries=3,
-            error_wait_seconds=2,
-            swallow_exceptions=False
-        )
-    return _cached_rate_limiter()
+    """Retourne une fonction geocode bornée par le seau à jetons Nominatim du processus.
+
+    Le seau est partagé par toutes les sessions et tous les threads : la
+    politique d'usage (1 requête/seconde) tient quel que soit le nombre
+    d'utilisateurs. Les reprises sont gérées par l'appelant.
+    """
+    geolocator = _get_geolocator()
+    bucket = provider_bucket("nominatim")
+
+    def geocode(*args, **kwargs):
+        bucket.acquire()
+        return geolocator.geocode(*args, **kwargs)
+    return geocode
 
 def _normalize_city_key(name: str) -> str:
     """Normalise un nom de ville pour les correspondances hors-ligne (sans accents/espaces/ponctuations)."""
-    if not isinstance(name, str):
-        return ""
-    s = name.strip().lower()
-    s = unicodedata.normalize("NFKD", s)
-    s = s.encode("ascii", "ignore").decode("ascii")
-    # Unifier les variantes de 'saint', 'ste', 'st'
-    s = re.sub(r"\bste\b", "saint", s)
-    s = re.sub(r"\bst\b", "saint", s)
-    # Supprimer tout sauf alphanumérique
-    s = re.sub(r"[^a-z0-9]", "", s)
-    return s
+    # Même normalisation que l'index du gazetteer
+    return normalize_name(name)
 
 # Coordonnées approximatives de grandes villes du Sénégal (lon, lat)
 SENEGAL_CITY_COORDS = {
@@ -1758,9 +1849,30 @@ SENEGAL_CITY_COORDS = {
     _normalize_city_key("Richard Toll"): (-15.6994, 16.4611),
 }
 
-def _offline_lookup_city_coords(city: str):
+def _offline_lookup_city(city: str):
+    """Résolution hors-ligne : coordonnées vérifiées, puis gazetteer (exact ou approché).
+
+    Returns:
+        {"coords": (lon, lat), "provider": str, "confidence": str}, ou None
+    """
     key = _normalize_city_key(city)
-    return SENEGAL_CITY_COORDS.get(key)
+    if key in SENEGAL_CITY_COORDS:
+        return {"coords": SENEGAL_CITY_COORDS[key], "provider": "offline", "confidence": "verified"}
+    try:
+        match = get_gazetteer().lookup(city)
+    except Exception:
+        match = None
+    if not match:
+        return None
+    return {
+        "coords": (match["lon"], match["lat"]),
+        "provider": "gazetteer",
+        "confidence": "high" if match["exact"] else "medium"
+    }
+
+def _offline_lookup_city_coords(city: str):
+    offline = _offline_lookup_city(city)
+    return offline["coords"] if offline else None
 
 def _graphhopper_geocode(city: str):
     """Fallback via GraphHopper Geocoding API si disponible.
@@ -1777,6 +1889,7 @@ def _graphhopper_geocode(city: str):
             "limit": 8,
             "key": gh_key,
         }
+        provider_bucket("graphhopper").acquire()
         resp = requests.get(url, params=params, timeout=10)
         if resp.status_code != 200:
             return None
@@ -1811,48 +1924,66 @@ def _graphhopper_geocode(city: str):
     except Exception:
         return None
 
+def _prefer_offline_geocoding() -> bool:
+    try:
+        return st.session_state.get("prefer_offline_geocoding", True)
+    except Exception:
+        return True
+
 def _geocode_city_senegal_raw(city: str):
     """Implémentation brute sans cache (avec ressource + retries). Privilégie coordonnées locales si activé."""
-    if not city or not isinstance(city, str) or not city.strip():
-        return None
+    return geocode_city_senegal(city, use_cache=False)
 
-    # Option: préférer coordonnées locales pour grandes villes (fiabilité)
-    try:
-        prefer_offline = st.session_state.get("prefer_offline_geocoding", True)
-    except Exception:
-        prefer_offline = True
-    if prefer_offline:
-        offline = _offline_lookup_city_coords(city)
-        if offline:
-            return offline
+# Erreur renvoyée quand un fournisseur a répondu sans résultat (seul cas mis en cache négatif long)
+GEOCODE_NOT_FOUND = "localité introuvable"
+
+def _geocode_failure_record(city: str, error=None):
+    """Entrée d'échec à mémoriser : introuvable (cache négatif) ou erreur réseau/quota (courte durée)."""
+    if error is None or str(error) == GEOCODE_NOT_FOUND:
+        return geocode_miss(city, "nominatim", GEOCODE_NOT_FOUND)
+    return geocode_error(city, "nominatim", str(error))
+
+def _geocode_city_senegal_network(city: str, geocode=None):
+    """Résolution réseau sans appel Streamlit (utilisable depuis un thread).
 
+    Nominatim (3 tentatives), puis GraphHopper, puis résolution hors-ligne.
+
+    Returns:
+        (résultat ou None, dernière erreur) ; résultat =
+        {"coords": (lon, lat), "provider": str, "confidence": str}
+    """
+    geocode = geocode or _get_rate_limited_geocode()
     last_error = None
     for attempt in range(3):  # 3 tentatives
         try:
-            rate_limited = _get_rate_limited_geocode()
             query = f"{city}, Sénégal" if "sénégal" not in city.lower() else city
             
             # Essai principal: ciblé Sénégal
-            loc = rate_limited(query, language="fr", country_codes="SN")
+            loc = geocode(query, language="fr", country_codes="SN")
             
             # Fallback: requête générale
             if not loc:
-                loc = rate_limited(city, language="fr")
+                loc = geocode(city, language="fr")
             
             if loc:
                 lon, lat = (loc.longitude, loc.latitude)
+                confidence = "medium"
                 # Vérifie le type renvoyé par Nominatim si disponible
                 try:
                     raw = getattr(loc, "raw", {}) or {}
                     place_type = (raw.get("type") or "").lower()
-                    if place_type and place_type not in ("city", "town", "village", "hamlet"):
+                    if place_type in ("city", "town", "village", "hamlet"):
+                        confidence = "high"
+                    elif place_type:
                         raise ValueError(f"Résultat non-ville: {place_type}")
                 except Exception:
                     pass
                 # Valide que les coordonnées sont plausibles pour le Sénégal
                 if not (-17.8 <= float(lon) <= -11.0 and 12.0 <= float(lat) <= 16.9):
                     raise ValueError("Coordonnées hors Sénégal")
-                return (lon, lat)
+                return {"coords": (lon, lat), "provider": "nominatim", "confidence": confidence}, None
+            last_error = GEOCODE_NOT_FOUND
+            break
         
         except ConnectionRefusedError as e:
             last_error = f"Connexion refusée au service de géocodage. Vérifiez votre connexion ou l'état du service. ({e})"
@@ -1865,37 +1996,255 @@ def _geocode_city_senegal_raw(city: str):
     # Fallback 1: GraphHopper (si clé dispo)
     gh_coords = _graphhopper_geocode(city)
     if gh_coords:
-        st.warning(f"Géocodage Nominatim indisponible/inexact. Fallback GraphHopper utilisé pour {city}.")
-        return gh_coords
+        return {"coords": gh_coords, "provider": "graphhopper", "confidence": "medium"}, last_error
 
     # Fallback 2: Dictionnaire hors-ligne
-    offline = _offline_lookup_city_coords(city)
+    offline = _offline_lookup_city(city)
     if offline:
-        st.info(f"Mode hors-ligne: coordonnées vérifiées utilisées pour {city}.")
-        return offline
+        return offline, last_error
+    return None, last_error
+
+@st.cache_resource(show_spinner=False)
+def _get_geocode_store():
+    """Store de géocodage persistant (SQLite par défaut, Firestore via GEOCODE_STORE)."""
+    try:
+        backend = st.secrets.get("GEOCODE_STORE", None)
+    except Exception:
+        backend = None
+    return get_geocode_store(backend)
+
+def _get_geocode_max_workers():
+    try:
+        return int(st.secrets.get("GEOCODE_MAX_WORKERS", 4))
+    except Exception:
+        return 4
+
+class _SpeculativeGeocoder:
+    """Résolution en arrière-plan des villes saisies dans l'éditeur de sites.
+
+    Partagé par toutes les sessions du processus : une ville saisie par
+    plusieurs utilisateurs n'est résolue qu'une fois. Les résultats vont
+    dans le store persistant, où la planification les retrouve.
+    """
+
+    def __init__(self, store, geocode, max_workers: int = 2, max_known: int = 2048):
+        self.store = store
+        self.geocode = geocode
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="geocode-speculatif")
+        self.jobs = {}
+        # Clés déjà résolues (LRU borné) : évite de relire le store à chaque rafraîchissement
+        self.known = OrderedDict()
+        self.max_known = max_known
+        self.lock = threading.Lock()
+
+    def _remember(self, key: str):
+        self.known[key] = True
+        self.known.move_to_end(key)
+        while len(self.known) > self.max_known:
+            self.known.popitem(last=False)
+
+    def _resolve(self, key: str, city: str):
+        try:
+            result, error = _geocode_city_senegal_network(city, self.geocode)
+            if result:
+                self.store.put(key, geocode_hit(city, result["coords"], result["provider"], result["confidence"]))
+            else:
+                self.store.put(key, _geocode_failure_record(city, error))
+        finally:
+            with self.lock:
+                self.jobs.pop(key, None)
+
+    def status(self, city: str, prefer_offline: bool = True):
+        """'ok', 'pending', 'failed' ou None (jamais demandée)"""
+        key = _normalize_city_key(city)
+        if not key:
+            return None
+        if prefer_offline and _offline_lookup_city(city):
+            return "ok"
+        with self.lock:
+            if key in self.known:
+                self.known.move_to_end(key)
+                return "ok"
+            if key in self.jobs:
+                return "pending"
+        try:
+            record = self.store.get(key)
+        except Exception:
+            return None
+        if record is None:
+            return None
+        if record_coords(record):
+            with self.lock:
+                self._remember(key)
+            return "ok"
+        return "failed"
+
+    def submit(self, city: str, prefer_offline: bool = True):
+        """Met la ville en file si elle n'est ni connue ni déjà en cours"""
+        if self.status(city, prefer_offline) is not None:
+            return
+        key = _normalize_city_key(city)
+        with self.lock:
+            if key not in self.jobs:
+                self.jobs[key] = self.pool.submit(self._resolve, key, city.strip())
+
+    def wait(self, keys, timeout=None):
+        """Attend les résolutions en cours pour `keys` (évite un second appel réseau)"""
+        with self.lock:
+            futures = [self.jobs[k] for k in keys if k in self.jobs]
+        for future in futures:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+@st.cache_resource(show_spinner=False)
+def _get_speculative_geocoder():
+    return _SpeculativeGeocoder(_get_geocode_store(), _get_rate_limited_geocode())
+
+def geocode_cities_senegal(cities, use_cache: bool = True, max_workers=None, progress=None):
+    """Géocode un lot de villes en un seul appel.
+
+    Les doublons (même nom normalisé) ne sont résolus qu'une fois. Le
+    dictionnaire local, le store persistant et le gazetteer répondent
+    d'abord ; le reste part en parallèle, chaque fournisseur restant borné
+    par son seau à jetons partagé par le processus.
+
+    Args:
+        cities: Noms des villes
+        use_cache: Lit le store persistant (il est mis à jour dans tous les cas)
+        max_workers: Appels réseau simultanés (secret GEOCODE_MAX_WORKERS, défaut 4)
+        progress: Callback optionnel progress(résolues, à_résoudre) pour la partie réseau
 
-    st.error(f"Erreur de géocodage persistante pour {city} après plusieurs tentatives: {last_error}")
-    return None
+    Returns:
+        {"coords": {ville: (lon, lat)}, "providers": {ville: fournisseur},
+         "failed": [villes], "errors": {ville: message}}
+    """
+    names = {}
+    for city in cities:
+        if isinstance(city, str) and city.strip():
+            names.setdefault(_normalize_city_key(city), city.strip())
+
+    resolved = {}
+    errors = {}
+    prefer_offline = _prefer_offline_geocoding()
+    try:
+        store = _get_geocode_store()
+    except Exception:
+        store = None
+
+    pending = []
+    for key, city in names.items():
+        # Le dictionnaire local reste prioritaire s'il est préféré (gratuit, vérifié)
+        if prefer_offline:
+            offline = _offline_lookup_city(city)
+            if offline:
+                resolved[key] = offline
+                continue
+        record = None
+        if use_cache and store is not None:
+            try:
+                record = store.get(key)
+            except Exception:
+                record = None
+        if record is None:
+            pending.append(key)
+        elif record_coords(record):
+            resolved[key] = {"coords": record_coords(record), "provider": record.get("provider"),
+                             "confidence": record.get("confidence")}
+        else:
+            errors[key] = record.get("error") or GEOCODE_NOT_FOUND
 
-def _get_geocode_ttl_seconds():
-    # TTL configurable via secrets, défaut 7 jours
+    if pending and use_cache and store is not None:
+        # Villes déjà en cours de résolution en arrière-plan : attendre leur résultat
+        try:
+            _get_speculative_geocoder().wait(pending)
+        except Exception:
+            pass
+        still_pending = []
+        for key in pending:
+            try:
+                record = store.get(key)
+            except Exception:
+                record = None
+            if record is None:
+                still_pending.append(key)
+            elif record_coords(record):
+                resolved[key] = {"coords": record_coords(record), "provider": record.get("provider"),
+                                 "confidence": record.get("confidence")}
+            else:
+                errors[key] = record.get("error") or GEOCODE_NOT_FOUND
+        pending = still_pending
+
+    if pending:
+        geocode = _get_rate_limited_geocode()
+        workers = max(1, min(max_workers or _get_geocode_max_workers(), len(pending)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_geocode_city_senegal_network, names[key], geocode): key for key in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                key = futures[future]
+                try:
+                    result, error = future.result()
+                except Exception as e:
+                    result, error = None, e
+                if result:
+                    resolved[key] = result
+                else:
+                    errors[key] = str(error or GEOCODE_NOT_FOUND)
+                if store is not None:
+                    try:
+                        if result:
+                            store.put(key, geocode_hit(names[key], result["coords"], result["provider"], result["confidence"]))
+                        else:
+                            store.put(key, _geocode_failure_record(names[key], error))
+                    except Exception:
+                        pass
+                if progress is not None:
+                    progress(done, len(pending))
+
+    out = {"coords": {}, "providers": {}, "failed": [], "errors": {}}
+    for city in cities:
+        if not isinstance(city, str) or not city.strip():
+            continue
+        key = _normalize_city_key(city)
+        if key in resolved:
+            out["coords"][city] = resolved[key]["coords"]
+            out["providers"][city] = resolved[key]["provider"]
+        elif city not in out["errors"]:
+            out["failed"].append(city)
+            out["errors"][city] = errors.get(key, GEOCODE_NOT_FOUND)
+    return out
+
+def _geocode_failure_hint(city: str) -> str:
     try:
-        return int(st.secrets.get("GEOCODE_TTL_SECONDS", 7 * 24 * 3600))
+        suggestions = [f"{m['name']} ({m['region']})" for m in get_gazetteer().suggest(city, limit=3)]
     except Exception:
-        return 7 * 24 * 3600
+        suggestions = []
+    return f" Vouliez-vous dire : {', '.join(suggestions)} ?" if suggestions else ""
 
-@st.cache_data(ttl=_get_geocode_ttl_seconds(), show_spinner=False)
-def _geocode_city_senegal_cached(city: str):
-    return _geocode_city_senegal_raw(city)
+def _report_geocode_failure(city: str, error=None):
+    st.error(f"Erreur de géocodage persistante pour {city} après plusieurs tentatives: {error}.{_geocode_failure_hint(city)}")
 
 def geocode_city_senegal(city: str, use_cache: bool = True):
-    """Géocode une ville au Sénégal, avec cache TTL et ressource partagée.
+    """Géocode une ville au Sénégal via le store persistant partagé.
+
+    Une localité déjà résolue (ou un échec récent) est servie par le store
+    sans appel réseau, y compris après redémarrage.
 
     Args:
         city: Nom de la ville
-        use_cache: Active ou non le cache des résultats
+        use_cache: Active ou non le cache des résultats (False force une
+            nouvelle résolution, qui met le store à jour)
     """
-    return _geocode_city_senegal_cached(city) if use_cache else _geocode_city_senegal_raw(city)
+    if not city or not isinstance(city, str) or not city.strip():
+        return None
+    batch = geocode_cities_senegal([city], use_cache=use_cache)
+    if city in batch["failed"]:
+        _report_geocode_failure(city, batch["errors"].get(city))
+        return None
+    if batch["providers"].get(city) == "graphhopper":
+        st.warning(f"Géocodage Nominatim indisponible/inexact. Fallback GraphHopper utilisé pour {city}.")
+    return batch["coords"].get(city)
 
 def solve_tsp_fixed_start_end(matrix):
     """Résout le TSP avec départ et arrivée fixes"""
@@ -3166,6 +3515,43 @@ mission_title = st.text_input(
 
 st.divider()
 
+GEOCODE_STATUS_BADGES = {"ok": "✅", "pending": "⏳", "failed": "❌", None: "⏳"}
+
+def _geocode_statuses(cities):
+    """Statut de géocodage par ville (mise en file si nécessaire)."""
+    prefer_offline = _prefer_offline_geocoding()
+    geocoder = _get_speculative_geocoder()
+    for city in cities:
+        geocoder.submit(city, prefer_offline)
+    return {city: geocoder.status(city, prefer_offline) for city in cities}
+
+def _render_geocode_caption(cities, statuses):
+    st.caption("📍 Géolocalisation : " + " · ".join(f"{GEOCODE_STATUS_BADGES[statuses[c]]} {c}" for c in cities))
+
+def _poll_geocode_status(cities):
+    """Badges rafraîchis tant qu'une ville est en cours ; la page est relancée une fois tout résolu."""
+    try:
+        statuses = _geocode_statuses(cities)
+    except Exception:
+        return
+    _render_geocode_caption(cities, statuses)
+    if "pending" not in statuses.values():
+        st.rerun()
+
+# Rafraîchissement périodique (fragment) si la version de Streamlit le permet
+_poll_geocode_status_fragment = st.fragment(run_every=2)(_poll_geocode_status) if hasattr(st, "fragment") else None
+
+def render_geocode_status(cities):
+    """Badge de géocodage par ville, rafraîchi seulement tant qu'une ville est en cours."""
+    try:
+        statuses = _geocode_statuses(cities)
+    except Exception:
+        return
+    if "pending" in statuses.values() and _poll_geocode_status_fragment is not None:
+        _poll_geocode_status_fragment(cities)
+    else:
+        _render_geocode_caption(cities, statuses)
+
 tab1, tab2, tab3 = st.tabs(["Sites à visiter", "Dates et Horaires de la mission ", "Paramètrage des pauses"])
 
 with tab1:
@@ -3296,6 +3682,14 @@ with tab1:
         column_order=["Supprimer", "Ville", "Type", "Activité", "Durée (h)", "Peut continuer", "Possibilité de nuitée"]
     )
     
+    # Géocodage spéculatif : chaque ville saisie part en résolution en arrière-plan
+    if sites_df is not None and 'Ville' in sites_df.columns:
+        _warm_cities = [str(v).strip() for v in sites_df['Ville'].tolist() if isinstance(v, str) and v.strip()]
+        if use_base_location and base_location and base_location.strip():
+            _warm_cities = [base_location.strip()] + _warm_cities
+        if _warm_cities:
+            render_geocode_status(list(dict.fromkeys(_warm_cities)))
+
     # Interface pour saisir un nouveau type si "Autre (saisir)" est sélectionné
     if sites_df is not None and not sites_df.empty:
         # Vérifier s'il y a des lignes avec "✏️ Autre (saisir)"
@@ -3889,26 +4283,38 @@ if plan_button:
     status.text("📍 Géocodage...")
     coords = []
     failed = []
-    
-    for i, s in enumerate(all_sites):
-        progress.progress((i+1) / (len(all_sites) * 4))
-        # Message dynamique pendant le géocodage
-        if i < len(geocoding_messages) - 1:
-            update_animation_step(1, "📍", geocoding_messages[min(i, len(geocoding_messages)-2)], [])
+
+    def is_dakar_base(site):
+        return site.get("Type") == "Base" and str(site.get("Ville", "")).strip().lower() == "dakar"
+
+    # Un seul lot : doublons fusionnés, cache et gazetteer d'abord, réseau en parallèle
+    update_animation_step(1, "📍", geocoding_messages[1], [])
+    geocoded = geocode_cities_senegal(
+        [str(s.get("Ville", "")).strip() for s in all_sites if not is_dakar_base(s)],
+        use_cache,
+        progress=lambda done, total: progress.progress(done / (total * 4))
+    )
+    for s in all_sites:
         city_val = str(s.get("Ville", "")).strip()
-        if s.get("Type") == "Base" and city_val.lower() == "dakar":
+        if is_dakar_base(s):
             coord = (-17.470602, 14.711404)
         else:
-            coord = geocode_city_senegal(city_val, use_cache)
+            coord = geocoded["coords"].get(city_val)
         if not coord:
             failed.append(s["Ville"])
         else:
             coords.append(coord)
+    progress.progress(0.25)
     
     update_animation_step(1, "✅", geocoding_messages[-1], [1])
     
     if failed:
-        st.error(f"❌ Villes introuvables: {', '.join(failed)}")
+        # Un seul message : la liste des villes, chacune avec son erreur et ses suggestions
+        details = "\n".join(
+            f"- {city_val} : {geocoded['errors'].get(str(city_val).strip())}.{_geocode_failure_hint(city_val)}"
+            for city_val in dict.fromkeys(failed)
+        )
+        st.error(f"❌ Villes introuvables: {', '.join(failed)}\n\n{details}")
         st.stop()
     
     # Étape 2: Calcul des distances